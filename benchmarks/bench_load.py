@@ -0,0 +1,104 @@
+# Benchmark of loading tasks.txt at start up.
+#
+# Writes a synthetic task file (see generate_data.py) and compares the
+# original loader, which read the whole file, split it on new lines and
+# called datetime.strptime twice per task, with the streaming
+# `task_storage.load_task_file`.
+#
+#   python benchmarks/bench_load.py --tasks 1000000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import add_dataset_arguments, write_dataset  # noqa: E402
+from task_storage import (  # noqa: E402
+    DATE_CACHE,
+    DATETIME_STRING_FORMAT,
+    load_task_file,
+    task_to_str,
+)
+
+
+def original_load(file_name):
+    """The loading code task_manager.py used before the bulk loader."""
+    with open(file_name, "r") as task_file:
+        task_data = task_file.read().split("\n")
+        task_data = [t for t in task_data if t != ""]
+
+    task_list = []
+    for task_str in task_data:
+        task_components = task_str.split(";")
+        task_list.append(
+            {
+                "username": task_components[0],
+                "title": task_components[1],
+                "description": task_components[2],
+                "due_date": datetime.strptime(
+                    task_components[3], DATETIME_STRING_FORMAT
+                ),
+                "assigned_date": datetime.strptime(
+                    task_components[4], DATETIME_STRING_FORMAT
+                ),
+                "completed": True if task_components[5] == "Yes" else False,
+            }
+        )
+    return task_list
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time loading a synthetic tasks.txt with both loaders."
+    )
+    parser.add_argument("--tasks", type=int, default=1000000)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "tasks.txt")
+        size = write_dataset(
+            folder,
+            args.users,
+            args.tasks,
+            args.completed,
+            args.due_spread,
+            args.description_words,
+            seed=args.seed,
+        )
+        print(f"{args.tasks} tasks, {size / 1024 / 1024:.1f} MiB")
+
+        start = time.perf_counter()
+        original = original_load(file_name)
+        original_time = time.perf_counter() - start
+
+        DATE_CACHE.clear()
+        start = time.perf_counter()
+        loaded, malformed = load_task_file(file_name)
+        loader_time = time.perf_counter() - start
+
+        assert not malformed and len(loaded) == len(original)
+        assert all(
+            task_to_str(task) == ";".join(
+                [
+                    row["username"],
+                    row["title"],
+                    row["description"],
+                    row["due_date"].strftime(DATETIME_STRING_FORMAT),
+                    row["assigned_date"].strftime(DATETIME_STRING_FORMAT),
+                    "Yes" if row["completed"] else "No",
+                ]
+            )
+            for task, row in zip(loaded, original)
+        )
+        print(f"original loader: {original_time:.3f}s")
+        print(f"bulk loader:     {loader_time:.3f}s")
+        print(f"speed up:        {original_time / loader_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Benchmark of login and per-request authentication cost.
+#
+# Times hashing and checking a password with a few cost settings, then the
+# two shortcuts that keep that cost to once per login: a repeated check of a
+# recently verified password and looking up a session token.
+#
+#   python benchmarks/bench_login.py
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import task_users  # noqa: E402
+from task_users import SessionCache, UserRegistry  # noqa: E402
+
+# (label, settings of task_users to use)
+COST_SETTINGS = [
+    ("scrypt n=2**14 r=8 p=1", {"PASSWORD_HASH": "scrypt", "SCRYPT_N": 2**14}),
+    ("scrypt n=2**15 r=8 p=1", {"PASSWORD_HASH": "scrypt", "SCRYPT_N": 2**15}),
+    ("pbkdf2 600k iterations", {"PASSWORD_HASH": "pbkdf2"}),
+    (
+        "pbkdf2 1.2M iterations",
+        {"PASSWORD_HASH": "pbkdf2", "PBKDF2_ITERATIONS": 1200000},
+    ),
+]
+
+
+def best_time(function, repeat):
+    """:return: the quickest of `repeat` calls to `function`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time password hashing, checking and session lookups."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    defaults = {
+        name: getattr(task_users, name)
+        for name in ("PASSWORD_HASH", "SCRYPT_N", "PBKDF2_ITERATIONS")
+    }
+    print(f"{'settings':24} {'hash':>10} {'login':>10} {'cached':>10}")
+    for label, settings in COST_SETTINGS:
+        for name, value in dict(defaults, **settings).items():
+            setattr(task_users, name, value)
+        if task_users.PASSWORD_HASH == "scrypt" and not hasattr(
+            task_users.hashlib, "scrypt"
+        ):
+            continue
+
+        hash_time = best_time(lambda: task_users.hash_password("secret"), args.repeat)
+        stored_password = task_users.hash_password("secret")
+        # A new registry has nothing cached, like a first login
+        login_time = best_time(
+            lambda: UserRegistry({"user": stored_password}).check_password(
+                "user", "secret"
+            ),
+            args.repeat,
+        )
+        users = UserRegistry({"user": stored_password})
+        users.check_password("user", "secret")
+        cached_time = best_time(
+            lambda: users.check_password("user", "secret"), args.repeat
+        )
+        print(
+            f"{label:24} {hash_time * 1000:>8.1f}ms {login_time * 1000:>8.1f}ms "
+            + f"{cached_time * 1000000:>8.1f}us"
+        )
+
+    sessions = SessionCache()
+    tokens = [sessions.create(f"user{i}") for i in range(sessions.max_sessions)]
+    lookups = 100000
+    start = time.perf_counter()
+    for i in range(lookups):
+        sessions.get(tokens[i % len(tokens)])
+    per_lookup = (time.perf_counter() - start) / lookups
+    print(
+        f"session token lookup with {len(sessions)} sessions: "
+        + f"{per_lookup * 1000000:.2f}us"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Benchmark of the memory used by tasks held in memory.
+#
+# Compares the per-task dictionaries task_manager.py used to build with the
+# `Task` class (which uses __slots__) as built by `load_task_file`, with
+# interned usernames and shared, cached dates.
+#
+#   python benchmarks/bench_memory.py --tasks 1000000
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load import original_load  # noqa: E402
+from generate_data import add_dataset_arguments, write_dataset  # noqa: E402
+from task_storage import DATE_CACHE, load_task_file  # noqa: E402
+
+
+def measure(load, file_name):
+    """:return: the memory in bytes still allocated by what `load` returns."""
+    DATE_CACHE.clear()
+    gc.collect()
+    tracemalloc.start()
+    tasks = load(file_name)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tasks
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the memory used by dictionary and Task tasks."
+    )
+    parser.add_argument("--tasks", type=int, default=1000000)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "tasks.txt")
+        write_dataset(
+            folder,
+            args.users,
+            args.tasks,
+            args.completed,
+            args.due_spread,
+            args.description_words,
+            seed=args.seed,
+        )
+
+        dict_size = measure(original_load, file_name)
+        task_size = measure(lambda name: load_task_file(name)[0], file_name)
+
+    for label, size in (("dict tasks", dict_size), ("Task objects", task_size)):
+        print(
+            f"{label:<13} {size / 1024 / 1024:8.1f} MiB "
+            + f"({size / args.tasks:.0f} bytes per task)"
+        )
+    print(f"saving:       {(1 - task_size / dict_size) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Benchmark of parallel report generation.
+#
+# Writes a synthetic tasks.txt and compares working out the user report
+# counters in one process (loading every task, as task_summary does) with
+# `task_parallel.parallel_task_summary` using an increasing number of worker
+# processes. Every result is checked to be identical to the single process
+# one.
+#
+#   python benchmarks/bench_parallel_report.py --tasks 10000000
+#   python benchmarks/bench_parallel_report.py --workers 1 2 4 8 16
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import add_dataset_arguments, write_dataset  # noqa: E402
+from task_parallel import parallel_task_summary  # noqa: E402
+from task_storage import FlatFileStorage  # noqa: E402
+
+
+def default_worker_counts():
+    """:return: 1, 2, 4, ... up to the number of CPUs."""
+    cpu_count = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the user report counters in one and many processes."
+    )
+    parser.add_argument("--tasks", type=int, default=2000000)
+    parser.add_argument(
+        "--workers", nargs="+", type=int, default=default_worker_counts()
+    )
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    current_date = datetime.today()
+    with tempfile.TemporaryDirectory() as folder:
+        size = write_dataset(
+            folder,
+            args.users,
+            args.tasks,
+            args.completed,
+            args.due_spread,
+            args.description_words,
+            seed=args.seed,
+        )
+        tasks_file = os.path.join(folder, "tasks.txt")
+        print(
+            f"{args.tasks} tasks, {size / 1024 / 1024:.1f} MiB, "
+            + f"{os.cpu_count()} CPUs"
+        )
+
+        start = time.perf_counter()
+        storage = FlatFileStorage(
+            tasks_file,
+            os.path.join(folder, "user.txt"),
+            os.path.join(folder, "tasks_journal.txt"),
+        )
+        expected = storage.task_summary(current_date)
+        single = time.perf_counter() - start
+        del storage
+        print(f"{'single process (load + summary)':34} {single:8.3f}s")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            summary = parallel_task_summary(
+                FlatFileStorage(
+                    tasks_file,
+                    os.path.join(folder, "user.txt"),
+                    os.path.join(folder, "tasks_journal.txt"),
+                ),
+                current_date,
+                workers,
+            )
+            elapsed = time.perf_counter() - start
+            assert summary == expected
+            assert list(summary["users"]) == list(expected["users"])
+            print(
+                f"{f'{workers} workers':34} {elapsed:8.3f}s "
+                + f"({single / elapsed:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Benchmark of full-text task search.
+#
+# Builds synthetic tasks with generate_data.py, whose titles and
+# descriptions are drawn from a small vocabulary of common words and whose
+# titles end in a number unique to the task, then compares
+# `task_search.SearchIndex` with scanning every title and description for
+# the query words, which is what finding a task by its content took before.
+#
+#   python benchmarks/bench_search.py --tasks 1000000 --description-words 40
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import add_dataset_arguments, make_tasks  # noqa: E402
+from task_search import SearchIndex, tokenize  # noqa: E402
+
+QUERIES = [
+    "4711",  # one rare word, the number of a single task
+    "fix report",  # two common words
+    "update 4711",  # a common and a rare word
+    "inv*",  # a prefix of a common word
+    "user page report fix",  # four common words
+]
+
+
+def naive_search(tasks, query):
+    """Checks every task for every query word, a trailing * matches a prefix."""
+    words = [word.casefold() for word in query.split()]
+    matches = []
+    for task_id, task in enumerate(tasks):
+        task_words = set(tokenize(f"{task.title} {task.description}"))
+        if all(
+            any(w.startswith(word[:-1]) for w in task_words)
+            if word.endswith("*")
+            else word in task_words
+            for word in words
+        ):
+            matches.append(task_id)
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time searching task text with and without the search index."
+    )
+    parser.add_argument("--tasks", type=int, default=1000000)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    tasks = make_tasks(
+        args.tasks,
+        args.users,
+        args.completed,
+        args.due_spread,
+        args.description_words,
+        seed=args.seed,
+    )
+    print(f"{args.tasks} tasks")
+
+    start = time.perf_counter()
+    search_index = SearchIndex(enumerate(tasks))
+    print(f"building the index: {time.perf_counter() - start:.2f}s")
+
+    print(f"{'query':24} {'matches':>8} {'scan':>10} {'index':>10}")
+    for query in QUERIES:
+        # Free the previous results first so that isn't timed
+        results = expected = None
+        start = time.perf_counter()
+        expected = naive_search(tasks, query)
+        scan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = search_index.search(query)
+        index_time = time.perf_counter() - start
+
+        assert sorted(task_id for _, task_id in results) == expected
+        print(
+            f"{query:24} {len(results):>8} {scan_time * 1000:>8.1f}ms "
+            + f"{index_time * 1000:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
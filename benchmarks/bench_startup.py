@@ -0,0 +1,80 @@
+# Benchmark of task manager start up.
+#
+# Writes a synthetic tasks.txt (see generate_data.py) and times, each in a
+# fresh interpreter, how long it takes to import task_manager, to show the
+# "ds" statistics (which counts the tasks without loading them) and to load
+# every task as the first report does. Importing used to load every task straight away.
+#
+#   python benchmarks/bench_startup.py --tasks 1000000
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import add_dataset_arguments, write_dataset  # noqa: E402
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each step runs after importing task_manager, in a fresh interpreter
+STEPS = {
+    "import task_manager": "",
+    "import + ds statistics": "task_manager.display_statistics()",
+    "import + load all tasks": (
+        "task_manager.get_storage().task_summary(datetime.today())"
+    ),
+}
+
+TIMER = """
+import time
+start = time.perf_counter()
+from datetime import datetime
+import task_manager
+{step}
+print(time.perf_counter() - start)
+"""
+
+
+def time_step(folder, step):
+    environment = dict(os.environ, PYTHONPATH=REPO_FOLDER, TASK_STORAGE="flatfile")
+    output = subprocess.run(
+        [sys.executable, "-c", TIMER.format(step=step)],
+        cwd=folder,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time task manager start up against a synthetic tasks.txt."
+    )
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_dataset(
+            folder,
+            args.users,
+            args.tasks,
+            args.completed,
+            args.due_spread,
+            args.description_words,
+            seed=args.seed,
+        )
+        print(f"{args.tasks} tasks")
+        for label, step in STEPS.items():
+            best = min(time_step(folder, step) for _ in range(args.repeat))
+            print(f"{label + ':':26} {best:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# Benchmark suite for the task manager.
+#
+# Generates synthetic data at each size (see generate_data.py) and times the
+# operations people use most, through the same functions the menu calls:
+#   load         opening storage and loading every task, in a fresh process
+#   add          adding a task ("a")
+#   edit         changing a task's due date ("vm", then "dd")
+#   view_mine    listing a user's tasks ("vm")
+#   task_report  building task_overview.txt ("gr", then "to")
+#   user_report  building user_overview.txt ("gr", then "uo")
+# Reports are also timed a second time, when they come from the cache.
+#
+# Results are saved as JSON so two versions can be compared:
+#   python benchmarks/bench_suite.py --output before.json
+#   (change the code)
+#   python benchmarks/bench_suite.py --output after.json --compare before.json
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER)
+
+from generate_data import add_dataset_arguments, write_dataset  # noqa: E402
+
+OPERATIONS = [
+    "load",
+    "add",
+    "edit",
+    "view_mine",
+    "task_report",
+    "task_report_cached",
+    "user_report",
+    "user_report_cached",
+]
+
+# The user whose tasks are listed and edited, every generated data set has
+# one
+BENCHMARK_USER = "user1"
+
+
+# =====Timing operations (in a fresh process per run)===========
+
+
+def scripted_input(answers):
+    """:return: an `input` replacement that gives `answers` in turn."""
+    answers = iter(answers)
+    return lambda prompt="": next(answers)
+
+
+def time_call(samples, operation, function):
+    """Runs `function` with its output discarded and records how long it took."""
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        function()
+    samples.setdefault(operation, []).append(time.perf_counter() - start)
+
+
+def run_operations(iterations):
+    """
+    The function `run_operations` times every operation against the data in
+    the current folder.
+
+    :param iterations: how many times to repeat the operations that are cheap
+    enough to time more than once in a process, i.e. add and edit.
+    :return: a dictionary of operation -> list of times in seconds.
+    """
+    import task_manager
+
+    samples = {}
+
+    def load():
+        storage = task_manager.get_storage()
+        task_manager.get_users()
+        storage.get_task(0)  # the flat file storage loads on first use
+
+    time_call(samples, "load", load)
+    storage = task_manager.get_storage()
+
+    due_date = (date.today() + timedelta(days=30)).isoformat()
+    for i in range(iterations):
+        task_manager.input = scripted_input(
+            [BENCHMARK_USER, f"Benchmark task {i}", "Added by the benchmark", due_date]
+        )
+        time_call(samples, "add", task_manager.add_task)
+
+    editable = [
+        task_id
+        for task_id, task in storage.user_tasks(BENCHMARK_USER)
+        if not task.completed
+    ]
+    for i in range(min(iterations, len(editable))):
+        new_due_date = (date.today() + timedelta(days=i + 1)).isoformat()
+        task_manager.input = scripted_input([str(editable[i]), "dd", new_due_date])
+        time_call(
+            samples, "edit", lambda: task_manager.task_editor(BENCHMARK_USER)
+        )
+
+    task_manager.input = scripted_input(["-1"])
+    time_call(samples, "view_mine", lambda: task_manager.view_mine(BENCHMARK_USER))
+
+    for report in ("task_report", "user_report"):
+        time_call(samples, report, getattr(task_manager, report))
+        time_call(samples, report + "_cached", getattr(task_manager, report))
+
+    storage.close()
+    return samples
+
+
+# =====Running the suite===========
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_FOLDER,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_folder(folder, args, task_count):
+    """Writes the data set for one size, converted for the chosen storage."""
+    size = write_dataset(
+        folder,
+        args.users,
+        task_count,
+        args.completed,
+        args.due_spread,
+        args.description_words,
+        seed=args.seed,
+    )
+    if args.storage != "flatfile":
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(REPO_FOLDER, "task_storage.py"),
+                "flatfile",
+                args.storage,
+            ],
+            cwd=folder,
+            capture_output=True,
+            check=True,
+        )
+    return size
+
+
+def run_in_fresh_process(folder, args):
+    """:return: the samples from one run of `run_operations` in `folder`."""
+    environment = dict(os.environ, TASK_STORAGE=args.storage)
+    environment.pop("TASK_PROFILE", None)
+    output = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--run-here",
+            "--iterations",
+            str(args.iterations),
+        ],
+        cwd=folder,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def summarise(times):
+    return {
+        "runs": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "max_s": max(times),
+    }
+
+
+def compare(results, baseline_file):
+    """
+    The function `compare` prints how each median time changed against an
+    earlier results file. Ratios above 1 are slower.
+    """
+    with open(baseline_file, "r") as results_file:
+        baseline = json.load(results_file)
+    old_times = {
+        (result["tasks"], result["operation"]): result["median_s"]
+        for result in baseline["results"]
+    }
+    print(f"\nCompared with {baseline_file} ({baseline.get('commit')}):")
+    for result in results:
+        old = old_times.get((result["tasks"], result["operation"]))
+        if old:
+            ratio = result["median_s"] / old
+            flag = "  slower" if ratio > 1.1 else ""
+            print(
+                f"{result['tasks']:>9} {result['operation']:20} "
+                + f"{old:>10.4f}s -> {result['median_s']:>10.4f}s "
+                + f"({ratio:.2f}x){flag}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the main task manager operations on synthetic data."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[1000, 100000, 1000000],
+        help="numbers of tasks to benchmark",
+    )
+    add_dataset_arguments(parser)
+    parser.add_argument(
+        "--storage", choices=["flatfile", "binary", "sqlite"], default="flatfile"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="fresh processes per size"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=5, help="adds and edits per process"
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="an earlier --output")
+    parser.add_argument("--run-here", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_here:
+        print(json.dumps(run_operations(args.iterations)))
+        return
+
+    results = []
+    print(f"{'tasks':>9} {'operation':20} {'median (s)':>11} {'min (s)':>11}")
+    for task_count in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            size = prepare_folder(folder, args, task_count)
+            samples = {}
+            for _ in range(args.repeat):
+                for operation, times in run_in_fresh_process(folder, args).items():
+                    samples.setdefault(operation, []).extend(times)
+
+        for operation in OPERATIONS:
+            if operation not in samples:
+                continue
+            result = {
+                "tasks": task_count,
+                "tasks_file_bytes": size,
+                "operation": operation,
+            }
+            result.update(summarise(samples[operation]))
+            results.append(result)
+            print(
+                f"{task_count:>9} {operation:20} {result['median_s']:>11.4f} "
+                + f"{result['min_s']:>11.4f}"
+            )
+
+    with open(args.output, "w") as results_file:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "storage": args.storage,
+                "users": args.users,
+                "completed": args.completed,
+                "due_spread": args.due_spread,
+                "description_words": args.description_words,
+                "seed": args.seed,
+                "results": results,
+            },
+            results_file,
+            indent=2,
+        )
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Benchmark of the counters behind user_report() / task_report().
+#
+# Compares, on tasks from generate_data.py, the original approach, which
+# scanned every task three times per user, with the single pass of
+# `task_reports.aggregate_tasks`. The original approach is only timed while
+# users x tasks stays below --naive-limit since it is quadratic.
+#
+#   python benchmarks/bench_user_report.py
+#   python benchmarks/bench_user_report.py --sizes 1000:100000 10000:1000000
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import make_tasks  # noqa: E402
+from task_reports import aggregate_tasks  # noqa: E402
+
+
+def naive_user_counts(task_list, current_date):
+    """The per-user counting user_report() used before the aggregation engine."""
+    task_count = {}
+    for task in task_list:
+        username = task.username
+        task_count[username] = task_count.get(username, 0) + 1
+
+    counts = {}
+    for username, count in task_count.items():
+        completed = sum(
+            True
+            for task in task_list
+            if task.username == username and task.completed
+        )
+        incomplete = sum(
+            True
+            for task in task_list
+            if task.username == username and not task.completed
+        )
+        overdue = sum(
+            True
+            for task in task_list
+            if task.username == username
+            and not task.completed
+            and task.due_date < current_date
+        )
+        counts[username] = (count, completed, incomplete, overdue)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the per-user report counters at increasing sizes."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["100:10000", "1000:100000", "10000:1000000"],
+        help="users:tasks pairs to benchmark",
+    )
+    parser.add_argument("--naive-limit", type=float, default=2e8)
+    args = parser.parse_args()
+
+    current_date = datetime.today()
+    print(f"{'users':>8} {'tasks':>10} {'single pass (s)':>16} {'naive (s)':>12}")
+    for size in args.sizes:
+        user_count, task_count = (int(n) for n in size.split(":"))
+        tasks = make_tasks(task_count, user_count)
+
+        start = time.perf_counter()
+        summary = aggregate_tasks(tasks, current_date)
+        single_pass = time.perf_counter() - start
+
+        naive = "skipped"
+        if user_count * task_count <= args.naive_limit:
+            start = time.perf_counter()
+            counts = naive_user_counts(tasks, current_date)
+            naive = f"{time.perf_counter() - start:.3f}"
+            for username, (total, completed, incomplete, overdue) in counts.items():
+                user = summary["users"][username]
+                assert (total, completed, incomplete, overdue) == (
+                    user["total"],
+                    user["completed"],
+                    user["incomplete"],
+                    user["overdue"],
+                )
+
+        print(f"{user_count:>8} {task_count:>10} {single_pass:>16.3f} {naive:>12}")
+
+
+if __name__ == "__main__":
+    main()
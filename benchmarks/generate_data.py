@@ -0,0 +1,214 @@
+# Synthetic data for benchmarking the task manager.
+#
+# Writes a user.txt and tasks.txt in the format task_manager.py uses, sized
+# and shaped like a real team's data: how many users and tasks, how many of
+# the tasks are completed, how far due dates spread around today and how
+# long descriptions are. The same seed always gives the same files. Every
+# benchmark draws its data from here, either as files or, with `make_tasks`,
+# as `Task` objects, so they all measure the same kind of data.
+#
+#   python benchmarks/generate_data.py data --users 1000 --tasks 1000000
+#   python benchmarks/generate_data.py data --tasks 100000 --completed 0.6 \
+#       --due-spread 180 --description-words 40
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_storage import parse_task  # noqa: E402
+
+WORDS = (
+    "add api audit backup bug build cache check clean client config data "
+    + "database deploy design docs email error export feature file fix form "
+    + "index invoice layout log login meeting menu merge migrate monitor "
+    + "page password payment plan release report request review schedule "
+    + "search server session settings setup sprint support test ticket "
+    + "update upgrade user validate version"
+).split()
+
+# Tasks are written in chunks so the whole file is never held in memory
+CHUNK_SIZE = 10000
+
+
+def make_usernames(user_count):
+    """:return: `user_count` usernames, starting with admin."""
+    return ["admin"] + [f"user{i}" for i in range(1, user_count)]
+
+
+def write_users(file_name, usernames):
+    """
+    Writes user.txt with plain text passwords, which the task manager still
+    accepts (and hashes at the user's first log in). Hashing them here would
+    take longer than generating the tasks.
+    """
+    with open(file_name, "w") as user_file:
+        user_file.write(
+            "\n".join(
+                f"{username};{'password' if username == 'admin' else username}"
+                for username in usernames
+            )
+        )
+
+
+def task_lines(
+    task_count,
+    usernames,
+    completed_ratio,
+    due_spread,
+    description_words,
+    today,
+    seed,
+):
+    """
+    The generator `task_lines` yields the lines of a synthetic tasks.txt.
+
+    :param completed_ratio: the share of tasks that are completed.
+    :param due_spread: due dates fall within this many days either side of
+    `today`, so about half of the incomplete tasks are overdue.
+    :param description_words: the average number of words in a description,
+    actual lengths vary from half to one and a half times this.
+    """
+    rng = random.Random(seed)
+    choice = rng.choice
+    choices = rng.choices
+    randint = rng.randint
+    random_number = rng.random
+    low_words = max(1, description_words // 2)
+    high_words = max(low_words, description_words * 3 // 2)
+    for i in range(task_count):
+        due_date = today + timedelta(days=randint(-due_spread, due_spread))
+        assigned_date = min(due_date, today) - timedelta(days=randint(0, 60))
+        title = " ".join(choices(WORDS, k=randint(2, 5))).capitalize()
+        description = " ".join(
+            choices(WORDS, k=randint(low_words, high_words))
+        ).capitalize()
+        yield (
+            f"{choice(usernames)};{title} {i};{description}.;"
+            + f"{due_date.isoformat()};{assigned_date.isoformat()};"
+            + f"{'Yes' if random_number() < completed_ratio else 'No'}\n"
+        )
+
+
+def make_tasks(
+    task_count,
+    user_count=100,
+    completed_ratio=0.4,
+    due_spread=90,
+    description_words=12,
+    today=None,
+    seed=1,
+):
+    """
+    The function `make_tasks` builds the tasks `write_dataset` would write,
+    for benchmarks that work on tasks in memory.
+
+    :return: a list of `Task` objects.
+    """
+    lines = task_lines(
+        task_count,
+        make_usernames(user_count),
+        completed_ratio,
+        due_spread,
+        description_words,
+        today or date.today(),
+        seed,
+    )
+    return [parse_task(line.rstrip("\n")) for line in lines]
+
+
+def write_dataset(
+    folder,
+    user_count=100,
+    task_count=1000,
+    completed_ratio=0.4,
+    due_spread=90,
+    description_words=12,
+    today=None,
+    seed=1,
+):
+    """
+    The function `write_dataset` writes user.txt and tasks.txt into `folder`,
+    replacing any that are there.
+
+    :return: the size of tasks.txt in bytes.
+    """
+    today = today or date.today()
+    usernames = make_usernames(user_count)
+    write_users(os.path.join(folder, "user.txt"), usernames)
+
+    task_file_name = os.path.join(folder, "tasks.txt")
+    lines = task_lines(
+        task_count,
+        usernames,
+        completed_ratio,
+        due_spread,
+        description_words,
+        today,
+        seed,
+    )
+    with open(task_file_name, "w") as task_file:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == CHUNK_SIZE:
+                task_file.writelines(chunk)
+                chunk = []
+        task_file.writelines(chunk)
+    return os.path.getsize(task_file_name)
+
+
+def add_dataset_arguments(parser):
+    """Adds the options shared by every script that generates data."""
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument(
+        "--completed",
+        type=float,
+        default=0.4,
+        help="share of tasks that are completed, 0 to 1",
+    )
+    parser.add_argument(
+        "--due-spread",
+        type=int,
+        default=90,
+        help="due dates fall within this many days of today",
+    )
+    parser.add_argument(
+        "--description-words",
+        type=int,
+        default=12,
+        help="average number of words in a task description",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic user.txt and tasks.txt."
+    )
+    parser.add_argument("folder", help="where to write the files")
+    parser.add_argument("--tasks", type=int, default=1000)
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(args.folder, exist_ok=True)
+    size = write_dataset(
+        args.folder,
+        args.users,
+        args.tasks,
+        args.completed,
+        args.due_spread,
+        args.description_words,
+        seed=args.seed,
+    )
+    print(
+        f"Wrote {args.users} users and {args.tasks} tasks "
+        + f"({size / 1024 / 1024:.1f} MiB) to {args.folder}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Load test for task_server.py.
+#
+# Opens a number of keep-alive connections to a running server and has each
+# of them send requests back to back for a fixed time, then prints the
+# requests per second and latency percentiles. The mix is mostly reads
+# (my tasks, task overview) with some task creation.
+#
+#   python task_server.py --port 8000 &
+#   python benchmarks/load_test.py --port 8000 --connections 50 --seconds 10
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def request(reader, writer, method, path, body=None, token=None):
+    """Sends one request on an open connection and returns (status, JSON)."""
+    data = b"" if body is None else json.dumps(body).encode("utf-8")
+    headers = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if token:
+        headers += f"Authorization: Bearer {token}\r\n"
+    headers += f"Content-Length: {len(data)}\r\n\r\n"
+    writer.write(headers.encode("latin-1") + data)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(args, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    _, response = await request(
+        reader,
+        writer,
+        "POST",
+        "/login",
+        {"username": args.username, "password": args.password},
+    )
+    token = response["token"]
+
+    while time.perf_counter() < deadline:
+        roll = random.random()
+        if roll < args.write_ratio:
+            call = (
+                "POST",
+                "/tasks",
+                {
+                    "username": args.username,
+                    "title": "Load test",
+                    "description": "Created by load_test.py",
+                    "due_date": "2030-01-01",
+                },
+            )
+        elif roll < 0.6:
+            call = ("GET", "/tasks/mine", None)
+        else:
+            call = ("GET", "/reports/tasks", None)
+
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, *call, token=token)
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(status)
+
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Measure requests per second and latency of task_server.py."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="password")
+    args = parser.parse_args()
+
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    await asyncio.gather(
+        *(client(args, deadline, latencies, errors) for _ in range(args.connections))
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"connections:  {args.connections}")
+    print(f"requests:     {len(latencies)} ({len(errors)} errors)")
+    print(f"requests/sec: {len(latencies) / elapsed:.0f}")
+    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        print(f"{label} latency:  {percentile(latencies, fraction) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
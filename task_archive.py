@@ -0,0 +1,307 @@
+# Cold archive of completed tasks.
+#
+# Tasks archived with `TaskStorage.archive_tasks` leave the live tasks, so
+# loading, viewing and reports only pay for the tasks that can still change.
+# They are kept in two files next to the task data:
+#   tasks_archive.gz          gzip compressed chunks of up to CHUNK_SIZE tasks,
+#                             each a separate gzip member holding lines in the
+#                             tasks.txt format
+#   tasks_archive_index.jsonl one JSON line per chunk with its position in
+#                             tasks_archive.gz, the number of tasks per user
+#                             and the range of due dates
+# The index is small and is all that reports read. A chunk is only
+# decompressed when someone looks at archived tasks it may hold. Each
+# backend has an archive of its own, e.g. tasks_db_archive.gz for tasks.db,
+# as the reports add its tasks to the backend's live ones.
+#
+# Archiving appends the tasks here first and removes them from the live
+# tasks after, so a crash in between leaves them in both places. Each run
+# is therefore recorded in a small marker file next to the task data (e.g.
+# tasks.txt.archiving) before it starts, see `start_run`, and the next run
+# finishes it rather than archiving the same tasks again.
+
+# =====importing libraries===========
+import gzip
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from task_perf import count, timed
+from task_storage import (
+    DATETIME_STRING_FORMAT,
+    atomic_write,
+    file_lock,
+    file_stamp,
+    parse_date,
+    parse_task,
+    task_to_str,
+)
+
+ARCHIVE_FILE = "tasks_archive.gz"
+ARCHIVE_INDEX_FILE = "tasks_archive_index.jsonl"
+# Tasks per chunk, the most that has to be decompressed to show one task
+CHUNK_SIZE = 10000
+# Tasks completed this many days ago or more are archived by default
+ARCHIVE_AFTER_DAYS = 90
+
+
+def archive_files(data_file):
+    """
+    The function `archive_files` names the archive and index files of the
+    tasks stored in `data_file`, the way the history files are named.
+
+    :return: a tuple of (archive file, index file), e.g.
+    ("tasks_archive.gz", "tasks_archive_index.jsonl") for tasks.txt and
+    ("tasks_db_archive.gz", "tasks_db_archive_index.jsonl") for tasks.db.
+    """
+    root, extension = os.path.splitext(data_file)
+    if extension != ".txt":
+        root += "_" + extension.lstrip(".")
+    return root + "_archive.gz", root + "_archive_index.jsonl"
+
+
+def default_cutoff():
+    """:return: the date tasks completed before are archived by default."""
+    today = datetime.combine(datetime.today(), datetime.min.time())
+    return today - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+class TaskArchive:
+    """
+    The class `TaskArchive` appends completed tasks to the archive and finds
+    them again. Archived tasks never change, so they are numbered by their
+    position in the archive.
+    """
+
+    def __init__(self, archive_file=ARCHIVE_FILE, index_file=ARCHIVE_INDEX_FILE):
+        self.archive_file = archive_file
+        self.index_file = index_file
+        self.lock_file = archive_file + ".lock"
+        # The index as last read, see `chunks`
+        self.index = []
+        self.index_stamp = None
+
+    @contextmanager
+    def lock(self):
+        """Holds the lock needed to append to the archive."""
+        with file_lock(self.lock_file):
+            yield
+
+    # =====Archiving runs===========
+
+    def start_run(self, marker_file, version, task_ids):
+        """
+        The method `start_run` records which tasks a run is about to archive,
+        before they are appended. It must be called while holding `lock`.
+
+        :param marker_file: the storage's marker file, see `unfinished_run`.
+        :param version: the storage's version, which must change when the
+        archived tasks are removed from it.
+        :param task_ids: the ids of the tasks being archived.
+        :return: the id of the run, to pass to `append`.
+        """
+        run = uuid.uuid4().hex
+        atomic_write(
+            marker_file,
+            json.dumps({"run": run, "version": version, "task_ids": task_ids}),
+        )
+        return run
+
+    def pending_run(self, marker_file, version):
+        """
+        :return: the marker of a run that may have been cut off before its
+        tasks were removed from the storage, which is still at `version`,
+        or None.
+        """
+        try:
+            with open(marker_file, "r") as marker:
+                run = json.load(marker)
+        except (FileNotFoundError, ValueError):
+            return None
+        if run["version"] != version:
+            return None
+        return run
+
+    def unfinished_run(self, marker_file, version):
+        """
+        The method `unfinished_run` finds a run that was cut off by a crash
+        after appending its tasks to the archive but before they were
+        removed from the storage. Any other run left behind is forgotten: one
+        that never reached the index will be done again from the start, and
+        one whose storage version has moved on was finished. It must be
+        called while holding `lock`.
+
+        :return: a tuple of (id of the run, ids of the tasks that are
+        archived already but still have to be removed from the storage), or
+        None.
+        """
+        run = self.pending_run(marker_file, version)
+        if run is not None and any(
+            chunk.get("run") == run["run"] for chunk in self.chunks()
+        ):
+            return run["run"], run["task_ids"]
+        self.end_run(marker_file)
+        return None
+
+    def end_run(self, marker_file):
+        """Forgets a run once its tasks have been removed from the storage."""
+        try:
+            os.remove(marker_file)
+        except FileNotFoundError:
+            pass
+
+    def replace(self, source):
+        """
+        The method `replace` makes this archive a copy of another one, e.g.
+        when the tasks are migrated to another backend.
+
+        :param source: the `TaskArchive` to copy.
+        """
+        with self.lock():
+            for source_file, file_name in (
+                (source.archive_file, self.archive_file),
+                (source.index_file, self.index_file),
+            ):
+                try:
+                    with open(source_file, "rb") as archive:
+                        data = archive.read()
+                except FileNotFoundError:
+                    data = b""
+                atomic_write(file_name, data)
+
+    # =====Archived tasks===========
+
+    @timed("archive.append")
+    def append(self, tasks, run=None):
+        """
+        The method `append` adds tasks to the end of the archive. The chunks
+        are forced to disk before they are added to the index, so a crash
+        part way through leaves only unindexed bytes that are never read.
+        It must be called while holding `lock`.
+
+        :param tasks: a list of completed tasks.
+        :param run: the id of the run from `start_run`, kept in the index.
+        """
+        if not tasks:
+            return
+        entries = []
+        with open(self.archive_file, "ab") as archive:
+            offset = archive.seek(0, os.SEEK_END)
+            for start in range(0, len(tasks), CHUNK_SIZE):
+                chunk = tasks[start:start + CHUNK_SIZE]
+                data = gzip.compress(
+                    "".join(task_to_str(task) + "\n" for task in chunk).encode(
+                        "utf-8"
+                    )
+                )
+                archive.write(data)
+                entries.append(chunk_entry(chunk, offset, len(data), run))
+                offset += len(data)
+                count("files.bytes_written", len(data))
+            archive.flush()
+            os.fsync(archive.fileno())
+
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        with open(self.index_file, "a+b") as index:
+            # Start a new line after one cut off by a crash
+            if index.seek(0, os.SEEK_END):
+                index.seek(-1, os.SEEK_END)
+                if index.read(1) != b"\n":
+                    data = b"\n" + data
+            index.write(data)
+            index.flush()
+            os.fsync(index.fileno())
+        count("archive.chunks_written", len(entries))
+
+    def chunks(self):
+        """
+        :return: the index entries of every chunk, read again only when the
+        index file has changed.
+        """
+        stamp = file_stamp(self.index_file)
+        if stamp != self.index_stamp:
+            self.index = []
+            if stamp is not None:
+                with open(self.index_file, "r") as index:
+                    for line in index:
+                        try:
+                            self.index.append(json.loads(line))
+                        except ValueError:
+                            # Cut off by a crash, its chunk was never archived
+                            continue
+            self.index_stamp = stamp
+        return self.index
+
+    def task_count(self):
+        return sum(chunk["tasks"] for chunk in self.chunks())
+
+    def user_counts(self):
+        """
+        :return: a dictionary of username -> number of archived tasks, read
+        from the index without opening any chunk.
+        """
+        user_counts = {}
+        for chunk in self.chunks():
+            for username, user_count in chunk["users"].items():
+                user_counts[username] = user_counts.get(username, 0) + user_count
+        return user_counts
+
+    def find_tasks(self, username=None, due_from=None, due_to=None):
+        """
+        The generator `find_tasks` yields the archived tasks that pass the
+        filters, in the order they were archived. Chunks whose index entry
+        rules out every one of their tasks are skipped without being read.
+
+        :param username: only tasks assigned to this user.
+        :param due_from: only tasks due on or after this datetime.
+        :param due_to: only tasks due on or before this datetime.
+        :return: an iterator of (position in the archive, `Task`) tuples.
+        """
+        position = 0
+        for chunk in self.chunks():
+            first_position = position
+            position += chunk["tasks"]
+            if username is not None and username not in chunk["users"]:
+                continue
+            if due_from is not None and parse_date(chunk["due_to"]) < due_from:
+                continue
+            if due_to is not None and parse_date(chunk["due_from"]) > due_to:
+                continue
+
+            for chunk_position, task in enumerate(self.read_chunk(chunk)):
+                if username is not None and task.username != username:
+                    continue
+                if due_from is not None and task.due_date < due_from:
+                    continue
+                if due_to is not None and task.due_date > due_to:
+                    continue
+                yield first_position + chunk_position, task
+
+    def read_chunk(self, chunk):
+        """:return: the list of tasks in one chunk."""
+        with open(self.archive_file, "rb") as archive:
+            archive.seek(chunk["offset"])
+            data = archive.read(chunk["length"])
+        count("archive.chunks_read")
+        count("files.bytes_read", len(data))
+        lines = gzip.decompress(data).decode("utf-8").splitlines()
+        return [parse_task(line) for line in lines]
+
+
+def chunk_entry(tasks, offset, length, run=None):
+    """:return: the index entry of a chunk of tasks."""
+    users = {}
+    for task in tasks:
+        users[task.username] = users.get(task.username, 0) + 1
+    due_dates = [task.due_date for task in tasks]
+    return {
+        "offset": offset,
+        "length": length,
+        "tasks": len(tasks),
+        "users": users,
+        "due_from": min(due_dates).strftime(DATETIME_STRING_FORMAT),
+        "due_to": max(due_dates).strftime(DATETIME_STRING_FORMAT),
+        "run": run,
+    }
@@ -0,0 +1,424 @@
+# Command line interface for scripting the task manager.
+#
+# Runs one operation and exits instead of presenting the menu, so bulk
+# changes can be scripted. Each command applies its whole batch at once and
+# saves it in one go, then reports how many tasks per second it managed.
+#
+#   python task_cli.py add --user jason --title "Fix login" \
+#       --description "Users can't log in" --due 2024-03-01
+#   python task_cli.py bulk-import tasks.csv
+#   python task_cli.py reassign --from luke --to jason
+#   python task_cli.py complete --ids 3 7 12
+#   python task_cli.py complete --ids 3 --expect-title "Fix login"
+#   python task_cli.py archive --completed-before 2024-01-01
+#   python task_cli.py archive
+#   python task_cli.py report to
+#   python task_cli.py report uo --workers 8
+#   python task_cli.py report tr
+#   python task_cli.py stats
+#   python task_cli.py --perf text --profile import.prof bulk-import tasks.csv
+#
+# Imported task files are CSV with a header row, or JSON lines, with the
+# fields username, title, description, due_date and optionally
+# assigned_date (defaults to today) and completed (defaults to No).
+
+# =====importing libraries===========
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import date, datetime
+
+import task_manager
+from task_archive import ARCHIVE_AFTER_DAYS, default_cutoff
+from task_manager import MENU_LINES, get_storage, get_users
+from task_parallel import parallel_task_summary
+from task_perf import run_profiled, stats_json, stats_text
+from task_storage import Task, atomic_write, parse_date
+
+# Values accepted for "completed" in imported files
+COMPLETED_VALUES = {"yes": True, "true": True, "1": True}
+INCOMPLETE_VALUES = {"no": False, "false": False, "0": False, "": False}
+
+
+# =====Reading input===========
+
+
+def text_value(record, name):
+    """
+    The function `text_value` reads a required text field. Semicolons and
+    line breaks would corrupt the semicolon separated files, so they are
+    refused.
+
+    :raises ValueError: if the field is missing or invalid.
+    """
+    value = record.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{name}' is required")
+    if ";" in value or "\n" in value or "\r" in value:
+        raise ValueError(f"'{name}' may not contain ';' or line breaks")
+    return value
+
+
+def date_value(value):
+    """:raises ValueError: if `value` is not a YYYY-MM-DD date."""
+    try:
+        return parse_date(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' is not a date in the format YYYY-MM-DD")
+
+
+def record_to_task(record, today):
+    """
+    The function `record_to_task` builds a task from one imported record.
+
+    :param record: a dictionary of field name -> value.
+    :param today: the assigned date used when the record has none.
+    :return: a `Task`.
+    :raises ValueError: if the record is not a valid task.
+    """
+    username = get_users().get_username(text_value(record, "username"))
+    if username is None:
+        raise ValueError(f"user '{record['username']}' does not exist")
+
+    assigned_date = record.get("assigned_date")
+    completed = record.get("completed", False)
+    if not isinstance(completed, bool):
+        completed_text = str(completed).strip().lower()
+        if completed_text in COMPLETED_VALUES:
+            completed = COMPLETED_VALUES[completed_text]
+        elif completed_text in INCOMPLETE_VALUES:
+            completed = INCOMPLETE_VALUES[completed_text]
+        else:
+            raise ValueError(f"'{completed}' is not a valid completed value")
+
+    return Task(
+        username,
+        text_value(record, "title"),
+        text_value(record, "description"),
+        date_value(text_value(record, "due_date")),
+        date_value(assigned_date) if assigned_date else today,
+        completed,
+    )
+
+
+def read_records(file_name):
+    """
+    The generator `read_records` yields (line number, record) tuples from a
+    CSV file with a header row or, for files ending in .jsonl or .json, from
+    a file with one JSON object per line. "-" reads CSV from stdin.
+    """
+    if file_name.endswith((".jsonl", ".json")):
+        with open(file_name, "r", encoding="utf-8") as task_file:
+            for line_number, line in enumerate(task_file, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+        return
+
+    task_file = (
+        sys.stdin
+        if file_name == "-"
+        else open(file_name, "r", newline="", encoding="utf-8")
+    )
+    with task_file:
+        reader = csv.DictReader(task_file)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def report_throughput(action, count, elapsed):
+    rate = count / elapsed if elapsed else 0
+    print(f"{action} {count} tasks in {elapsed:.3f}s ({rate:.0f} tasks/s)")
+
+
+# =====Commands===========
+
+
+def add_command(args):
+    try:
+        task = record_to_task(
+            {
+                "username": args.user,
+                "title": args.title,
+                "description": args.description,
+                "due_date": args.due,
+            },
+            date.today(),
+        )
+    except ValueError as error:
+        print(f"Invalid task: {error}")
+        return 1
+    start = time.perf_counter()
+    task_id = get_storage().add_task(task)
+    elapsed = time.perf_counter() - start
+    print(f"Added task {task_manager.task_number(task_id)}")
+    report_throughput("Added", 1, elapsed)
+    return 0
+
+
+def bulk_import_command(args):
+    """
+    The function `bulk_import_command` adds every valid task in a file with
+    a single save. Invalid records are skipped and reported, like malformed
+    lines in tasks.txt.
+    """
+    start = time.perf_counter()
+    today = date.today()
+    tasks = []
+    invalid = []
+    try:
+        records = read_records(args.file)
+        for line_number, record in records:
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("expected an object")
+                tasks.append(record_to_task(record, today))
+            except ValueError as error:
+                invalid.append((line_number, error))
+    except (OSError, ValueError) as error:
+        print(f"Could not read {args.file}: {error}")
+        return 1
+
+    for line_number, error in invalid[:10]:
+        print(f"Skipping line {line_number}: {error}")
+    if len(invalid) > 10:
+        print(f"... and {len(invalid) - 10} more invalid records")
+
+    get_storage().add_tasks(tasks)
+    report_throughput("Imported", len(tasks), time.perf_counter() - start)
+    return 0 if not invalid else 1
+
+
+def reassign_command(args):
+    users = get_users()
+    from_user = users.get_username(args.from_user)
+    to_user = users.get_username(args.to_user)
+    for name, username in ((args.from_user, from_user), (args.to_user, to_user)):
+        if username is None:
+            print(f"{name} does not exist")
+            return 1
+
+    start = time.perf_counter()
+    changed = task_manager.reassign_user_tasks(from_user, to_user)
+    print(f"Tasks moved from {from_user} to {to_user}")
+    report_throughput("Reassigned", len(changed), time.perf_counter() - start)
+    return 0
+
+
+def complete_command(args):
+    storage = get_storage()
+    # Tasks are given by the numbers the menu shows them with
+    task_ids = [task_manager.task_id_for(number) for number in args.ids]
+    expected = None
+    if args.expect_title is not None:
+        if len(args.expect_title) != len(task_ids):
+            print("Give one --expect-title for each task number")
+            return 1
+        # Archiving renumbers the flat file tasks, so a task is only completed
+        # while its number still belongs to the task with the expected title
+        expected = {}
+        for task_id, title in zip(task_ids, args.expect_title):
+            task = storage.get_task(task_id)
+            if task is not None and task.title == title:
+                expected[task_id] = task
+
+    start = time.perf_counter()
+    changed = storage.complete_tasks(task_ids, expected)
+    elapsed = time.perf_counter() - start
+    for task_id in changed:
+        print(
+            f"Completed task {task_manager.task_number(task_id)}: "
+            + storage.get_task(task_id).title
+        )
+    report_throughput("Completed", len(changed), elapsed)
+    skipped = len(task_ids) - len(changed)
+    if skipped:
+        print(
+            f"Skipped {skipped} tasks that don't exist, were already complete "
+            + "or don't have the expected title"
+        )
+    return 0
+
+
+def archive_command(args):
+    if args.completed_before is None:
+        completed_before = default_cutoff()
+    else:
+        try:
+            completed_before = parse_date(args.completed_before)
+        except ValueError:
+            print(f"Invalid date: {args.completed_before}, use YYYY-MM-DD")
+            return 1
+    start = time.perf_counter()
+    archived = get_storage().archive_tasks(completed_before)
+    print(f"Completed tasks moved to {get_storage().task_archive().archive_file}")
+    report_throughput("Archived", archived, time.perf_counter() - start)
+    return 0
+
+
+def report_command(args):
+    start = time.perf_counter()
+    if args.report == "tr":
+        if args.workers:
+            print("The trend report is built from the history, not in parallel")
+            return 1
+        task_manager.trend_report()
+        return 0
+    if args.workers:
+        try:
+            task_count = parallel_report(args.report, args.workers)
+        except ValueError as error:
+            print(error)
+            return 1
+    else:
+        if args.report == "to":
+            task_manager.task_report()
+        else:
+            task_manager.user_report()
+        task_count = get_storage().task_count()
+    report_throughput("Reported on", task_count, time.perf_counter() - start)
+    return 0
+
+
+def parallel_report(report, workers):
+    """
+    The function `parallel_report` builds a report with `parallel_task_summary`
+    instead of loading every task, then saves and prints it like the menu
+    does.
+
+    :return: the number of tasks reported on.
+    """
+    current_date = datetime.today()
+    summary = parallel_task_summary(get_storage(), current_date, workers)
+    if report == "to":
+        file_name = task_manager.TASK_OVERVIEW_FILE
+        del summary["users"]
+        report_text = task_manager.task_report_text(current_date, summary)
+    else:
+        file_name = task_manager.USER_OVERVIEW_FILE
+        report_text = task_manager.user_report_text(current_date, summary)
+    atomic_write(file_name, report_text)
+    print(report_text)
+    return summary["total"]
+
+
+def stats_command(args):
+    print(MENU_LINES)
+    print(f"Number of users: \t\t {task_manager.user_stats()}")
+    print(f"Number of tasks: \t\t {task_manager.task_stats()}")
+    print(MENU_LINES)
+    return 0
+
+
+def task_id_list(value):
+    """Parses "3", or a comma separated list such as "3,7,12", into numbers."""
+    try:
+        return [int(number) for number in value.split(",") if number]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid task number list: '{value}'")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Run task manager operations without the menu."
+    )
+    parser.add_argument(
+        "--perf",
+        choices=["text", "json"],
+        help="print the timings and counters collected while running",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="run under cProfile and save the profile to FILE",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="add one task")
+    add_parser.add_argument("--user", required=True)
+    add_parser.add_argument("--title", required=True)
+    add_parser.add_argument("--description", required=True)
+    add_parser.add_argument("--due", required=True, help="YYYY-MM-DD")
+    add_parser.set_defaults(run=add_command)
+
+    import_parser = commands.add_parser(
+        "bulk-import", help="add every task in a CSV or JSON lines file"
+    )
+    import_parser.add_argument("file", help="a .csv or .jsonl file, - for stdin")
+    import_parser.set_defaults(run=bulk_import_command)
+
+    reassign_parser = commands.add_parser(
+        "reassign", help="move every incomplete task from one user to another"
+    )
+    reassign_parser.add_argument("--from", dest="from_user", required=True)
+    reassign_parser.add_argument("--to", dest="to_user", required=True)
+    reassign_parser.set_defaults(run=reassign_command)
+
+    complete_parser = commands.add_parser(
+        "complete", help="mark tasks as complete"
+    )
+    complete_parser.add_argument(
+        "--ids",
+        required=True,
+        nargs="+",
+        type=task_id_list,
+        help="task numbers as the menu shows them, separated by spaces or commas",
+    )
+    complete_parser.add_argument(
+        "--expect-title",
+        action="append",
+        metavar="TITLE",
+        help="the title each task must still have, once for every number in the "
+        + "same order, other tasks are skipped",
+    )
+    complete_parser.set_defaults(run=complete_command)
+
+    archive_parser = commands.add_parser(
+        "archive", help="move old completed tasks to the archive"
+    )
+    archive_parser.add_argument(
+        "--completed-before",
+        help="archive tasks completed before this date, YYYY-MM-DD "
+        + f"(default: {ARCHIVE_AFTER_DAYS} days ago)",
+    )
+    archive_parser.set_defaults(run=archive_command)
+
+    report_parser = commands.add_parser("report", help="generate a report")
+    report_parser.add_argument(
+        "report",
+        choices=["to", "uo", "tr"],
+        help="task overview, user overview or trends over time",
+    )
+    report_parser.add_argument(
+        "--workers",
+        type=int,
+        help="count the tasks in this many processes (flatfile storage only)",
+    )
+    report_parser.set_defaults(run=report_command)
+
+    stats_parser = commands.add_parser("stats", help="count users and tasks")
+    stats_parser.set_defaults(run=stats_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "complete":
+        # --ids 1,2 3 gives [[1, 2], [3]]
+        args.ids = [number for group in args.ids for number in group]
+    try:
+        return run_profiled(lambda: args.run(args), args.profile)
+    finally:
+        # Commands that never needed the storage didn't open it
+        if task_manager.storage is not None:
+            task_manager.storage.close()
+        if args.perf == "json":
+            print(stats_json())
+        elif args.perf == "text":
+            print(stats_text())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+# History of task changes and the trend reports built from it.
+#
+# Every change to a task is appended to a history file next to the task
+# data with the time it happened, one line per change:
+#   <unix time>;created;<task id>;<username>;<due date>;<assigned date>
+#   <unix time>;reassigned;<task id>;<new username>
+#   <unix time>;due_date;<task id>;<new due date>;<old due date>
+#   <unix time>;completed;<task id>;<username>;<assigned date>;<due date>
+#   <unix time>;removed;<task ids separated by commas>;<archiving run>
+# Removed tasks were archived from a storage where task ids are positions,
+# so the tasks after each of them move down to fill the gap. A run that
+# was cut off by a crash records them again when it is finished, and only
+# the first record of each run counts. Each backend
+# keeps its own history, e.g. tasks_history.txt for tasks.txt and
+# tasks_db_history.txt for tasks.db, as their task ids differ. The history
+# is started with a created record for every incomplete task, so the
+# overdue backlog covers tasks added before it existed.
+#
+# The trend reports come from rollups (counts per week and per user, and the
+# number of open tasks per due date) that are saved next to the history,
+# e.g. in tasks_trends.json, together with how much of the history they
+# include. Each report only reads the records added since the last one.
+
+# =====importing libraries===========
+import bisect
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from task_perf import count, timed
+from task_reports import overdue_cutoff
+from task_storage import atomic_write, file_lock
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def history_files(data_file):
+    """
+    The function `history_files` names the history and trends files of the
+    tasks stored in `data_file`, the way the journals are named.
+
+    :return: a tuple of (history file, trends file), e.g.
+    ("tasks_history.txt", "tasks_trends.json") for tasks.txt and
+    ("tasks_bin_history.txt", "tasks_bin_trends.json") for tasks.bin.
+    """
+    root, extension = os.path.splitext(data_file)
+    if extension != ".txt":
+        root += "_" + extension.lstrip(".")
+    return root + "_history.txt", root + "_trends.json"
+
+
+def week_start(day):
+    """:return: the Monday of the week `day` falls in, as a date."""
+    return day - timedelta(days=day.weekday())
+
+
+def format_date(value):
+    return value.strftime(DATE_FORMAT)
+
+
+def record_fields(action, task_id, value):
+    """:return: the fields of a history record, after the time."""
+    if action == "created":
+        return [
+            action,
+            str(task_id),
+            value.username,
+            format_date(value.due_date),
+            format_date(value.assigned_date),
+        ]
+    if action == "completed":
+        return [
+            action,
+            str(task_id),
+            value.username,
+            format_date(value.assigned_date),
+            format_date(value.due_date),
+        ]
+    if action == "due_date":
+        # `value` is a tuple of (new due date, old due date)
+        return [action, str(task_id), format_date(value[0]), format_date(value[1])]
+    if action == "removed":
+        # `task_id` is the list of the removed task ids, `value` the run
+        return [action, ",".join(str(removed_id) for removed_id in task_id), value]
+    return [action, str(task_id), value]
+
+
+def renumber(values, removed):
+    """
+    :param values: a dictionary of task id -> value.
+    :param removed: the sorted ids of removed tasks.
+    :return: `values` without the removed tasks, with the ids of the tasks
+    after each of them moved down to fill the gaps.
+    """
+    removed_ids = set(removed)
+    return {
+        task_id - bisect.bisect_left(removed, task_id): value
+        for task_id, value in values.items()
+        if task_id not in removed_ids
+    }
+
+
+# =====Recording changes===========
+
+
+class TaskHistory:
+    """
+    The class `TaskHistory` appends task changes to the history file. The
+    storage backends call it after each change they make, see
+    `TaskStorage.record_history`.
+    """
+
+    def __init__(self, history_file, trends_file):
+        self.history_file = history_file
+        self.trends_file = trends_file
+        self.lock_file = history_file + ".lock"
+        self.is_started = False
+
+    def started(self):
+        """:return: `True` once the history file has any records."""
+        if not self.is_started:
+            try:
+                self.is_started = os.path.getsize(self.history_file) > 0
+            except FileNotFoundError:
+                pass
+        return self.is_started
+
+    def start(self, tasks):
+        """
+        The method `start` records every task in `tasks` as created, unless
+        another session has started the history in the meantime.
+
+        :param tasks: an iterable of (task id, `Task`) tuples, only read if
+        the history is started now.
+        """
+        with file_lock(self.lock_file):
+            self.is_started = False
+            if not self.started():
+                self.write([("created", task_id, task) for task_id, task in tasks])
+                self.is_started = True
+
+    def append(self, records):
+        """
+        The method `append` adds records to the history with a single write.
+
+        :param records: a list of (action, task id, value) tuples, where the
+        action is "created" or "completed" with the `Task` as the value,
+        "reassigned" with the new username, "due_date" with a tuple of the
+        new and the old due date, or ("removed", list of task ids, id of the
+        archiving run).
+        """
+        if not records:
+            return
+        with file_lock(self.lock_file):
+            self.write(records)
+        self.is_started = True
+
+    def write(self, records):
+        """Appends records to the history file, while holding the lock."""
+        timestamp = str(int(time.time()))
+        data = "".join(
+            timestamp + ";" + ";".join(record_fields(*record)) + "\n"
+            for record in records
+        ).encode("utf-8")
+        with open(self.history_file, "ab") as history_file:
+            history_file.write(data)
+        count("history.records_written", len(records))
+
+    @timed("history.completion_times")
+    def completion_times(self):
+        """
+        The method `completion_times` works out when the tasks that are
+        complete now were completed, following the task ids through the
+        removed records.
+
+        :return: a tuple of (dictionary of task id -> unix time the task was
+        completed, unix time the history started). Tasks completed before
+        the history started are not in the dictionary.
+        """
+        completed_at = {}
+        started_at = None
+        finished_runs = set()
+        try:
+            with open(self.history_file, "rb") as history_file:
+                for raw_line in history_file:
+                    if not raw_line.endswith(b"\n"):
+                        break
+                    fields = raw_line.decode("utf-8").rstrip("\n").split(";")
+                    try:
+                        timestamp = int(fields[0])
+                        if started_at is None:
+                            started_at = timestamp
+                        if fields[1] == "completed":
+                            completed_at[int(fields[2])] = timestamp
+                        elif fields[1] == "removed" and fields[3] not in finished_runs:
+                            finished_runs.add(fields[3])
+                            removed = sorted(int(i) for i in fields[2].split(","))
+                            completed_at = renumber(completed_at, removed)
+                    except (ValueError, IndexError):
+                        continue
+        except FileNotFoundError:
+            pass
+        if started_at is None:
+            started_at = int(time.time())
+        return completed_at, started_at
+
+    def reset(self):
+        """
+        The method `reset` throws the history and the trends away, e.g. when
+        the tasks have been replaced by a migration and the recorded task ids
+        no longer mean anything.
+        """
+        with file_lock(self.lock_file):
+            for file_name in (self.history_file, self.trends_file):
+                try:
+                    os.remove(file_name)
+                except FileNotFoundError:
+                    pass
+            self.is_started = False
+
+    # =====Trend reports===========
+
+    @timed("history.update_trends")
+    def trends(self, current_date=None):
+        """
+        The method `trends` brings the saved rollups up to date with the
+        records added since they were last saved and returns them.
+
+        :param current_date: the datetime the backlog is worked out for,
+        defaults to now.
+        :return: a `TrendRollup`.
+        """
+        current_date = current_date or datetime.now()
+        with file_lock(self.lock_file):
+            rollup = TrendRollup.load(self.trends_file)
+            try:
+                size = os.path.getsize(self.history_file)
+            except FileNotFoundError:
+                size = 0
+            if size < rollup.offset:
+                # The history has been replaced, start again
+                rollup = TrendRollup()
+            if size > rollup.offset:
+                with open(self.history_file, "rb") as history_file:
+                    history_file.seek(rollup.offset)
+                    for raw_line in history_file:
+                        # Cut off mid write, it will be read once complete
+                        if not raw_line.endswith(b"\n"):
+                            break
+                        rollup.offset += len(raw_line)
+                        rollup.apply(raw_line.decode("utf-8").rstrip("\n"))
+            rollup.sample_backlog(current_date.timestamp())
+            atomic_write(self.trends_file, json.dumps(rollup.to_json()))
+        return rollup
+
+
+class TrendRollup:
+    """
+    The class `TrendRollup` keeps the running totals behind the trend
+    reports:
+      * per week, the tasks assigned that week and how many of those have
+        been completed since, for the completion rate,
+      * tasks completed and the total time they took per user,
+      * the number of open tasks per due date, from which the overdue
+        backlog is counted at the end of each week.
+    Records are applied one at a time in the order they were written, and
+    each one changes a few counters, so the saved rollups only grow with the
+    number of weeks, users and due dates.
+    """
+
+    def __init__(self):
+        # bytes of the history already applied
+        self.offset = 0
+        # week start (YYYY-MM-DD) -> [assigned, completed], counted in the
+        # week the tasks were assigned
+        self.weeks = {}
+        # username -> [tasks completed, days they took in total]
+        self.users = {}
+        # due date ordinal -> number of incomplete tasks due then
+        self.due_counts = {}
+        # [week start, overdue tasks at the end of the week]
+        self.backlog = []
+        # unix time of the next week end to count the backlog at
+        self.next_sample = None
+
+    @classmethod
+    def load(cls, trends_file):
+        rollup = cls()
+        try:
+            with open(trends_file, "r") as saved_file:
+                saved = json.load(saved_file)
+        except (FileNotFoundError, ValueError):
+            return rollup
+        if "due_counts" not in saved:
+            return rollup  # saved by an older version, start again
+        rollup.offset = saved["offset"]
+        rollup.weeks = saved["weeks"]
+        rollup.users = saved["users"]
+        rollup.due_counts = {
+            int(due): due_count for due, due_count in saved["due_counts"].items()
+        }
+        rollup.backlog = saved["backlog"]
+        rollup.next_sample = saved["next_sample"]
+        return rollup
+
+    def to_json(self):
+        return {
+            "offset": self.offset,
+            "weeks": self.weeks,
+            "users": self.users,
+            "due_counts": self.due_counts,
+            "backlog": self.backlog,
+            "next_sample": self.next_sample,
+        }
+
+    def week_counts(self, day):
+        key = format_date(week_start(day))
+        counts = self.weeks.get(key)
+        if counts is None:
+            counts = self.weeks[key] = [0, 0]
+        return counts
+
+    def add_due(self, due_date, amount):
+        """Adds `amount` open tasks due on `due_date`, a YYYY-MM-DD string."""
+        due = datetime.strptime(due_date, DATE_FORMAT).toordinal()
+        due_count = self.due_counts.get(due, 0) + amount
+        if due_count > 0:
+            self.due_counts[due] = due_count
+        else:
+            self.due_counts.pop(due, None)
+
+    def sample_backlog(self, timestamp):
+        """Counts the overdue backlog at every week end before `timestamp`."""
+        while self.next_sample is not None and self.next_sample <= timestamp:
+            week_end = datetime.fromtimestamp(self.next_sample)
+            end_ordinal = week_end.toordinal()
+            overdue = sum(
+                due_count
+                for due, due_count in self.due_counts.items()
+                if due < end_ordinal
+            )
+            self.backlog.append(
+                [format_date(week_end.date() - timedelta(days=7)), overdue]
+            )
+            self.next_sample = (week_end + timedelta(days=7)).timestamp()
+
+    def apply(self, line):
+        """The method `apply` adds one history record to the rollups."""
+        fields = line.split(";")
+        try:
+            timestamp = int(fields[0])
+            action = fields[1]
+            task_id = None if action == "removed" else int(fields[2])
+        except (ValueError, IndexError):
+            count("history.invalid_records")
+            return
+
+        if self.next_sample is None:
+            first_week = week_start(date.fromtimestamp(timestamp))
+            self.next_sample = datetime.combine(
+                first_week + timedelta(days=7), datetime.min.time()
+            ).timestamp()
+        self.sample_backlog(timestamp)
+
+        try:
+            if action == "created":
+                assigned_date = datetime.strptime(fields[5], DATE_FORMAT)
+                self.add_due(fields[4], 1)
+                self.week_counts(assigned_date)[0] += 1
+            elif action == "due_date":
+                self.add_due(fields[4], -1)
+                self.add_due(fields[3], 1)
+            elif action == "completed":
+                completed_at = datetime.fromtimestamp(timestamp)
+                assigned_date = datetime.strptime(fields[4], DATE_FORMAT)
+                self.add_due(fields[5], -1)
+                # Only tasks assigned that week, so the rate can't pass 100%
+                self.week_counts(assigned_date)[1] += 1
+                user_counts = self.users.setdefault(fields[3], [0, 0.0])
+                user_counts[0] += 1
+                user_counts[1] += (completed_at - assigned_date) / timedelta(days=1)
+            # Reassigning changes nothing the trends count, and removed tasks
+            # were completed already
+        except (ValueError, IndexError):
+            count("history.invalid_records")
+
+    def overdue_now(self, current_date):
+        """:return: the number of open tasks overdue on `current_date`."""
+        cutoff = overdue_cutoff(current_date)
+        return sum(
+            due_count
+            for due, due_count in self.due_counts.items()
+            if datetime.fromordinal(due) < cutoff
+        )
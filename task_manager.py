@@ -8,66 +8,48 @@
 # =====importing libraries===========
 import os
 from datetime import date, datetime
+from itertools import islice
+
+from task_archive import default_cutoff
+from task_storage import (
+    DATETIME_STRING_FORMAT,
+    Task,
+    TaskConflictError,
+    atomic_write,
+    open_storage,
+)
+from task_perf import count, run_profiled, stats_json, stats_text, timer
+from task_scheduler import DeadlineScheduler
+from task_users import UserRegistry, register_user, upgrade_password
 
-DATETIME_STRING_FORMAT = "%Y-%m-%d"
 MENU_LINES = "=" * 40
+# Number of tasks shown per page by view_all
+PAGE_SIZE = 10
+# How many days ahead view_deadlines looks for tasks coming up
+UPCOMING_DAYS = 7
 
+TASK_STATUS_OPTIONS = {
+    "c": "complete",
+    "i": "incomplete",
+    "o": "overdue",
+    "a": "archived",
+}
 
-# =====Functions for program logic===========
-
-
-def clear_terminal():
-    os.system("cls" if os.name == "nt" else "clear")
-
+TASK_OVERVIEW_FILE = "task_overview.txt"
+USER_OVERVIEW_FILE = "user_overview.txt"
+TREND_REPORT_FILE = "trend_report.txt"
+# Number of weeks shown by the trend report
+TREND_WEEKS = 12
 
-def create_task_list(task_data):
-    """
-    The function `create_task_list` takes a list of task data strings and
-    converts them into a list of dictionaries representing tasks.
-
-    :param task_data: The `task_data` parameter is a list of strings,
-    where each string represents task data
-    :return: a list of dictionaries, where each dictionary represents a task.
-    """
-    task_list = []
-    for task_str in task_data:
-        curr_task = {}
-
-        # Split by semicolon and manually add each component
-        task_components = task_str.split(";")
-        curr_task["username"] = task_components[0]
-        curr_task["title"] = task_components[1]
-        curr_task["description"] = task_components[2]
-        curr_task["due_date"] = datetime.strptime(
-            task_components[3], DATETIME_STRING_FORMAT
-        )
-        curr_task["assigned_date"] = datetime.strptime(
-            task_components[4], DATETIME_STRING_FORMAT
-        )
-        curr_task["completed"] = True if task_components[5] == "Yes" else False
+# file name -> (cache key, report text) of the last report generated
+report_cache = {}
 
-        task_list.append(curr_task)
 
-    return task_list
-
-
-def create_user_data_dict(user_data):
-    """
-    The function `create_user_data_dict` takes a list of user data in the
-    format "username;password" and returns a dictionary where the usernames
-    are the keys and the passwords are the values.
+# =====Functions for program logic===========
 
-    :param user_data: A list of strings where each string represents user data
-    in the format "username;password"
-    :return: a dictionary where the keys are usernames and the values are
-    passwords.
-    """
-    username_password = {}
-    for user in user_data:
-        username, password = user.split(";")
-        username_password[username] = password
 
-    return username_password
+def clear_terminal():
+    os.system("cls" if os.name == "nt" else "clear")
 
 
 def reg_user():
@@ -92,13 +74,8 @@ def reg_user():
     if new_password == confirm_password:
         # - If they are the same, add them to the user.txt file,
         print(f"\n{MENU_LINES}\n New user added \n{MENU_LINES}\n")
-        username_password[new_username] = new_password
-        # --- Open and write user data to file
-        with open("user.txt", "w") as out_file:
-            user_data = []
-            for k in username_password:
-                user_data.append(f"{k};{username_password[k]}")
-            out_file.write("\n".join(user_data))
+        # the password is stored hashed
+        register_user(get_storage(), get_users(), new_username, new_password)
     # ---- Otherwise you present a relevant message.
     else:
         print(f"\n{MENU_LINES}\n Passwords do no match \n{MENU_LINES}\n")
@@ -107,31 +84,15 @@ def reg_user():
 def check_user_name(username):
     """
     The function `check_user_name` checks if a given username is available by
-    searching through a file
-    called "user.txt" and returning `False` if the username is not found.
+    looking it up, ignoring letter case, in the in-memory user registry and
+    returning `False` if the username is not found.
 
     :param new_username: The new_username parameter is a string that represents
     the username that needs to be checked for availability
-    :return: `None` if the user name already exists in the `user.txt` file,
-    and it is returning `False`
-    if the user name is available.
-    """
-    """Checks through tasks.txt to see if the user name is available"""
-    with open("user.txt", "r+") as check_user:
-        data = check_user.read()
-        # strips data and sorts into lists
-        clean_data = [i.strip().split(";") for i in data.split("\n")]
-
-    # ---- loop through lists and verifies 0-index against user input
-    user_exits = False
-    for i in clean_data:
-        if i[0].lower() == username.lower():
-            user_exits = True
-
-    if user_exits:
-        return True
-    else:
-        return False
+    :return: `True` if the user name already exists in storage,
+    and `False` if the user name is available.
+    """
+    return get_users().exists(username)
 
 
 def add_task():
@@ -143,8 +104,10 @@ def add_task():
      - the due date of the task."""
 
     while True:
-        task_username = input("Name of person assigned to task: ")
-        if task_username not in username_password.keys():
+        task_username = get_users().get_username(
+            input("Name of person assigned to task: ")
+        )
+        if task_username is None:
             print("User does not exist. Please enter a valid username")
             continue
         task_title = input("Title of Task: ")
@@ -164,54 +127,243 @@ def add_task():
 
         # Gets the current date.
         curr_date = date.today()
-        # Adds the data to the file task.txt and
+        # Adds the task to storage and
         # includes 'No' to indicate if the task is complete.
-        new_task = {
-            "username": task_username,
-            "title": task_title,
-            "description": task_description,
-            "due_date": due_date_time,
-            "assigned_date": curr_date,
-            "completed": False,
-        }
-
-        task_list.append(new_task)
-        with open("tasks.txt", "w") as task_file:
-            task_list_to_write = []
-            for t in task_list:
-                str_attrs = [
-                    t["username"],
-                    t["title"],
-                    t["description"],
-                    t["due_date"].strftime(DATETIME_STRING_FORMAT),
-                    t["assigned_date"].strftime(DATETIME_STRING_FORMAT),
-                    "Yes" if t["completed"] else "No",
-                ]
-                task_list_to_write.append(";".join(str_attrs))
-            task_file.write("\n".join(task_list_to_write))
+        new_task = Task(
+            task_username,
+            task_title,
+            task_description,
+            due_date_time,
+            curr_date,
+            False,
+        )
+
+        version = scheduler_version_before_change()
+        with timer("add_task.save"):
+            task_id = get_storage().add_task(new_task)
+        update_scheduler(version, "task_added", task_id, new_task)
         print("\n>>>Task successfully added<<<")
         break
 
 
-def view_all():
-    """Reads the task from task.txt file and prints to the console in the
-    format of Output 2 presented in the task pdf (i.e. includes spacing
-    and labelling)
+def task_number(task_id):
+    """
+    The function `task_number` gives the number a task is shown with. Tasks
+    are numbered from 1, whichever backend stores them.
     """
+    return task_id - get_storage().FIRST_TASK_ID + 1
 
-    for j, t in enumerate(task_list, start=1):
-        disp_str = f"{j}.Task: \t {t['title']}\n"
-        disp_str += f"Assigned to: \t {t['username']}\n".title()
-        disp_str += (
-            f"Date Assigned: \t {t['assigned_date'].strftime(DATETIME_STRING_FORMAT)}\n"
+
+def task_id_for(number):
+    """:return: the task id of the task shown with `number`."""
+    return number + get_storage().FIRST_TASK_ID - 1
+
+
+def render_tasks(tasks):
+    """
+    The generator `render_tasks` turns (number, task) tuples into the text
+    shown by `view_all`, one task at a time, so only the tasks that are
+    actually displayed get formatted.
+
+    :param tasks: an iterable of (number shown, Task) tuples.
+    """
+    for number, t in tasks:
+        yield "".join(
+            [
+                f"{number}.Task: \t {t.title}\n",
+                f"Assigned to: \t {t.username}\n".title(),
+                "Date Assigned: \t "
+                + f"{t.assigned_date.strftime(DATETIME_STRING_FORMAT)}\n",
+                f"Due Date: \t {t.due_date.strftime(DATETIME_STRING_FORMAT)}\n",
+                f"Task Description: \n {t.description}\n",
+                f"Task completed: {'Yes' if t.completed else 'No'}\n",
+            ]
         )
-        disp_str += f"Due Date: \t {t['due_date'].strftime(DATETIME_STRING_FORMAT)}\n"
-        disp_str += f"Task Description: \n {t['description']}\n"
-        disp_str += f"Task completed: {'Yes' if t['completed'] else 'No'}\n"
-        print(disp_str)
 
 
-def task_editor(user_tasks):
+def read_date_filter(prompt):
+    """
+    The function `read_date_filter` asks for an optional date.
+
+    :param prompt: the text shown to the user.
+    :return: the date as a datetime, or None if left blank.
+    """
+    while True:
+        date_string = input(prompt).strip()
+        if not date_string:
+            return None
+        try:
+            return datetime.strptime(date_string, DATETIME_STRING_FORMAT)
+        except ValueError:
+            print("Invalid datetime format. Please use the format specified")
+
+
+def read_task_filters():
+    """
+    The function `read_task_filters` asks which tasks `view_all` should show.
+
+    :return: a dictionary of filters for `matching_tasks`.
+    """
+    filters = {}
+    username = input("\nAssigned to (leave blank for everyone): ").strip()
+    if username:
+        # An unknown user is kept as typed so it simply matches no tasks
+        filters["username"] = get_users().get_username(username) or username
+
+    status = input(
+        "Status - c complete, i incomplete, o overdue, a archived "
+        + "(leave blank for all but archived): "
+    ).strip().lower()
+    if status in TASK_STATUS_OPTIONS:
+        filters["status"] = TASK_STATUS_OPTIONS[status]
+
+    filters["due_from"] = read_date_filter(
+        "Due on or after (YYYY-MM-DD, leave blank for any): "
+    )
+    filters["due_to"] = read_date_filter(
+        "Due on or before (YYYY-MM-DD, leave blank for any): "
+    )
+
+    text = input(
+        "Containing the words (end a word with * to match its start, "
+        + "leave blank for any): "
+    ).strip()
+    if text:
+        filters["text"] = text
+    return filters
+
+
+def matching_tasks(filters):
+    """
+    The function `matching_tasks` finds the tasks that pass the filters from
+    `read_task_filters`. Tasks found by their words come best match first,
+    otherwise they come in task id order.
+
+    :return: an iterator of (number shown, Task) tuples.
+    """
+    filters = dict(filters)
+    text = filters.pop("text", None)
+    storage = get_storage()
+    if filters.get("status") == "archived":
+        del filters["status"]
+        return archived_tasks(text, filters)
+    if text:
+        tasks = storage.search_tasks(text, current_date=datetime.today(), **filters)
+    else:
+        tasks = storage.find_tasks(current_date=datetime.today(), **filters)
+    return ((task_number(task_id), task) for task_id, task in tasks)
+
+
+def archived_tasks(text, filters):
+    """
+    The generator `archived_tasks` finds archived tasks for `view_all`. Only
+    the archive chunks that can hold matching tasks are read, and they are
+    read as pages are requested. Archived tasks are numbered "a<number>",
+    counting from a1 in the order they were archived, as they can't be
+    edited.
+
+    :param text: words that must all appear in the title or description,
+    searched for as plain text as archived tasks have no search index.
+    :param filters: the other filters from `read_task_filters`.
+    :return: an iterator of (number, Task) tuples.
+    """
+    words = text.lower().replace("*", "").split() if text else []
+    for position, task in get_storage().task_archive().find_tasks(**filters):
+        task_text = f"{task.title} {task.description}".lower()
+        if all(word in task_text for word in words):
+            yield f"a{position + 1}", task
+
+
+def view_all():
+    """Prints the tasks to the console a page at a time in the format of
+    Output 2 presented in the task pdf (i.e. includes spacing and labelling).
+
+    Matching tasks are fetched from storage as pages are requested, so the
+    first page shows straight away however many tasks there are. The user
+    can move between pages, jump to a page, change the page size and filter
+    the tasks by user, status, due date and the words they contain.
+    """
+    get_storage().refresh()  # picks up changes made by other sessions
+    filters = {}
+    page_size = PAGE_SIZE
+    page = 0
+    results = matching_tasks(filters)
+    fetched = []  # matches taken from `results` so far
+    exhausted = False
+
+    while True:
+        # Fetch up to the end of the page, plus one to know if there is more
+        needed = (page + 1) * page_size + 1
+        if not exhausted and len(fetched) < needed:
+            with timer("view_all.fetch"):
+                new_tasks = list(islice(results, needed - len(fetched)))
+            fetched.extend(new_tasks)
+            exhausted = len(fetched) < needed
+
+        if not fetched:
+            print("\nNo tasks match.\n")
+        else:
+            # Jumping past the end shows the last page instead
+            last_page = (len(fetched) - 1) // page_size
+            if page > last_page:
+                page = last_page
+            start = page * page_size
+            with timer("view_all.render_page"):
+                page_tasks = fetched[start:start + page_size]
+                for disp_str in render_tasks(page_tasks):
+                    print(disp_str)
+            count("view_all.tasks_rendered", len(page_tasks))
+
+        page_count = ""
+        if exhausted:
+            page_count = f" of {max(1, -(-len(fetched) // page_size))}"
+        print(f"{MENU_LINES}\nPage {page + 1}{page_count}\n{MENU_LINES}")
+        option = input(
+            """n - next page
+p - previous page
+<number> - jump to page
+f - filter tasks
+s - change page size
+-1 - back to menu
+: """
+        ).strip().lower()
+
+        if option == "n":
+            if exhausted and (page + 1) * page_size >= len(fetched):
+                print("\nThis is the last page.")
+            else:
+                page += 1
+        elif option == "p":
+            if page == 0:
+                print("\nThis is the first page.")
+            else:
+                page -= 1
+        elif option == "f":
+            filters = read_task_filters()
+            results = matching_tasks(filters)
+            fetched = []
+            exhausted = False
+            page = 0
+        elif option == "s":
+            try:
+                new_page_size = int(input("Tasks per page: "))
+            except ValueError:
+                new_page_size = 0
+            if new_page_size < 1:
+                print("Invalid input. Please enter a positive number.")
+            else:
+                # Stay on the page showing the same first task
+                page = page * page_size // new_page_size
+                page_size = new_page_size
+        elif option == "-1":
+            return
+        elif option.isdigit() and int(option) >= 1:
+            page = int(option) - 1
+        else:
+            print("Invalid option. Please choose a valid option from the list")
+
+
+def task_editor(current_user):
     """
     The `task_editor` function allows the user to update tasks and then saves
     the updated tasks to 'tasks.txt'.The following data can be updated by the
@@ -220,24 +372,26 @@ def task_editor(user_tasks):
     * re-assigning the user
     * mark task as complete
 
-    :param user_tasks: user_tasks is a list of dictionaries representing
-    tasks. Each dictionary contains the following keys:
+    :param current_user: the username of the logged in user, only their own
+    tasks can be selected.
     """
     try:
-        select_task = int(
+        number = int(
             input(
                 "Select which task you would like to update or enter"
                 + "'-1' to go back: "
             )
         )
 
-        if select_task == -1:
+        if number == -1:
             return  # This will exit the function and return to menu
 
-        # checks user selection is valid
-        if select_task >= 1 and select_task <= len(user_tasks):
-            selected_task = user_tasks[select_task - 1]
-            if selected_task["completed"]:
+        # checks user selection is valid, tasks are selected by the number
+        # `view_mine` showed
+        task_id = task_id_for(number)
+        selected_task = get_storage().get_task(task_id)
+        if selected_task is not None and selected_task.username == current_user:
+            if selected_task.completed:
                 print(
                     "\nThis task is marked as complete "
                     + "and can no longer be edited.")
@@ -253,13 +407,22 @@ c  - mark as complete\n
                     new_user = input(
                         "\nPlease enter the name of the user you would like"
                         + "to assign this task to: "
-                    ).lower()
+                    )
                     if not check_user_name(
                         new_user
                     ):  # function return False if user does not exist
                         print(f"\n{new_user} does not exist")
                     else:
-                        selected_task["username"] = new_user
+                        # Tasks are stored under the registered spelling
+                        new_user = get_users().get_username(new_user)
+                        version = scheduler_version_before_change()
+                        with timer("task_editor.save"):
+                            get_storage().reassign_task(
+                                task_id, new_user, selected_task
+                            )
+                        update_scheduler(
+                            version, "task_reassigned", task_id, new_user
+                        )
                         print(
                             f"\n{MENU_LINES}\nTask has been allocated to "
                             + f"{new_user}\n{MENU_LINES}\n"
@@ -273,7 +436,14 @@ c  - mark as complete\n
                         due_date_time = datetime.strptime(
                             new_due_date, DATETIME_STRING_FORMAT
                         )
-                        selected_task["due_date"] = due_date_time
+                        version = scheduler_version_before_change()
+                        with timer("task_editor.save"):
+                            get_storage().set_due_date(
+                                task_id, due_date_time, selected_task
+                            )
+                        update_scheduler(
+                            version, "due_date_changed", task_id, due_date_time
+                        )
                         print(f"\n{MENU_LINES}\nDue date updated.\n{MENU_LINES}\n")
                     except ValueError:
                         print(
@@ -281,7 +451,10 @@ c  - mark as complete\n
                             + "the format specified."
                         )
                 elif edit_task == "c":
-                    selected_task["completed"] = True
+                    version = scheduler_version_before_change()
+                    with timer("task_editor.save"):
+                        get_storage().complete_task(task_id, selected_task)
+                    update_scheduler(version, "task_completed", task_id)
                     print(
                         f"\n{MENU_LINES}This task has been "
                         + f"marked as complete.\n{MENU_LINES}\n"
@@ -292,23 +465,11 @@ c  - mark as complete\n
         else:
             print("Invalid task number. Please enter a valid task number.")
 
-        with open("tasks.txt", "w") as task_file:
-            task_list_to_write = []
-            for t in task_list:
-                str_attrs = [
-                    t["username"],
-                    t["title"],
-                    t["description"],
-                    t["due_date"].strftime(DATETIME_STRING_FORMAT),
-                    t["assigned_date"].strftime(DATETIME_STRING_FORMAT),
-                    "Yes" if t["completed"] else "No",
-                ]
-                task_list_to_write.append(";".join(str_attrs))
-            task_file.write("\n".join(task_list_to_write))
-            print(f"\n{MENU_LINES}\nYour task list has been updated.\n{MENU_LINES}\n")
-
     except ValueError:
         print("Invalid input. Please enter a valid number.")
+    except TaskConflictError as error:
+        # Another session changed the task after it was shown
+        print(f"\n{error}")
 
 
 def view_mine(current_user):
@@ -317,75 +478,325 @@ def view_mine(current_user):
     and labelling)
     """
 
-    j = 1  # Create numbers for tasks
-    # if current_user in task_list:
-    user_tasks = [t for t in task_list if t.get("username") == current_user]
-    for t in user_tasks:
-        disp_str = f"\n{j}.Task: \t {t['title']}\n"
-        disp_str += f"Assigned to: \t {t['username']}\n"
-        disp_str += (
-            f"Date Assigned: \t {t['assigned_date'].strftime(DATETIME_STRING_FORMAT)}\n"
-        )
-        disp_str += f"Due Date: \t {t['due_date'].strftime(DATETIME_STRING_FORMAT)}\n"
-        disp_str += f"Task Description: \n {t['description']}\n"
-        disp_str += f"Task completed: {'Yes' if t['completed'] else 'No'}\n"
-        print(disp_str)
+    get_storage().refresh()  # picks up changes made by other sessions
+
+    with timer("view_mine.render"):
+        # Tasks keep the numbers `view_all` shows them with, which is what
+        # task_editor asks for
+        my_tasks = get_storage().user_tasks(current_user)
+        for task_id, t in my_tasks:
+            disp_str = f"\n{task_number(task_id)}.Task: \t {t.title}\n"
+            disp_str += f"Assigned to: \t {t.username}\n"
+            disp_str += (
+                "Date Assigned: \t "
+                + f"{t.assigned_date.strftime(DATETIME_STRING_FORMAT)}\n"
+            )
+            disp_str += f"Due Date: \t {t.due_date.strftime(DATETIME_STRING_FORMAT)}\n"
+            disp_str += f"Task Description: \n {t.description}\n"
+            disp_str += f"Task completed: {'Yes' if t.completed else 'No'}\n"
+            print(disp_str)
+    count("view_mine.tasks_rendered", len(my_tasks))
 
-        j += 1  # Increases task index display
-    task_editor(user_tasks)
+    task_editor(current_user)
     # else:
     #     print("Something is wrong")
 
 
+def view_deadlines(current_user):
+    """
+    The function `view_deadlines` prints the user's overdue tasks and the
+    tasks they have due in the next UPCOMING_DAYS days, both found through
+    the due date index rather than by looking at every task.
+    """
+    storage = get_storage()
+    storage.refresh()  # picks up changes made by other sessions
+    current_date = datetime.today()
+
+    sections = [
+        ("Overdue tasks", storage.overdue_tasks(current_date, current_user)),
+        (
+            f"Tasks due in the next {UPCOMING_DAYS} days",
+            storage.upcoming_tasks(current_date, UPCOMING_DAYS, current_user),
+        ),
+    ]
+    for heading, tasks in sections:
+        print(f"\n{MENU_LINES}\n{heading}\n{MENU_LINES}")
+        found = False
+        for task_id, t in sorted(tasks, key=lambda item: item[1].due_date):
+            found = True
+            print(
+                f"{task_number(task_id)}.Task: \t {t.title} - due "
+                + f"{t.due_date.strftime(DATETIME_STRING_FORMAT)}"
+            )
+        if not found:
+            print("None")
+
+
+def reassign_user_tasks(from_user, to_user):
+    """
+    The function `reassign_user_tasks` moves every incomplete task of
+    `from_user` to `to_user`. The tasks are found through the per-user index
+    and saved in one batch.
+
+    :return: the list of the ids of the tasks that were reassigned.
+    """
+    storage = get_storage()
+    storage.refresh()  # picks up changes made by other sessions
+    # Completed tasks can't be edited, so they stay with their user
+    tasks = {
+        task_id: task
+        for task_id, task in storage.user_tasks(from_user)
+        if not task.completed
+    }
+    # Tasks another session moved or archived in the meantime are skipped
+    return storage.reassign_tasks(list(tasks), to_user, expected=tasks)
+
+
+def bulk_reassign():
+    """Asks for two users and reassigns all of the first one's tasks."""
+    from_user = input("\nReassign the incomplete tasks of user: ")
+    to_user = input("To user: ")
+    for new_user in (from_user, to_user):
+        if not check_user_name(new_user):
+            print(f"\n{new_user} does not exist")
+            return
+    # Tasks are stored under the registered spelling
+    from_user = get_users().get_username(from_user)
+    to_user = get_users().get_username(to_user)
+
+    with timer("bulk_reassign"):
+        changed = reassign_user_tasks(from_user, to_user)
+    print(
+        f"\n{MENU_LINES}\n{len(changed)} tasks have been allocated from "
+        + f"{from_user} to {to_user}\n{MENU_LINES}\n"
+    )
+
+
+def bulk_complete():
+    """Asks for a list of task numbers and marks them all as complete."""
+    numbers = input(
+        "\nEnter the numbers of the tasks to mark as complete, "
+        + "separated by spaces or commas: "
+    )
+    try:
+        task_ids = [
+            task_id_for(int(number)) for number in numbers.replace(",", " ").split()
+        ]
+    except ValueError:
+        print("Invalid input. Please enter valid numbers.")
+        return
+
+    # Archiving renumbers tasks, so the numbers are checked against the
+    # tasks they stand for now, and only those tasks are completed
+    storage = get_storage()
+    storage.refresh()
+    tasks = {}
+    for task_id in task_ids:
+        task = storage.get_task(task_id)
+        if task is not None and not task.completed:
+            tasks[task_id] = task
+            print(f"{task_number(task_id)}.Task: \t {task.title} - {task.username}")
+    if tasks and input(
+        f"Mark these {len(tasks)} tasks as complete? (y/n): "
+    ).strip().lower() != "y":
+        return
+
+    with timer("bulk_complete"):
+        changed = storage.complete_tasks(list(tasks), expected=tasks)
+    print(
+        f"\n{MENU_LINES}\n{len(changed)} tasks have been marked as complete."
+    )
+    skipped = len(task_ids) - len(changed)
+    if skipped:
+        print(f"Skipped {skipped} tasks that don't exist or were already complete")
+    print(MENU_LINES)
+
+
+def archive_completed():
+    """
+    The function `archive_completed` moves the tasks completed before a
+    date out of the live tasks and into the archive, so they no longer slow
+    down loading, viewing and reports. The remaining tasks may be numbered
+    differently afterwards.
+    """
+    cutoff = default_cutoff().strftime(DATETIME_STRING_FORMAT)
+    completed_before = input(
+        f"\nArchive tasks completed before (YYYY-MM-DD, {cutoff} "
+        + "if left blank): "
+    ).strip()
+    try:
+        completed_before = datetime.strptime(
+            completed_before or cutoff, DATETIME_STRING_FORMAT
+        )
+    except ValueError:
+        print("Invalid datetime format. Please use the format specified.")
+        return
+
+    with timer("archive_completed"):
+        archived = get_storage().archive_tasks(completed_before)
+    print(
+        f"\n{MENU_LINES}\n{archived} completed tasks have been moved to "
+        + f"{get_storage().task_archive().archive_file}\n{MENU_LINES}\n"
+    )
+
+
+def cached_report(file_name, build_report):
+    """
+    The function `cached_report` returns the text of a report, only building
+    it again when something has changed since it was last built.
+
+    Reports are cached by the storage data version, the number of users and
+    the current date. Overdue counts only change when the date rolls over,
+    as due dates have no time of day. A rebuilt report replaces the whole
+    of its file atomically, so no lines of an older, longer report are left
+    behind.
+
+    :param file_name: the file the report is saved to.
+    :param build_report: a function that takes the current datetime and
+    returns the report text.
+    :return: the report text.
+    """
+    storage = get_storage()
+    storage.refresh()  # picks up changes made by other sessions
+    data_version = storage.data_version()
+    cache_key = (data_version, len(get_users()), date.today())
+
+    cached = report_cache.get(file_name)
+    if (
+        data_version is not None
+        and cached is not None
+        and cached[0] == cache_key
+        and os.path.exists(file_name)
+    ):
+        count("reports.cache_hits")
+        return cached[1]
+
+    count("reports.cache_misses")
+    with timer(f"reports.build {file_name}"):
+        report_text = build_report(datetime.today())
+        atomic_write(file_name, report_text)
+    report_cache[file_name] = (cache_key, report_text)
+    return report_text
+
+
+def task_report_text(current_date, counts=None):
+    """
+    The function `task_report_text` builds the task overview report.
+
+    :param current_date: the datetime that due dates are compared against.
+    :param counts: the counters to report, read from storage if not given.
+    :return: the report text.
+    """
+    # Counts of completed, incomplete and overdue tasks come from storage
+    if counts is None:
+        counts = get_storage().task_totals(current_date)
+
+    return "".join(
+        [
+            f"\n{MENU_LINES}\nTotal number of tasks: {counts['total']}\n",
+            f"Total number of completed tasks: {counts['completed']}\n",
+            f"Total number of incomplete tasks: {counts['incomplete']}\n",
+            "Total number of of incomplete and overdue"
+            + f"due tasks: {counts['overdue']}\n",
+            # Calculate % of incomplete tasks
+            "Percentage of incompete tasks: "
+            + f"{counts['incomplete_percent']:.2f}%\n",
+            "Percentage of overdue tasks: "
+            + f"{counts['overdue_percent']:.2f}%\n{MENU_LINES}\n",
+            archive_report_text(per_user=False),
+        ]
+    )
+
+
+def archive_report_text(per_user):
+    """
+    The function `archive_report_text` builds the part of a report about
+    archived tasks. It only reads the archive index, never the archived
+    tasks themselves.
+
+    :param per_user: `True` to count the archived tasks of each user too.
+    :return: the report text, empty if nothing has been archived.
+    """
+    user_counts = get_storage().task_archive().user_counts()
+    if not user_counts:
+        return ""
+    report_lines = [
+        f"Total number of archived tasks: {sum(user_counts.values())}\n",
+    ]
+    if per_user:
+        for username, archived in user_counts.items():
+            report_lines.append(
+                f"Archived tasks completed by {username.title()}: {archived}\n"
+            )
+    report_lines.append(f"{MENU_LINES}\n")
+    return "".join(report_lines)
+
+
 def task_report():
     """Reads data from tasks and returns and stores them in task_overview.txt
     data is then printed when admin calls "generate reports"
     """
-    if not os.path.exists("task_overview.txt"):
-        with open("task_overview.txt", "w+") as overview_file:
-            pass
+    print(cached_report(TASK_OVERVIEW_FILE, task_report_text))
 
-    with open("task_overview.txt", "r+") as overview_file:
-        overview_file.write(
-            f"\n{MENU_LINES}\nTotal number of tasks: {len(task_list)}\n"
-        )
-        # Loops through task_list and extracts completed tasks
-        completed_tasks = [task for task in task_list if task["completed"]]
-        overview_file.write(
-            f"Total number of completed tasks: {len(completed_tasks)}\n"
-        )
-        # Loops through task_list and extracts INcompleted tasks
-        incomplete_tasks = [task for task in task_list if not task["completed"]]
-        overview_file.write(
-            f"Total number of incomplete tasks: {len(incomplete_tasks)}\n"
+
+def user_report_text(current_date, summary=None):
+    """
+    The function `user_report_text` builds the user overview report.
+
+    :param current_date: the datetime that due dates are compared against.
+    :param summary: the counters to report, see `TaskStorage.task_summary`,
+    read from storage if not given.
+    :return: the report text.
+    """
+    total_users = len(get_users())  # Get total num of registered users
+
+    # One pass over the tasks gives the counters for every user
+    if summary is None:
+        summary = get_storage().task_summary(current_date)
+
+    report_lines = [
+        f"\n{MENU_LINES}\nTotal users " + f"registered: {total_users}\n",
+        f"Total number of tasks: {summary['total']}\n{MENU_LINES}\n",
+    ]
+
+    for username, counts in summary["users"].items():
+        task_count = counts["total"]
+
+        task_per_user = (
+            f"\nTotal tasks assigned to {username.title()}: {task_count}\n"
         )
 
-        # check current date in datetime object
-        current_date = datetime.today()
+        task_per_user_per = (
+            "Percentage of tasks assigned to "
+            + f"{username.title()}: {counts['share_percent']:.2f}%\n"
+        )
 
-        # creat list and compare current date vs due date
-        overdue_tasks = [
-            task
-            for task in task_list
-            if not task["completed"] and task["due_date"] < current_date
-        ]
-        overview_file.write(
-            "Total number of of incomplete and overdue"
-            + f"due tasks: {len(overdue_tasks)}\n"
+        task_per_user_complete = (
+            "Percentage of tasks assigned to "
+            + f"{username.title()} completed: "
+            + f"{counts['completed_percent']:.2f}%\n"
         )
 
-        # Calculate % of incomplete tasks
-        overview_file.write(
-            "Percentage of incompete tasks: "
-            + f"{(len(incomplete_tasks))/(len(task_list)) * 100:.2f}%\n"
+        task_per_user_incomplete = (
+            "Percentage of tasks assigned to"
+            + f"{username.title()} incomplete: "
+            + f"{counts['incomplete_percent']:.2f}%\n"
         )
-        overview_file.write(
-            "Percentage of overdue tasks: "
-            + f"{(len(overdue_tasks))/(len(task_list)) * 100:.2f}%\n{MENU_LINES}\n"
+
+        incomplete_overdue = (
+            "Percentage of tasks assigned to "
+            + f"{username.title()} incomplete and overdue: "
+            + f"{counts['overdue_percent']:.2f}%\n\n{MENU_LINES}\n"
         )
-        overview_file.seek(0)
-        data = overview_file.read()
-        print(data)
+
+        report_lines.append(task_per_user)
+        report_lines.append(task_per_user_per)
+        report_lines.append(task_per_user_complete)
+        report_lines.append(task_per_user_incomplete)
+        report_lines.append(incomplete_overdue)
+
+    report_lines.append(archive_report_text(per_user=True))
+    return "".join(report_lines)
 
 
 def user_report():
@@ -402,147 +813,248 @@ def user_report():
 
     Data will be printed when admin calls 'uo' from the generate reports menu
     """
-    with open("user_overview.txt", "r+") as user_overview_file:
-        total_users = len(
-            username_password.keys()
-        )  # Get total num of users stored in dict
+    print(cached_report(USER_OVERVIEW_FILE, user_report_text))
 
-        current_date = datetime.today()
 
-        task_count = {}
-        for task in task_list:
-            username = task["username"]
-            task_count[username] = task_count.get(username, 0) + 1
-
-        total_num_users = (
-            f"\n{MENU_LINES}\nTotal users " + f"registered: {total_users}\n"
+def trend_report_text(current_date, rollup=None):
+    """
+    The function `trend_report_text` builds the trend report from the
+    history of task changes: the share of the tasks assigned each week that
+    have been completed, the average time each user takes to complete a task
+    and the overdue backlog over time.
+
+    :param current_date: the datetime that due dates are compared against.
+    :param rollup: the `task_history.TrendRollup` to report, brought up to
+    date from storage if not given.
+    :return: the report text.
+    """
+    if rollup is None:
+        rollup = get_storage().task_history().trends(current_date)
+
+    report_lines = [
+        f"\n{MENU_LINES}\nCompletion rate of the tasks assigned each week "
+        + f"(last {TREND_WEEKS} weeks)\n{MENU_LINES}\n",
+    ]
+    for week in sorted(rollup.weeks)[-TREND_WEEKS:]:
+        assigned, completed = rollup.weeks[week]
+        rate = f"{completed / assigned * 100:.2f}%" if assigned else "n/a"
+        report_lines.append(
+            f"Week of {week}: {assigned} assigned, {completed} of them "
+            + f"completed ({rate})\n"
         )
 
-        total_tasks = f"Total number of tasks: {len(task_list)}\n{MENU_LINES}\n"
-
-        user_overview_file.write(total_num_users)
-        user_overview_file.write(total_tasks)
-
-        for username, count in task_count.items():
-            completed_tasks = sum(
-                True
-                for task in task_list
-                if task["username"] == username and task["completed"]
-            )
-            incomplete_tasks = sum(
-                True
-                for task in task_list
-                if task["username"] == username and not task["completed"]
-            )
-            incomplete_overdue = sum(
-                True
-                for task in task_list
-                if task["username"] == username
-                and not task["completed"]
-                and task["due_date"] < current_date
-            )
+    report_lines.append(
+        f"{MENU_LINES}\nAverage time to complete a task\n{MENU_LINES}\n"
+    )
+    for username in sorted(rollup.users):
+        completed, total_days = rollup.users[username]
+        report_lines.append(
+            f"{username.title()}: {total_days / completed:.1f} days "
+            + f"({completed} completed)\n"
+        )
 
-            task_per_user = f"\nTotal tasks assigned to {username.title()}: {count}\n"
+    report_lines.append(f"{MENU_LINES}\nOverdue backlog\n{MENU_LINES}\n")
+    for week, overdue in rollup.backlog[-TREND_WEEKS:]:
+        report_lines.append(f"End of week of {week}: {overdue}\n")
+    report_lines.append(
+        f"Now: {rollup.overdue_now(current_date)}\n{MENU_LINES}\n"
+    )
+    return "".join(report_lines)
 
-            task_per_user_per = (
-                "Percentage of tasks assigned to "
-                + f"{username.title()}: {count/len(task_list)*100:.2f}%\n"
-            )
 
-            task_per_user_complete = (
-                "Percentage of tasks assigned to "
-                + f"{username.title()} completed: "
-                + f"{completed_tasks/count*100:.2f}%\n"
-            )
+def trend_report():
+    """
+    The function `trend_report` saves the trend report to trend_report.txt
+    and prints it. The history is only read from where the last report left
+    off, so it isn't cached like the other reports.
+    """
+    report_text = trend_report_text(datetime.today())
+    atomic_write(TREND_REPORT_FILE, report_text)
+    print(report_text)
 
-            task_per_user_incomplete = (
-                "Percentage of tasks assigned to"
-                + f"{username.title()} incomplete: "
-                + f"{incomplete_tasks/count*100:.2f}%\n"
-            )
 
-            incomplete_overdue = (
-                "Percentage of tasks assigned to "
-                + f"{username.title()} incomplete and overdue: "
-                + f"{incomplete_overdue/count*100:.2f}%\n\n{MENU_LINES}\n"
-            )
+def user_stats():
+    """
+    The function `user_stats` returns the total number of registered users.
+    :return: the total number of users.
+    """
 
-            user_overview_file.write(task_per_user)
-            user_overview_file.write(task_per_user_per)
-            user_overview_file.write(task_per_user_complete)
-            user_overview_file.write(task_per_user_incomplete)
-            user_overview_file.write(incomplete_overdue)
+    total_users = len(get_users())
 
-        user_overview_file.seek(0)
-        file_data = user_overview_file.read()
-        print(file_data)
+    return total_users
 
 
-def user_stats():
+def task_stats():
     """
-    The function `user_stats` reads data from a file called "user.txt" and
-    returns the total number of
-    users.
-    :return: the total number of users stored in the "user.txt" file.
+    The function "task_stats" returns the total number of tasks held in
+    storage. The tasks are only counted, so the flat file storage doesn't
+    have to parse every task just to show the statistics.
+    :return: the total number of tasks.
     """
 
-    with open("user.txt", "r") as fd:
-        user_data = fd.readlines()
+    total_tasks = get_storage().task_count()
 
-    total_users = len(user_data)
+    return total_tasks
 
-    return total_users
 
+def format_size(size):
+    """:return: a file size in bytes as e.g. "1.5 MiB"."""
+    if size is None:
+        return "not read yet"
+    for unit in ("bytes", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
 
-def task_stats():
+
+def display_statistics():
+    """
+    The function `display_statistics` prints the number of users and tasks,
+    the tasks by status, the size of each data file and when the data was
+    loaded. Once the tasks are loaded it only uses counters kept in memory.
+    Before that the tasks of a large tasks.txt are counted straight from the
+    files, which is much cheaper than loading them.
     """
-    The function "task_stats" reads a file called "tasks.txt" and
-    returns the total number of tasks listed in the file.
-    :return: the total number of tasks in the "tasks.txt" file.
+    stats = get_storage().storage_stats(datetime.today())
+    print(MENU_LINES)
+    print(f"Number of users: \t\t {user_stats()}")
+    print(f"Number of tasks: \t\t {stats['total']}")
+    print(f"Completed tasks: \t\t {stats['completed']}")
+    print(f"Incomplete tasks: \t\t {stats['incomplete']}")
+    print(f"Overdue tasks: \t\t\t {stats['overdue']}")
+    for file_name, size in stats["files"].items():
+        print(f"{file_name}: \t\t {format_size(size)}")
+    for label, loaded_at in (
+        ("Tasks loaded at", stats["tasks_loaded_at"]),
+        ("Users loaded at", stats["users_loaded_at"]),
+    ):
+        if loaded_at is not None:
+            print(f"{label}: \t\t {loaded_at.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(MENU_LINES)
+
+
+# =====Loading data on first use===========
+
+# Importing this module doesn't touch any files. The storage and the user
+# registry are created the first time they are needed.
+storage = None
+users = None
+scheduler = None
+# storage data version the scheduler is up to date with
+scheduler_version = None
+# when reminders were first due to be shown, the scheduler starts from here
+reminders_since = None
+# (task id, username, title, due date) of deadlines that have passed
+reminders = []
+
+
+def get_storage():
     """
+    The function `get_storage` returns the storage backend, opening the one
+    selected by the TASK_STORAGE environment variable on first use. This also
+    creates user.txt / tasks.txt (or tasks.db) if they are missing.
+    """
+    global storage
+    if storage is None:
+        storage = open_storage()
+    return storage
 
-    with open("tasks.txt", "r") as task_file:
-        tasks_data = task_file.readlines()
 
-    total_tasks = len(tasks_data)
+def get_scheduler():
+    """
+    The function `get_scheduler` returns the deadline scheduler, starting it
+    on a background thread on first use. Reminders it fires are queued and
+    shown with the menu by `show_reminders`.
+    """
+    global scheduler, scheduler_version
+    if scheduler is None:
+        storage = get_storage()
+        scheduler_version = storage.data_version()
+        # Deadlines passing since the menu was first shown still fire
+        scheduler = DeadlineScheduler(
+            storage.find_tasks(status="incomplete"), reminders_since
+        )
+        scheduler.add_hook(queue_reminder)
+        scheduler.start()
+    return scheduler
 
-    return total_tasks
 
+def queue_reminder(task_id, username, title, due_date):
+    """Reminder hook, called by the scheduler as a deadline passes."""
+    reminders.append((task_id, username, title, due_date))
 
-# =====Creat files in case of error===========
 
-# If no user.txt file, write one with a default account
-if not os.path.exists("user.txt"):
-    with open("user.txt", "w") as default_file:
-        default_file.write("admin;password")
+def scheduler_version_before_change():
+    """
+    :return: the storage data version before this session changes a task,
+    or None if the scheduler isn't running.
+    """
+    if scheduler is None:
+        return None
+    storage = get_storage()
+    storage.refresh()
+    return storage.data_version()
 
-# Create tasks.txt if it doesn't exist
-if not os.path.exists("tasks.txt"):
-    with open("tasks.txt", "w") as default_file:
-        pass
 
-# If no task_overview.txt file, write one with a default account
-if not os.path.exists("task_overview.txt"):
-    with open("task_overview.txt", "w") as default_file:
-        pass
+def update_scheduler(version_before, change, *args):
+    """
+    The function `update_scheduler` passes a change this session made to a
+    task on to the scheduler, which costs O(log N) instead of rebuilding it.
 
-# If no user_overview.txt file, write one with a default account
-if not os.path.exists("user_overview.txt"):
-    with open("user_overview.txt", "w") as default_file:
-        pass
+    :param version_before: the result of `scheduler_version_before_change`.
+    :param change: the name of the `DeadlineScheduler` method to call, e.g.
+    "task_completed".
+    """
+    global scheduler_version
+    if scheduler is None or version_before != scheduler_version:
+        # The scheduler is behind already, `show_reminders` rebuilds it
+        return
+    getattr(scheduler, change)(*args)
+    scheduler_version = get_storage().data_version()
 
-# Read in user_data
-with open("user.txt", "r") as user_file:
-    user_data = user_file.read().split("\n")
 
-with open("tasks.txt", "r") as task_file:
-    task_data = task_file.read().split("\n")
-    task_data = [t for t in task_data if t != ""]
+def show_reminders(current_user):
+    """
+    The function `show_reminders` prints the reminders for tasks assigned to
+    `current_user` whose deadlines have passed since the menu was last shown.
+    The scheduler is rebuilt first if other sessions have changed tasks.
+    """
+    global scheduler_version, reminders_since
+    storage = get_storage()
+    if scheduler is None and not storage.tasks_loaded():
+        # Starting the scheduler would read every task before the first menu
+        # is shown, so it waits until something else has loaded them
+        if reminders_since is None:
+            reminders_since = datetime.today()
+        return
+    current_scheduler = get_scheduler()
+    storage.refresh()  # picks up changes made by other sessions
+    data_version = storage.data_version()
+    if data_version != scheduler_version:
+        current_scheduler.rebuild(storage.find_tasks(status="incomplete"))
+        scheduler_version = data_version
+    current_scheduler.run_pending()
+
+    while reminders:
+        task_id, username, title, due_date = reminders.pop(0)
+        if username == current_user:
+            print(
+                f"Reminder: task {task_number(task_id)} '{title}' was due on "
+                + f"{due_date.strftime(DATETIME_STRING_FORMAT)} "
+                + "and is now overdue"
+            )
 
-# calls function to create task list
-task_list = create_task_list(task_data)
-# calls function to create username_password dictionary
-username_password = create_user_data_dict(user_data)
+
+def get_users():
+    """
+    The function `get_users` returns the in-memory user registry, loading
+    every user from storage on first use.
+    """
+    global users
+    if users is None:
+        users = UserRegistry(get_storage().load_users())
+    return users
 
 
 def log_in():
@@ -560,13 +1072,21 @@ def log_in():
         print("\nPlease login using your username and password:\n")
         current_user = input("Username: ")
         current_password = input("Password: ")
-        if current_user not in username_password.keys():
+        if not get_users().exists(current_user):
+            # The user may have been registered by another session
+            for username, password in get_storage().load_users().items():
+                get_users().add(username, password)
+        if not get_users().exists(current_user):
             print("User does not exist\n")
             continue
-        elif username_password[current_user] != current_password:
+        elif not get_users().check_password(current_user, current_password):
             print("Password is incorrect\n")
             continue
-        elif current_user == "admin":
+        # Passwords kept in plain text by older versions get hashed now
+        upgrade_password(get_storage(), get_users(), current_user, current_password)
+        # Usernames are matched ignoring case, continue as the registered user
+        current_user = get_users().get_username(current_user)
+        if current_user == "admin":
             admin_rights = True
         print("\n>>>Login Successful<<<\n")
         print(f"Welcome back {current_user}")
@@ -590,6 +1110,7 @@ def user_menu(admin_rights, current_user):
     while True:
         # presenting the menu to the user and
         # making sure that the user input is converted to lower case.
+        show_reminders(current_user)
         print(f"\nCurrent user: {current_user.title()}\n")
         if admin_rights:
             menu = input(
@@ -599,8 +1120,11 @@ def user_menu(admin_rights, current_user):
     a - Adding a task
     va - View all tasks
     vm - View my task
+    dl - View my deadlines
     gr - generate reports
+    bc - Bulk changes
     ds - Display statistics
+    perf - Performance statistics
     s - switch user
     e - Exit
     \n: """
@@ -612,6 +1136,7 @@ def user_menu(admin_rights, current_user):
     a - Adding a task
     va - View all tasks
     vm - View my task
+    dl - View my deadlines
     s- switch user
     e - Exit
     \n: """
@@ -629,29 +1154,54 @@ def user_menu(admin_rights, current_user):
         elif menu == "vm":
             view_mine(current_user)
 
+        elif menu == "dl":
+            view_deadlines(current_user)
+
         elif menu == "gr" and current_user == "admin":
             report = input(
                 """\nWhich reports would you like to view?\n
 to - Overview of all tasks assinged to team
-uo - Current state of tasks assigned to the team\n
+uo - Current state of tasks assigned to the team
+tr - Trends over time\n
 : """
             )
             if report.lower() == "to":
                 task_report()
             elif report.lower() == "uo":
                 user_report()
+            elif report.lower() == "tr":
+                trend_report()
             elif report == "-1":
                 continue
             else:
                 print("Please choose a valid function")
+        elif menu == "bc" and current_user == "admin":
+            change = input(
+                """\nWhich change would you like to make?\n
+ra - Reassign all tasks from one user to another
+mc - Mark several tasks as complete
+ar - Archive old completed tasks\n
+: """
+            )
+            if change.lower() == "ra":
+                bulk_reassign()
+            elif change.lower() == "mc":
+                bulk_complete()
+            elif change.lower() == "ar":
+                archive_completed()
+            elif change == "-1":
+                continue
+            else:
+                print("Please choose a valid function")
         elif menu == "ds" and current_user == "admin":
             """If the user is an admin they can display statistics
             about number of users and tasks."""
 
-            print(MENU_LINES)
-            print(f"Number of users: \t\t {user_stats()}")
-            print(f"Number of tasks: \t\t {task_stats()}")
-            print(MENU_LINES)
+            with timer("display_statistics"):
+                display_statistics()
+
+        elif menu == "perf" and current_user == "admin":
+            show_performance_stats()
 
         elif menu == "s":
             log_in()
@@ -663,8 +1213,22 @@ uo - Current state of tasks assigned to the team\n
             print("You have made a wrong choice, Please Try again")
 
 
+def show_performance_stats():
+    """
+    The function `show_performance_stats` prints the timings and counters
+    collected since the program started, as a table or as JSON.
+    """
+    output_format = input("t - table\nj - JSON\n: ").strip().lower()
+    if output_format == "j":
+        print(stats_json())
+    else:
+        print(f"{MENU_LINES}\n{stats_text()}\n{MENU_LINES}")
+
+
 def start_task_manager():
     log_in()
 
 
-start_task_manager()
+if __name__ == "__main__":
+    # Runs under cProfile when the TASK_PROFILE environment variable is set
+    run_profiled(start_task_manager)
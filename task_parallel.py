@@ -0,0 +1,355 @@
+# Parallel report counters for very large task files.
+#
+# Instead of loading every task into one interpreter, tasks.txt is split
+# into byte ranges that start and end on line boundaries ("shards"), and a
+# pool of worker processes parses and counts each shard on its own. The
+# per-user counters (total, completed, overdue) of every shard are then
+# merged in file order and the journal is applied on top, so the result is
+# exactly what `FlatFileStorage.task_summary` gives after loading.
+#
+#   python task_cli.py report uo --workers 8
+
+# =====importing libraries===========
+import os
+
+from task_perf import count, timed
+from task_reports import overdue_cutoff, summarise_user_counts
+from task_storage import file_lock, parse_date, parse_task, task_to_str
+
+# Shards per worker, a few more shards than workers evens out the load
+SHARDS_PER_WORKER = 4
+# Smaller shards aren't worth handing to another process
+MIN_SHARD_SIZE = 1024 * 1024
+
+
+# =====Work done in the worker processes===========
+
+
+def shard_rows(file_name, start, end):
+    """
+    The generator `shard_rows` yields the fields of every valid task line
+    between the byte offsets `start` and `end`, skipping the same lines as
+    `task_storage.load_task_file`: blank ones, ones with fewer than six
+    fields and ones with dates that can't be parsed.
+
+    :return: an iterator of lists of fields, as bytes.
+    """
+    with open(file_name, "rb") as task_file:
+        task_file.seek(start)
+        data = task_file.read(end - start)
+    # bytes date -> datetime, or None if it isn't a valid date
+    dates = {}
+    for line in data.split(b"\n"):
+        line = line.rstrip(b"\r")
+        if not line:
+            continue
+        fields = line.split(b";")
+        if len(fields) < 6:
+            continue
+        for date_field in fields[3], fields[4]:
+            if date_field not in dates:
+                try:
+                    dates[date_field] = parse_date(date_field.decode("utf-8"))
+                except ValueError:
+                    dates[date_field] = None
+        if dates[fields[3]] is None or dates[fields[4]] is None:
+            continue
+        fields[3] = dates[fields[3]]
+        yield fields
+
+
+def count_shard(file_name, start, end, current_date):
+    """
+    The function `count_shard` counts the tasks in one shard.
+
+    :return: a tuple of (number of valid task lines, list of (username,
+    total, completed, overdue) tuples in the order the users first appear).
+    """
+    cutoff = overdue_cutoff(current_date)
+    # username -> [total, completed, overdue]
+    per_user = {}
+    task_count = 0
+    for fields in shard_rows(file_name, start, end):
+        task_count += 1
+        user_count = per_user.get(fields[0])
+        if user_count is None:
+            user_count = per_user[fields[0]] = [0, 0, 0]
+        user_count[0] += 1
+        if fields[5] == b"Yes":
+            user_count[1] += 1
+        elif fields[3] < cutoff:
+            user_count[2] += 1
+    return task_count, [
+        (username.decode("utf-8"), total, completed, overdue)
+        for username, (total, completed, overdue) in per_user.items()
+    ]
+
+
+def shard_task_lines(file_name, start, end, positions):
+    """
+    :param positions: positions of tasks within the shard, counting only
+    valid task lines.
+    :return: a dictionary of position -> task line for those tasks.
+    """
+    positions = set(positions)
+    lines = {}
+    for position, fields in enumerate(shard_rows(file_name, start, end)):
+        if position in positions:
+            fields[3] = fields[3].strftime("%Y-%m-%d").encode("utf-8")
+            lines[position] = b";".join(fields).decode("utf-8")
+    return lines
+
+
+# =====Splitting and merging in the main process===========
+
+
+class InlineExecutor:
+    """
+    The class `InlineExecutor` stands in for the process pool when there is
+    a single worker, running the work in this process instead of paying to
+    start another one.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+    def submit(self, function, *args):
+        # concurrent.futures is slow to import, so only when it is needed
+        from concurrent.futures import Future
+
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+def shard_ranges(file_name, shard_count):
+    """
+    The function `shard_ranges` splits a file into byte ranges of about the
+    same size, each starting at the beginning of a line.
+
+    :return: a list of (start, end) tuples covering the whole file.
+    """
+    size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, "rb") as task_file:
+        for shard in range(1, shard_count):
+            task_file.seek(max(size * shard // shard_count, boundaries[-1]))
+            task_file.readline()  # move on to the start of the next line
+            boundary = task_file.tell()
+            if boundary >= size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def read_journal_records(journal_file):
+    """
+    :return: a list of journal records as (line, action, task id, value)
+    tuples, split like `FlatFileStorage.apply_record` does. Records that
+    were cut off mid write are left out.
+    """
+    records = []
+    try:
+        with open(journal_file, "rb") as journal:
+            for raw_line in journal:
+                if not raw_line.endswith(b"\n"):
+                    break
+                line = raw_line.decode("utf-8").rstrip("\n")
+                if line.startswith("version;"):
+                    continue
+                action, _, data = line.partition(";")
+                task_id, _, value = data.partition(";")
+                if action == "add" and value.count(";") != 5:
+                    # Journals written before task ids were recorded
+                    task_id, value = None, data
+                records.append((line, action, task_id, value))
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def contribution(task, current_date):
+    """:return: the task's (total, completed, overdue) counts."""
+    if task.completed:
+        return 1, 1, 0
+    return 1, 0, 1 if task.due_date < overdue_cutoff(current_date) else 0
+
+
+@timed("reports.parallel_task_summary")
+def parallel_task_summary(storage, current_date, workers=None):
+    """
+    The function `parallel_task_summary` works out the report counters of a
+    text `FlatFileStorage` with a pool of worker processes, without loading
+    the tasks into this process.
+
+    Tasks changed by journal records are read back from their shards in a
+    second, much smaller round, so their counts can be moved from the state
+    in tasks.txt to their state after the journal.
+
+    :param storage: a `FlatFileStorage` that keeps its tasks in tasks.txt.
+    :param current_date: the datetime that due dates are compared against.
+    :param workers: the number of worker processes, defaults to the number
+    of CPUs. With 1 the shards are counted in this process.
+    :return: the same dictionary as `FlatFileStorage.task_summary`.
+    :raises ValueError: if the storage doesn't keep a text snapshot.
+    """
+    if getattr(storage, "SNAPSHOT_FORMAT", None) != "text":
+        raise ValueError("Parallel reports need the flatfile storage")
+    workers = workers or os.cpu_count() or 1
+    tasks_file = storage.tasks_file
+
+    # The shared lock keeps tasks.txt and the journal consistent with each
+    # other while they are read
+    with file_lock(storage.lock_file, exclusive=False):
+        shard_count = min(
+            workers * SHARDS_PER_WORKER,
+            os.path.getsize(tasks_file) // MIN_SHARD_SIZE + 1,
+        )
+        shards = shard_ranges(tasks_file, shard_count)
+        if workers == 1:
+            executor = InlineExecutor()
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=min(workers, len(shards)))
+        with executor as pool:
+            shard_results = list(
+                pool.map(
+                    count_shard,
+                    [tasks_file] * len(shards),
+                    [start for start, _ in shards],
+                    [end for _, end in shards],
+                    [current_date] * len(shards),
+                )
+            )
+            records = read_journal_records(storage.journal_file)
+
+            # task id of the first task in each shard
+            first_ids = []
+            snapshot_count = 0
+            for task_count, _ in shard_results:
+                first_ids.append(snapshot_count)
+                snapshot_count += task_count
+
+            touched = sorted(
+                {
+                    int(task_id)
+                    for _, action, task_id, _ in records
+                    if action != "add"
+                    and task_id.isdigit()
+                    and int(task_id) < snapshot_count
+                }
+            )
+            original_tasks = read_tasks(
+                pool, tasks_file, shards, first_ids, touched
+            )
+
+    count("reports.shards", len(shards))
+    # username -> [total, completed, overdue], in the order users first appear
+    per_user = {}
+    for _, user_counts in shard_results:
+        for username, total, completed, overdue in user_counts:
+            counts = per_user.setdefault(username, [0, 0, 0])
+            counts[0] += total
+            counts[1] += completed
+            counts[2] += overdue
+
+    changed = replay_records(records, original_tasks, snapshot_count, per_user)
+    for task_id, task in changed.items():
+        original = original_tasks.get(task_id)
+        if original is not None:
+            old_counts = per_user[original.username]
+            for index, amount in enumerate(contribution(original, current_date)):
+                old_counts[index] -= amount
+        new_counts = per_user[task.username]
+        for index, amount in enumerate(contribution(task, current_date)):
+            new_counts[index] += amount
+
+    # Like `TaskStatistics.summary`, users left without tasks are not listed
+    return summarise_user_counts(
+        (username, total, completed, overdue)
+        for username, (total, completed, overdue) in per_user.items()
+        if total
+    )
+
+
+def read_tasks(pool, tasks_file, shards, first_ids, task_ids):
+    """:return: a dictionary of task id -> `Task` for the given task ids."""
+    # shard index -> positions within the shard
+    wanted = {}
+    shard_index = 0
+    for task_id in task_ids:
+        while (
+            shard_index + 1 < len(first_ids)
+            and first_ids[shard_index + 1] <= task_id
+        ):
+            shard_index += 1
+        wanted.setdefault(shard_index, []).append(task_id - first_ids[shard_index])
+
+    tasks = {}
+    futures = {
+        shard_index: pool.submit(
+            shard_task_lines, tasks_file, *shards[shard_index], positions
+        )
+        for shard_index, positions in wanted.items()
+    }
+    for shard_index, future in futures.items():
+        for position, line in future.result().items():
+            tasks[first_ids[shard_index] + position] = parse_task(line)
+    return tasks
+
+
+def replay_records(records, original_tasks, snapshot_count, per_user):
+    """
+    The function `replay_records` applies journal records to copies of the
+    tasks they change, following the same rules as
+    `FlatFileStorage.apply_record`. Users are added to `per_user` in the
+    order the records mention them, as `TaskStatistics` does.
+
+    :return: a dictionary of task id -> `Task` after the journal, for every
+    task that was added or changed.
+    """
+    changed = {}
+    task_count = snapshot_count
+    for line, action, task_id, value in records:
+        try:
+            if action == "add":
+                task_id = task_count if task_id is None else int(task_id)
+                if task_id < task_count:
+                    continue  # already in the snapshot
+                if task_id > task_count:
+                    raise IndexError(task_id)
+                task = parse_task(value)
+                changed[task_id] = task
+                task_count += 1
+                per_user.setdefault(task.username, [0, 0, 0])
+                continue
+
+            task_id = int(task_id)
+            task = changed.get(task_id)
+            if task is None:
+                # Changes go to a copy, the original is needed to take its
+                # counts back off
+                task = changed[task_id] = parse_task(
+                    task_to_str(original_tasks[task_id])
+                )
+            if action == "reassign":
+                task.username = value
+                per_user.setdefault(value, [0, 0, 0])
+            elif action == "due_date":
+                task.due_date = parse_date(value)
+            elif action == "complete":
+                task.completed = True
+        except (ValueError, IndexError, KeyError):
+            # Skipped like `FlatFileStorage.replay_journal` does, and counted
+            # rather than printed into the report
+            count("journal.invalid_records")
+    return changed
@@ -0,0 +1,147 @@
+# Performance instrumentation for the task manager.
+#
+# Operations are timed with `timer` / `timed` and work done is counted with
+# `count` (rows parsed, bytes written, tasks scanned, ...). Everything is
+# collected in memory for the life of the program and can be shown with the
+# "perf" menu option or the --perf option of task_cli.py.
+#
+# Setting the TASK_PROFILE environment variable to a file name (or passing
+# --profile to task_cli.py) also runs the whole program under cProfile and
+# saves the profile there when it exits, e.g.:
+#   TASK_PROFILE=task_manager.prof python task_manager.py
+#   python -m pstats task_manager.prof
+
+# =====importing libraries===========
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+PROFILE_FILE = os.environ.get("TASK_PROFILE")
+
+# operation name -> [calls, total seconds, slowest call in seconds]
+TIMERS = {}
+# counter name -> total
+COUNTERS = {}
+
+
+@contextmanager
+def timer(name):
+    """
+    The context manager `timer` adds the time spent in its block to the
+    timer called `name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = TIMERS.get(name)
+        if stats is None:
+            stats = TIMERS[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+
+
+def timed(name):
+    """The decorator `timed` times every call of a function with `timer`."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, amount=1):
+    """The function `count` adds `amount` to the counter called `name`."""
+    COUNTERS[name] = COUNTERS.get(name, 0) + amount
+
+
+def reset():
+    TIMERS.clear()
+    COUNTERS.clear()
+
+
+def snapshot():
+    """
+    :return: a dictionary of everything collected so far, with times in
+    milliseconds, that can be saved as JSON.
+    """
+    return {
+        "timers": {
+            name: {
+                "calls": calls,
+                "total_ms": total * 1000,
+                "mean_ms": total / calls * 1000,
+                "max_ms": slowest * 1000,
+            }
+            for name, (calls, total, slowest) in sorted(TIMERS.items())
+        },
+        "counters": dict(sorted(COUNTERS.items())),
+    }
+
+
+def stats_text():
+    """:return: the collected timers and counters as a table."""
+    stats = snapshot()
+    lines = [
+        f"{'operation':32} {'calls':>7} {'total ms':>10} {'mean ms':>9} "
+        + f"{'max ms':>9}"
+    ]
+    for name, timer_stats in stats["timers"].items():
+        lines.append(
+            f"{name:32} {timer_stats['calls']:>7} "
+            + f"{timer_stats['total_ms']:>10.2f} {timer_stats['mean_ms']:>9.2f} "
+            + f"{timer_stats['max_ms']:>9.2f}"
+        )
+    if not stats["timers"]:
+        lines.append("(no operations timed yet)")
+
+    lines.append("")
+    lines.append(f"{'counter':32} {'total':>17}")
+    for name, total in stats["counters"].items():
+        lines.append(f"{name:32} {total:>17}")
+    if not stats["counters"]:
+        lines.append("(nothing counted yet)")
+    return "\n".join(lines)
+
+
+def stats_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def run_profiled(function, profile_file=None):
+    """
+    The function `run_profiled` calls `function`, under cProfile if a
+    profile file is given (defaults to the TASK_PROFILE environment
+    variable). The profile is saved even if the program exits half way, and
+    the slowest functions are printed.
+
+    :return: whatever `function` returns.
+    """
+    profile_file = profile_file or PROFILE_FILE
+    if not profile_file:
+        return function()
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        return function()
+    finally:
+        profile.disable()
+        profile.dump_stats(profile_file)
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(15)
+        print(output.getvalue())
+        print(f"Profile saved to {profile_file}")
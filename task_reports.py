@@ -0,0 +1,291 @@
+# Report calculations for the task manager.
+#
+# The counters behind the task overview ("to") and user overview ("uo")
+# reports are all worked out here so both reports share one pass over the
+# tasks instead of scanning the task list once per user and per counter, or
+# kept up to date as tasks change by `TaskStatistics`.
+
+import heapq
+from datetime import datetime, timedelta
+
+
+def overdue_cutoff(current_date):
+    """
+    The function `overdue_cutoff` gives the first due date that isn't overdue
+    on `current_date`. Due dates have no time of day, so a task due today is
+    overdue once today has started, but not at midnight itself. Every
+    backend compares due dates against this so they agree on what is
+    overdue.
+
+    :param current_date: the datetime that due dates are compared against.
+    :return: a datetime at midnight, incomplete tasks due before it are
+    overdue.
+    """
+    cutoff = datetime(current_date.year, current_date.month, current_date.day)
+    if cutoff < current_date:
+        cutoff += timedelta(days=1)
+    return cutoff
+
+
+def percentage(part, whole):
+    """
+    The function `percentage` returns `part` as a percentage of `whole`, or
+    0 when `whole` is 0 so an empty task list doesn't crash the reports.
+    """
+    if not whole:
+        return 0.0
+    return part / whole * 100
+
+
+def new_counters():
+    return {"total": 0, "completed": 0, "incomplete": 0, "overdue": 0}
+
+
+def add_percentages(counters, total_tasks):
+    """
+    The function `add_percentages` fills in the percentage fields of a
+    counters dictionary.
+
+    :param counters: a dictionary with "total", "completed", "incomplete" and
+    "overdue" counts.
+    :param total_tasks: the number of tasks across all users, used for the
+    share of tasks a user has been assigned.
+    """
+    total = counters["total"]
+    counters["share_percent"] = percentage(total, total_tasks)
+    counters["completed_percent"] = percentage(counters["completed"], total)
+    counters["incomplete_percent"] = percentage(counters["incomplete"], total)
+    counters["overdue_percent"] = percentage(counters["overdue"], total)
+    return counters
+
+
+def aggregate_tasks(tasks, current_date):
+    """
+    The function `aggregate_tasks` works out every counter used by the task
+    and user reports in a single pass over the tasks.
+
+    :param tasks: an iterable of `Task` objects.
+    :param current_date: the datetime that due dates are compared against,
+    incomplete tasks due before it are overdue.
+    :return: a dictionary with the global "total", "completed", "incomplete"
+    and "overdue" counts and their percentages, and under "users" the same
+    counters for every username in the order they first appear.
+    """
+    cutoff = overdue_cutoff(current_date)
+    # username -> [total, completed, overdue], lists are cheaper to update
+    # in the loop than dictionaries
+    per_user = {}
+    for task in tasks:
+        username = task.username
+        user_count = per_user.get(username)
+        if user_count is None:
+            user_count = per_user[username] = [0, 0, 0]
+        user_count[0] += 1
+        if task.completed:
+            user_count[1] += 1
+        elif task.due_date < cutoff:
+            user_count[2] += 1
+
+    return summarise_user_counts(
+        (username, total, completed, overdue)
+        for username, (total, completed, overdue) in per_user.items()
+    )
+
+
+def summarise_user_counts(user_counts):
+    """
+    The function `summarise_user_counts` builds the report summary from
+    per-user counts, however they were collected.
+
+    :param user_counts: an iterable of (username, total, completed, overdue)
+    tuples.
+    :return: the same dictionary as `aggregate_tasks`.
+    """
+    summary = new_counters()
+    users = {}
+    for username, total, completed, overdue in user_counts:
+        users[username] = {
+            "total": total,
+            "completed": completed,
+            "incomplete": total - completed,
+            "overdue": overdue,
+        }
+        summary["total"] += total
+        summary["completed"] += completed
+        summary["overdue"] += overdue
+    summary["incomplete"] = summary["total"] - summary["completed"]
+
+    add_percentages(summary, summary["total"])
+    for counters in users.values():
+        add_percentages(counters, summary["total"])
+    summary["users"] = users
+
+    return summary
+
+
+# Positions in the per-task state lists kept by `TaskStatistics`
+USERNAME, DUE_DATE, COMPLETED, OVERDUE = range(4)
+
+
+class TaskStatistics:
+    """
+    The class `TaskStatistics` keeps the report counters up to date as tasks
+    are added and edited, so the reports don't have to look at every task.
+
+    Adding, reassigning, completing or changing the due date of a task costs
+    O(1) (O(log N) when a due date has to be queued). Incomplete tasks that
+    are not overdue yet wait in a heap ordered by due date; whenever the
+    counters are read for a later date the heap is popped up to that date and
+    the tasks that have become overdue are counted. Heap entries are not
+    removed when a task changes, instead they are skipped when popped if they
+    no longer match the task.
+    """
+
+    def __init__(self, tasks=()):
+        """
+        :param tasks: an iterable of (task id, `Task`) tuples to
+        start from.
+        """
+        self.total = 0
+        self.completed = 0
+        self.overdue = 0
+        # username -> [total, completed, overdue]
+        self.users = {}
+        # task id -> [username, due_date, completed, overdue]
+        self.tasks = {}
+        # (due_date, task id) for incomplete tasks not yet counted as overdue
+        self.due_heap = []
+        # Tasks due before this date have been counted as overdue
+        self.current_date = None
+
+        for task_id, task in tasks:
+            self.add(task_id, task, queue=False)
+        self.due_heap = [
+            (state[DUE_DATE], task_id)
+            for task_id, state in self.tasks.items()
+            if not state[COMPLETED]
+        ]
+        heapq.heapify(self.due_heap)
+
+    def user_counts(self, username):
+        counts = self.users.get(username)
+        if counts is None:
+            counts = self.users[username] = [0, 0, 0]
+        return counts
+
+    def add(self, task_id, task, queue=True):
+        """Counts a newly added task."""
+        state = [task.username, task.due_date, task.completed, False]
+        self.tasks[task_id] = state
+        counts = self.user_counts(task.username)
+        self.total += 1
+        counts[0] += 1
+        if task.completed:
+            self.completed += 1
+            counts[1] += 1
+        elif queue:
+            self.queue(task_id, state)
+
+    def queue(self, task_id, state):
+        """Counts an incomplete task as overdue or queues it by due date."""
+        if self.current_date is not None and state[DUE_DATE] < self.current_date:
+            self.mark_overdue(state)
+        else:
+            heapq.heappush(self.due_heap, (state[DUE_DATE], task_id))
+
+    def mark_overdue(self, state):
+        state[OVERDUE] = True
+        self.overdue += 1
+        self.users[state[USERNAME]][2] += 1
+
+    def clear_overdue(self, state):
+        if state[OVERDUE]:
+            state[OVERDUE] = False
+            self.overdue -= 1
+            self.users[state[USERNAME]][2] -= 1
+
+    def reassign(self, task_id, username):
+        """Moves a task's counts over to another user."""
+        state = self.tasks[task_id]
+        old_counts = self.users[state[USERNAME]]
+        new_counts = self.user_counts(username)
+        old_counts[0] -= 1
+        new_counts[0] += 1
+        if state[COMPLETED]:
+            old_counts[1] -= 1
+            new_counts[1] += 1
+        if state[OVERDUE]:
+            old_counts[2] -= 1
+            new_counts[2] += 1
+        state[USERNAME] = username
+
+    def set_due_date(self, task_id, due_date):
+        """Moves a task to its new place in the due date order."""
+        state = self.tasks[task_id]
+        self.clear_overdue(state)
+        state[DUE_DATE] = due_date
+        if not state[COMPLETED]:
+            self.queue(task_id, state)
+
+    def complete(self, task_id):
+        """Counts a task as completed, it can no longer be overdue."""
+        state = self.tasks[task_id]
+        if state[COMPLETED]:
+            return
+        self.clear_overdue(state)
+        state[COMPLETED] = True
+        self.completed += 1
+        self.users[state[USERNAME]][1] += 1
+
+    def advance(self, current_date):
+        """
+        The method `advance` counts every queued task that is due before
+        `current_date` as overdue.
+
+        :param current_date: the datetime that due dates are compared against.
+        """
+        if self.current_date is not None and current_date < self.current_date:
+            # The clock went backwards, so start the overdue counts again
+            for state in self.tasks.values():
+                self.clear_overdue(state)
+            self.due_heap = [
+                (state[DUE_DATE], task_id)
+                for task_id, state in self.tasks.items()
+                if not state[COMPLETED]
+            ]
+            heapq.heapify(self.due_heap)
+        self.current_date = current_date
+
+        cutoff = overdue_cutoff(current_date)
+        due_heap = self.due_heap
+        while due_heap and due_heap[0][0] < cutoff:
+            due_date, task_id = heapq.heappop(due_heap)
+            state = self.tasks[task_id]
+            # Skip entries left behind by completed or rescheduled tasks
+            if state[COMPLETED] or state[OVERDUE] or state[DUE_DATE] != due_date:
+                continue
+            self.mark_overdue(state)
+
+    def totals(self, current_date):
+        """
+        :return: the global counters and percentages on `current_date`.
+        """
+        self.advance(current_date)
+        totals = {
+            "total": self.total,
+            "completed": self.completed,
+            "incomplete": self.total - self.completed,
+            "overdue": self.overdue,
+        }
+        return add_percentages(totals, self.total)
+
+    def summary(self, current_date):
+        """
+        :return: the same dictionary as `aggregate_tasks` on `current_date`.
+        """
+        self.advance(current_date)
+        return summarise_user_counts(
+            (username, total, completed, overdue)
+            for username, (total, completed, overdue) in self.users.items()
+            if total
+        )
@@ -0,0 +1,191 @@
+# Deadline scheduler for the task manager.
+#
+# Keeps the incomplete tasks in a heap ordered by due date and calls reminder
+# hooks as their deadlines pass, either when asked to or from a background
+# thread. A task is overdue once its due date is before the current date and
+# time, the same rule the reports use.
+
+import heapq
+import threading
+from datetime import datetime
+
+# How long the background thread sleeps at most before looking again, in
+# seconds. It also wakes up when an earlier deadline is added.
+POLL_INTERVAL = 60
+
+
+class DeadlineScheduler:
+    """
+    The class `DeadlineScheduler` fires reminder hooks when incomplete tasks
+    become overdue.
+
+    Each incomplete task has one (due date, task id) entry in a heap, so
+    adding a task or changing its due date costs O(log N) and finding the
+    deadlines that have passed only looks at those deadlines. Entries are not
+    removed when a task is completed or rescheduled, instead they are skipped
+    when popped if they no longer match the task.
+
+    Tasks that are already overdue when the scheduler is built or told about
+    them don't fire, reminders are only for deadlines passing while it runs.
+    All methods may be called while the background thread is running.
+    """
+
+    def __init__(self, tasks=(), current_date=None):
+        """
+        :param tasks: an iterable of (task id, `Task`) tuples to start from,
+        completed tasks are ignored.
+        :param current_date: deadlines before this datetime have already
+        passed, defaults to now.
+        """
+        self.lock = threading.RLock()
+        self.hooks = []
+        self.wake_up = threading.Event()
+        self.thread = None
+        self.rebuild(tasks, current_date)
+
+    def rebuild(self, tasks, current_date=None):
+        """
+        The method `rebuild` starts again from a new set of tasks, e.g. after
+        another session has changed them.
+        """
+        with self.lock:
+            # task id -> [due date, username, task] of incomplete tasks, the
+            # due date is None once the deadline has passed. The title is
+            # only read from the task once a reminder fires, as tasks loaded
+            # from a binary snapshot decode it on first use.
+            self.deadlines = {}
+            for task_id, task in tasks:
+                if not task.completed:
+                    self.deadlines[task_id] = [task.due_date, task.username, task]
+            self.due_heap = [
+                (deadline[0], task_id) for task_id, deadline in self.deadlines.items()
+            ]
+            heapq.heapify(self.due_heap)
+            self.current_date = current_date or datetime.today()
+            self.pop_passed(self.current_date)
+        self.wake_up.set()
+
+    def add_hook(self, hook):
+        """
+        Registers a reminder hook. It is called as
+        hook(task_id, username, title, due_date) for every deadline that
+        passes, on the thread that notices it.
+        """
+        self.hooks.append(hook)
+
+    # =====Keeping up with task changes===========
+
+    def task_added(self, task_id, task):
+        if task.completed:
+            return
+        with self.lock:
+            self.deadlines[task_id] = [task.due_date, task.username, task]
+            self.push(task_id, task.due_date)
+
+    def due_date_changed(self, task_id, due_date):
+        with self.lock:
+            deadline = self.deadlines.get(task_id)
+            if deadline is not None:
+                deadline[0] = due_date
+                self.push(task_id, due_date)
+
+    def task_reassigned(self, task_id, username):
+        with self.lock:
+            deadline = self.deadlines.get(task_id)
+            if deadline is not None:
+                deadline[1] = username
+
+    def task_completed(self, task_id):
+        with self.lock:
+            # Its heap entry is skipped once it comes up
+            self.deadlines.pop(task_id, None)
+
+    def push(self, task_id, due_date):
+        if due_date < self.current_date:
+            return  # already passed, nothing to remind about
+        if not self.due_heap or due_date < self.due_heap[0][0]:
+            self.wake_up.set()  # the background thread may sleep too long
+        heapq.heappush(self.due_heap, (due_date, task_id))
+
+    # =====Firing reminders===========
+
+    def pop_passed(self, current_date):
+        """
+        :return: a list of (task id, username, title, due date) tuples for
+        the deadlines before `current_date` that have not been popped yet.
+        """
+        passed = []
+        due_heap = self.due_heap
+        while due_heap and due_heap[0][0] < current_date:
+            due_date, task_id = heapq.heappop(due_heap)
+            deadline = self.deadlines.get(task_id)
+            # Skip entries left behind by completed or rescheduled tasks
+            if deadline is None or deadline[0] != due_date:
+                continue
+            passed.append((task_id, deadline[1], deadline[2].title, due_date))
+            # The deadline has passed, any other entry for it is now stale
+            deadline[0] = None
+        return passed
+
+    def run_pending(self, current_date=None):
+        """
+        The method `run_pending` calls the hooks for every deadline that has
+        passed since it last ran.
+
+        :param current_date: the datetime to check against, defaults to now.
+        :return: the number of reminders fired.
+        """
+        current_date = current_date or datetime.today()
+        with self.lock:
+            passed = self.pop_passed(current_date)
+            self.current_date = max(self.current_date, current_date)
+        for reminder in passed:
+            for hook in self.hooks:
+                hook(*reminder)
+        return len(passed)
+
+    def next_deadline(self):
+        """:return: the earliest deadline still to pass, or None."""
+        with self.lock:
+            while self.due_heap:
+                due_date, task_id = self.due_heap[0]
+                deadline = self.deadlines.get(task_id)
+                if deadline is not None and deadline[0] == due_date:
+                    return due_date
+                heapq.heappop(self.due_heap)
+        return None
+
+    # =====Background thread===========
+
+    def start(self, poll_interval=POLL_INTERVAL):
+        """
+        The method `start` runs the scheduler on a daemon thread, which
+        sleeps until the next deadline passes (or for `poll_interval`
+        seconds at most) and then calls `run_pending`.
+        """
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(
+            target=self.run_forever, args=(poll_interval,), daemon=True
+        )
+        self.thread.start()
+
+    def run_forever(self, poll_interval):
+        while self.running:
+            self.wake_up.clear()
+            self.run_pending()
+            next_deadline = self.next_deadline()
+            timeout = poll_interval
+            if next_deadline is not None:
+                seconds = (next_deadline - datetime.today()).total_seconds()
+                timeout = min(poll_interval, max(seconds, 0))
+            self.wake_up.wait(timeout)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.running = False
+        self.wake_up.set()
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,190 @@
+# Full-text search over task titles and descriptions.
+#
+# `SearchIndex` is an inverted index from words to the ids of the tasks that
+# contain them, used by the flat file storage. Queries are one or more
+# words, all of which have to appear in a task; a word ending in "*" matches
+# every word starting with it, e.g. "repo* login".
+
+import math
+import re
+from array import array
+from bisect import bisect_left
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# How much more a word in the title counts for than one in the description
+TITLE_WEIGHT = 2.0
+
+
+def tokenize(text):
+    """
+    The function `tokenize` splits text into the words that are indexed and
+    searched for, ignoring letter case and punctuation.
+
+    :return: a list of words.
+    """
+    return WORD_PATTERN.findall(text.casefold())
+
+
+def parse_query(query):
+    """
+    The function `parse_query` splits a search query into terms.
+
+    :param query: the text typed in by the user.
+    :return: a list of (word, is prefix) tuples. Only the last word of an
+    entry ending in "*" is a prefix, e.g. "log-in*" gives
+    [("log", False), ("in", True)].
+    """
+    terms = []
+    for entry in query.split():
+        words = tokenize(entry)
+        for word in words:
+            terms.append((word, False))
+        if words and entry.endswith("*"):
+            terms[-1] = (words[-1], True)
+    return terms
+
+
+class SearchIndex:
+    """
+    The class `SearchIndex` maps every word in the task titles and
+    descriptions to the ids of the tasks containing it.
+
+    Titles and descriptions never change once a task has been added, so
+    the lists of ids only ever have ids appended to them, in increasing
+    order. They are kept as arrays of machine integers, which take a
+    fraction of the memory of lists of Python ints. A sorted list of every
+    known word is used to find the words matching a prefix with a binary
+    search.
+    """
+
+    def __init__(self, tasks=()):
+        """
+        :param tasks: an iterable of (task id, `Task`) tuples to index.
+        """
+        # word -> array of the ids of the tasks with the word in their title
+        self.title_ids = {}
+        # word -> array of the ids of the tasks with the word in their
+        # description
+        self.description_ids = {}
+        self.task_count = 0
+        self.words = []
+        self.words_sorted = True
+        for task_id, task in tasks:
+            self.add(task_id, task)
+
+    def add(self, task_id, task):
+        """Indexes a newly added task. Ids must be added in increasing order."""
+        self.task_count += 1
+        for postings, text in (
+            (self.title_ids, task.title),
+            (self.description_ids, task.description),
+        ):
+            for word in set(tokenize(text)):
+                task_ids = postings.get(word)
+                if task_ids is None:
+                    task_ids = postings[word] = array("q")
+                    self.words.append(word)
+                    self.words_sorted = False
+                task_ids.append(task_id)
+
+    def matching_words(self, word, is_prefix):
+        """:return: the indexed words equal to `word`, or starting with it."""
+        if not is_prefix:
+            return [word]
+        if not self.words_sorted:
+            # Words can be in both the title and description dictionaries
+            self.words = sorted(set(self.words))
+            self.words_sorted = True
+        words = self.words
+        matches = []
+        index = bisect_left(words, word)
+        while index < len(words) and words[index].startswith(word):
+            matches.append(words[index])
+            index += 1
+        return matches
+
+    def term_postings(self, word, is_prefix):
+        """
+        :return: a tuple of (arrays of the ids of tasks with the term in
+        their title, arrays of the ids of tasks with the term in their
+        description).
+        """
+        title_arrays = []
+        description_arrays = []
+        for matching_word in self.matching_words(word, is_prefix):
+            if matching_word in self.title_ids:
+                title_arrays.append(self.title_ids[matching_word])
+            if matching_word in self.description_ids:
+                description_arrays.append(self.description_ids[matching_word])
+        return title_arrays, description_arrays
+
+    def search(self, query):
+        """
+        The method `search` finds the tasks containing every term of a query
+        and ranks them.
+
+        Terms are looked at from the rarest to the most common. Once only a
+        few candidate tasks are left, they are looked up in the id arrays of
+        the remaining terms with a binary search rather than turning those
+        arrays into sets. A term counts for more the fewer tasks contain it
+        (its inverse document frequency, estimated from the length of its id
+        arrays), and TITLE_WEIGHT times as much when it is in the title.
+
+        :param query: the search text, see `parse_query`.
+        :return: a list of (score, task id) tuples, best match first.
+        """
+        terms = []
+        for word, is_prefix in parse_query(query):
+            title_arrays, description_arrays = self.term_postings(word, is_prefix)
+            size = sum(map(len, title_arrays)) + sum(map(len, description_arrays))
+            if not size:
+                return []
+            terms.append((size, title_arrays, description_arrays))
+        if not terms:
+            return []
+        terms.sort(key=lambda term: term[0])
+
+        candidates = None
+        # (weight, ids of candidates with the term in their title)
+        title_hits = []
+        for size, title_arrays, description_arrays in terms:
+            weight = math.log(1 + self.task_count / size)
+            if candidates is None or len(candidates) * 16 > size:
+                in_title = set().union(*title_arrays)
+                anywhere = in_title.union(*description_arrays)
+                candidates = anywhere if candidates is None else candidates & anywhere
+                in_title &= candidates
+            else:
+                in_title = {
+                    task_id
+                    for task_id in candidates
+                    if any(contains(ids, task_id) for ids in title_arrays)
+                }
+                candidates = in_title | {
+                    task_id
+                    for task_id in candidates - in_title
+                    if any(contains(ids, task_id) for ids in description_arrays)
+                }
+            if not candidates:
+                return []
+            title_hits.append((weight, in_title))
+
+        # Every candidate has every term, so they all share the score of the
+        # terms counted once and only differ by the terms in their title
+        base_score = sum(weight for weight, _ in title_hits)
+        scores = dict.fromkeys(candidates, base_score)
+        for weight, in_title in title_hits:
+            extra = weight * (TITLE_WEIGHT - 1)
+            for task_id in in_title & candidates:
+                scores[task_id] += extra
+
+        ranked = [(score, task_id) for task_id, score in scores.items()]
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return ranked
+
+
+def contains(task_ids, task_id):
+    """:return: `True` if the sorted array `task_ids` holds `task_id`."""
+    index = bisect_left(task_ids, task_id)
+    return index < len(task_ids) and task_ids[index] == task_id
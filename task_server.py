@@ -0,0 +1,419 @@
+# HTTP/JSON server mode for the task manager.
+#
+# Serves the same operations as the menu in task_manager.py to any number of
+# clients at once, all sharing one storage backend and user registry held in
+# memory by a single asyncio event loop. Only the standard library is used.
+#
+#   python task_server.py --port 8000
+#
+# Endpoints (everything except /login needs an "Authorization: Bearer
+# <token>" header with the token returned by /login):
+#   POST  /login          {"username", "password"} -> {"token", ...}
+#   POST  /users          {"username", "password"}     register a user
+#   POST  /tasks          {"username", "title", "description", "due_date"}
+#   GET   /tasks/mine                                  the caller's tasks
+#   PATCH /tasks/<id>     {"username"} / {"due_date"} / {"completed": true},
+#                         with "title" the change is refused (409) unless the
+#                         id still belongs to the task with that title
+#   GET   /reports/tasks                               task overview (admin)
+#   GET   /reports/users                               user overview (admin)
+
+# =====importing libraries===========
+import argparse
+import asyncio
+import json
+import re
+from datetime import date, datetime
+
+from task_storage import (
+    DATETIME_STRING_FORMAT,
+    Task,
+    TaskConflictError,
+    open_storage,
+)
+from task_users import (
+    SessionCache,
+    UserRegistry,
+    hash_password,
+    needs_rehash,
+    store_password,
+    verify_password,
+)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+HTTP_REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    """Raised by a request handler to send an error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def task_to_json(task_id, task):
+    return {
+        "id": task_id,
+        "username": task.username,
+        "title": task.title,
+        "description": task.description,
+        "due_date": task.due_date.strftime(DATETIME_STRING_FORMAT),
+        "assigned_date": task.assigned_date.strftime(DATETIME_STRING_FORMAT),
+        "completed": task.completed,
+    }
+
+
+def text_field(body, name):
+    """
+    The function `text_field` reads a required text field from a request body.
+    Semicolons and line breaks would corrupt the semicolon separated files,
+    so they are refused.
+    """
+    value = body.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(400, f"'{name}' is required")
+    if ";" in value or "\n" in value or "\r" in value:
+        raise ApiError(400, f"'{name}' may not contain ';' or line breaks")
+    return value
+
+
+def date_field(body, name):
+    value = text_field(body, name)
+    try:
+        return datetime.strptime(value, DATETIME_STRING_FORMAT)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must use the format YYYY-MM-DD")
+
+
+class TaskServer:
+    """
+    The class `TaskServer` answers HTTP requests against one storage backend.
+    Requests are handled one at a time on the event loop, so the storage and
+    the user registry never see concurrent changes, while slow clients only
+    hold up their own connection. Password hashing, which is slow on purpose,
+    runs in worker threads so it doesn't hold up the other requests either.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.users = UserRegistry(storage.load_users())
+        # Logged in users are recognised by their token, so their password
+        # is only checked, which is slow on purpose, when they log in
+        self.sessions = SessionCache()
+        self.routes = [
+            ("POST", re.compile(r"/login"), self.login),
+            ("POST", re.compile(r"/users"), self.register_user),
+            ("POST", re.compile(r"/tasks"), self.add_task),
+            ("GET", re.compile(r"/tasks/mine"), self.my_tasks),
+            ("PATCH", re.compile(r"/tasks/(\d+)"), self.edit_task),
+            ("GET", re.compile(r"/reports/tasks"), self.task_report),
+            ("GET", re.compile(r"/reports/users"), self.user_report),
+        ]
+
+    def reload_users(self):
+        """Picks up users registered, or passwords changed, by other sessions."""
+        for username, password in self.storage.load_users().items():
+            self.users.add(username, password)
+
+    def registered_username(self, username):
+        """
+        :return: the username as it was registered, or None if there is no
+        such user. Like `log_in`, the users are read again before giving up.
+        """
+        if not self.users.exists(username):
+            self.reload_users()
+        return self.users.get_username(username)
+
+    async def check_password(self, username, password):
+        """
+        The coroutine `check_password` is `UserRegistry.check_password` with
+        the slow check run in a worker thread. hashlib releases the GIL while
+        hashing, so other requests are served in the meantime.
+        """
+        if self.users.recently_verified(username, password):
+            return True
+        stored_password = self.users.get_password(username)
+        if stored_password is None:
+            return False
+        if not await asyncio.get_running_loop().run_in_executor(
+            None, verify_password, stored_password, password
+        ):
+            return False
+        self.users.remember_verified(username, stored_password, password)
+        return True
+
+    async def hash_password(self, password):
+        """The coroutine `hash_password` hashes a password in a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, hash_password, password
+        )
+
+    # =====Request handlers===========
+
+    async def login(self, current_user, body):
+        username = body.get("username")
+        password = body.get("password")
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise ApiError(400, "'username' and 'password' are required")
+        if self.registered_username(username) is None:
+            raise ApiError(401, "Incorrect username or password")
+        if not await self.check_password(username, password):
+            # The password may have been changed by another session
+            stored_password = self.users.get_password(username)
+            self.reload_users()
+            if stored_password == self.users.get_password(
+                username
+            ) or not await self.check_password(username, password):
+                raise ApiError(401, "Incorrect username or password")
+        # Passwords in plain text or hashed with old settings are hashed again
+        if needs_rehash(self.users.get_password(username)):
+            store_password(
+                self.storage,
+                self.users,
+                self.users.get_username(username),
+                await self.hash_password(password),
+            )
+        username = self.users.get_username(username)
+        token = self.sessions.create(username)
+        return 200, {
+            "token": token,
+            "username": username,
+            "admin": username == "admin",
+        }
+
+    async def register_user(self, current_user, body):
+        username = text_field(body, "username")
+        password = text_field(body, "password")
+        if self.registered_username(username) is not None:
+            raise ApiError(409, "User name already exists")
+        stored_password = await self.hash_password(password)
+        # Another request may have registered the name while hashing
+        if self.users.exists(username):
+            raise ApiError(409, "User name already exists")
+        store_password(self.storage, self.users, username, stored_password)
+        return 201, {"username": username}
+
+    def add_task(self, current_user, body):
+        username = self.registered_username(text_field(body, "username"))
+        if username is None:
+            raise ApiError(400, "User does not exist")
+        task = Task(
+            username,
+            text_field(body, "title"),
+            text_field(body, "description"),
+            date_field(body, "due_date"),
+            date.today(),
+            False,
+        )
+        task_id = self.storage.add_task(task)
+        return 201, task_to_json(task_id, task)
+
+    def my_tasks(self, current_user, body):
+        self.storage.refresh()
+        tasks = self.storage.user_tasks(current_user)
+        return 200, {"tasks": [task_to_json(task_id, t) for task_id, t in tasks]}
+
+    def edit_task(self, current_user, body, task_id):
+        task_id = int(task_id)
+        self.storage.refresh()
+        task = self.storage.get_task(task_id)
+        if task is None or task.username != current_user:
+            raise ApiError(404, "Task not found")
+        # Archiving renumbers the flat file tasks, so an id a client read
+        # earlier can now belong to another of the caller's tasks
+        if "title" in body and body["title"] != task.title:
+            raise ApiError(
+                409, f"Task {task_id} has been changed, please get your tasks again"
+            )
+        if task.completed:
+            raise ApiError(
+                409, "This task is marked as complete and can no longer be edited"
+            )
+
+        # Check every field before changing anything, then save them together
+        new_due_date = new_user = None
+        if "due_date" in body:
+            new_due_date = date_field(body, "due_date")
+        if "username" in body:
+            new_user = self.registered_username(text_field(body, "username"))
+            if new_user is None:
+                raise ApiError(400, "User does not exist")
+
+        try:
+            self.storage.edit_task(
+                task_id,
+                username=new_user,
+                due_date=new_due_date,
+                complete=body.get("completed") is True,
+                expected=task,
+            )
+        except TaskConflictError as error:
+            raise ApiError(409, str(error))
+
+        return 200, task_to_json(task_id, self.storage.get_task(task_id))
+
+    def require_admin(self, current_user):
+        if current_user != "admin":
+            raise ApiError(403, "Reports are only available to the admin")
+
+    def task_report(self, current_user, body):
+        self.require_admin(current_user)
+        self.storage.refresh()
+        return 200, self.storage.task_totals(datetime.today())
+
+    def user_report(self, current_user, body):
+        self.require_admin(current_user)
+        self.storage.refresh()
+        summary = self.storage.task_summary(datetime.today())
+        summary["total_users"] = len(self.users)
+        return 200, summary
+
+    # =====HTTP===========
+
+    async def dispatch(self, method, path, headers, body):
+        """
+        The coroutine `dispatch` finds the handler for a request and runs it.
+
+        :return: a tuple of (HTTP status, JSON serialisable response).
+        """
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+
+            current_user = None
+            if handler != self.login:
+                scheme, _, token = headers.get("authorization", "").partition(" ")
+                if scheme != "Bearer":
+                    raise ApiError(401, "Please log in first")
+                current_user = self.sessions.get(token)
+                if current_user is None:
+                    raise ApiError(401, "Please log in first")
+
+            try:
+                body = json.loads(body) if body else {}
+            except ValueError:
+                raise ApiError(400, "The request body must be JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "The request body must be a JSON object")
+            response = handler(current_user, body, *match.groups())
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        if allowed:
+            raise ApiError(405, "Method not allowed")
+        raise ApiError(404, "Not found")
+
+    async def handle_connection(self, reader, writer):
+        """
+        The coroutine `handle_connection` serves HTTP/1.1 requests on one
+        connection, keeping it open between requests unless asked not to.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_SIZE:
+                        raise ApiError(413, "The request body is too large")
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    status, response = await self.dispatch(
+                        method, path, headers, body
+                    )
+                except ApiError as error:
+                    status, response = error.status, {"error": error.message}
+                except ValueError:
+                    status, response = 400, {"error": "Invalid request"}
+                except Exception as error:
+                    print(f"Error handling {method} {path}: {error!r}")
+                    status, response = 500, {"error": "Internal server error"}
+
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                    and status != 413
+                )
+                data = json.dumps(response).encode("utf-8")
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                        + "Content-Type: application/json\r\n"
+                        + f"Content-Length: {len(data)}\r\n"
+                        + ("" if keep_alive else "Connection: close\r\n")
+                        + "\r\n"
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ", ".join(str(s.getsockname()) for s in server.sockets)
+        print(f"Task manager server listening on {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the task manager as a JSON API over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--storage", help="flatfile or sqlite, defaults to TASK_STORAGE"
+    )
+    args = parser.parse_args()
+
+    server = TaskServer(open_storage(args.storage))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.storage.close()
+
+
+if __name__ == "__main__":
+    main()
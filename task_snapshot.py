@@ -0,0 +1,256 @@
+# Binary snapshot format for the task list.
+#
+# An alternative to the semicolon separated tasks.txt that can be opened
+# with mmap instead of being parsed line by line. The file is laid out as:
+#   header   magic b"TASKSNAP", format version, number of tasks
+#   records  one fixed-width record per task, in task id order
+#   heap     the UTF-8 text of every username, title and description
+# A record holds the offset and length in the heap of the task's username,
+# title and description, its due and assigned dates as ordinals
+# (`date.toordinal`) and a flags byte. Each username is stored in the heap
+# once and shared by all of its tasks.
+#
+# Loading only decodes what the indexes and reports need (username, dates
+# and flags). Titles and descriptions stay in the mapped file until a task is
+# shown, see `SnapshotTask`.
+
+# =====importing libraries===========
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime
+
+from task_perf import count, timed
+
+MAGIC = b"TASKSNAP"
+FORMAT_VERSION = 1
+
+# magic, format version, number of tasks
+HEADER = struct.Struct("<8sIQ")
+# username offset, username length, title offset, title length, description
+# offset, description length, due date ordinal, assigned date ordinal, flags
+RECORD = struct.Struct("<IIIIIIIIB")
+# The same record, skipping the fields that loading doesn't need
+LOAD_RECORD = struct.Struct("<I20xIIB")
+USERNAME_FIELD = 0
+TITLE_FIELD = 2
+DESCRIPTION_FIELD = 4
+
+FLAG_COMPLETED = 1
+
+# Heap offsets are 32 bit
+MAX_HEAP_SIZE = 2**32 - 1
+
+
+class DateCache(dict):
+    """A dictionary of date ordinal -> datetime, filled in as it is used."""
+
+    def __missing__(self, ordinal):
+        date_value = self[ordinal] = datetime.fromordinal(ordinal)
+        return date_value
+
+
+class SnapshotTask:
+    """
+    The class `SnapshotTask` is a task loaded from a binary snapshot. It has
+    the same attributes as `task_storage.Task`, but its title and
+    description are only read from the snapshot when they are used, so
+    loading never has to build those strings for tasks nobody looks at.
+    Titles and descriptions never change, the other attributes can be
+    changed like those of any task.
+    """
+
+    __slots__ = (
+        "username",
+        "due_date",
+        "assigned_date",
+        "completed",
+        "snapshot",
+        "record",
+    )
+
+    def __init__(
+        self, snapshot, record, username, due_date, assigned_date, completed
+    ):
+        self.snapshot = snapshot
+        self.record = record
+        self.username = username
+        self.due_date = due_date
+        self.assigned_date = assigned_date
+        self.completed = completed
+
+    @property
+    def title(self):
+        return self.snapshot.text(self.record, TITLE_FIELD)
+
+    @property
+    def description(self):
+        return self.snapshot.text(self.record, DESCRIPTION_FIELD)
+
+    def __repr__(self):
+        return (
+            f"SnapshotTask({self.username!r}, {self.title!r}, "
+            + f"{self.description!r}, {self.due_date!r}, "
+            + f"{self.assigned_date!r}, {self.completed!r})"
+        )
+
+
+class TaskSnapshot:
+    """
+    The class `TaskSnapshot` reads a binary snapshot that has been mapped
+    into memory. The mapping stays open for as long as any of its tasks is
+    in use.
+    """
+
+    def __init__(self, data, file_name):
+        """
+        :param data: the contents of the file, an `mmap` or bytes.
+        :param file_name: only used in error messages.
+        :raises ValueError: if the data is not a snapshot this version can
+        read.
+        """
+        if len(data) < HEADER.size:
+            raise ValueError(f"{file_name} is too short to be a task snapshot")
+        magic, version, task_count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file_name} is not a task snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"{file_name} uses snapshot format {version}, "
+                + f"only {FORMAT_VERSION} is supported"
+            )
+        self.data = data
+        self.task_count = task_count
+        self.records_start = HEADER.size
+        self.heap_start = HEADER.size + task_count * RECORD.size
+        if len(data) < self.heap_start:
+            raise ValueError(f"{file_name} is truncated")
+
+    def text(self, record, field):
+        """:return: one of the text fields of the task at position `record`."""
+        fields = RECORD.unpack_from(
+            self.data, self.records_start + record * RECORD.size
+        )
+        start = self.heap_start + fields[field]
+        return self.data[start:start + fields[field + 1]].decode("utf-8")
+
+    def tasks(self):
+        """
+        The method `tasks` builds a `SnapshotTask` for every record. Usernames
+        are interned and each date is only converted once.
+
+        :return: a list of tasks in task id order.
+        """
+        # username offset -> username
+        usernames = {}
+        dates = DateCache()
+        task_list = []
+        append = task_list.append
+        with memoryview(self.data) as view, view[
+            self.records_start:self.heap_start
+        ] as records:
+            for record, (username_offset, due, assigned, flags) in enumerate(
+                LOAD_RECORD.iter_unpack(records)
+            ):
+                username = usernames.get(username_offset)
+                if username is None:
+                    username = usernames[username_offset] = sys.intern(
+                        self.text(record, USERNAME_FIELD)
+                    )
+                append(
+                    SnapshotTask(
+                        self,
+                        record,
+                        username,
+                        dates[due],
+                        dates[assigned],
+                        flags & FLAG_COMPLETED == FLAG_COMPLETED,
+                    )
+                )
+        return task_list
+
+
+# =====Reading and writing===========
+
+
+def map_file(file_name):
+    """
+    :return: the contents of a file, mapped into memory. Windows can't
+    replace a file that is mapped, so there it is read instead.
+    """
+    with open(file_name, "rb") as snapshot_file:
+        if os.name == "nt" or os.fstat(snapshot_file.fileno()).st_size == 0:
+            return snapshot_file.read()
+        return mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@timed("storage.read_snapshot")
+def read_snapshot(file_name):
+    """
+    The function `read_snapshot` loads the tasks from a binary snapshot. An
+    empty file holds no tasks.
+
+    :return: a list of `SnapshotTask`.
+    :raises ValueError: if the file is not a valid snapshot.
+    """
+    data = map_file(file_name)
+    if not data:
+        return []
+    task_list = TaskSnapshot(data, file_name).tasks()
+    count("tasks.rows_parsed", len(task_list))
+    return task_list
+
+
+def snapshot_task_count(file_name):
+    """:return: the number of tasks in a snapshot, read from its header."""
+    with open(file_name, "rb") as snapshot_file:
+        header = snapshot_file.read(HEADER.size)
+    if not header:
+        return 0
+    if len(header) < HEADER.size or not header.startswith(MAGIC):
+        raise ValueError(f"{file_name} is not a task snapshot")
+    return HEADER.unpack(header)[2]
+
+
+def snapshot_bytes(tasks):
+    """
+    The function `snapshot_bytes` encodes tasks in the binary snapshot
+    format.
+
+    :param tasks: a list of tasks.
+    :return: the contents of the snapshot file.
+    :raises ValueError: if the text of the tasks doesn't fit in the heap.
+    """
+    heap = bytearray()
+    # username -> (offset, length), every username is stored once
+    usernames = {}
+    records = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, len(tasks)))
+
+    def add_text(text):
+        encoded = text.encode("utf-8")
+        offset = len(heap)
+        heap.extend(encoded)
+        return offset, len(encoded)
+
+    for task in tasks:
+        username = usernames.get(task.username)
+        if username is None:
+            username = usernames[task.username] = add_text(task.username)
+        title = add_text(task.title)
+        description = add_text(task.description)
+        records += RECORD.pack(
+            username[0],
+            username[1],
+            title[0],
+            title[1],
+            description[0],
+            description[1],
+            task.due_date.toordinal(),
+            task.assigned_date.toordinal(),
+            FLAG_COMPLETED if task.completed else 0,
+        )
+        if len(heap) > MAX_HEAP_SIZE:
+            raise ValueError("The tasks are too large for a snapshot")
+
+    return bytes(records + heap)
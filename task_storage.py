@@ -0,0 +1,2011 @@
+# Storage backends for the task manager.
+#
+# The task manager talks to its data through a storage object rather than
+# reading and writing the text files itself. Two backends are available:
+#   * FlatFileStorage - the original semicolon separated tasks.txt / user.txt
+#     files, with an append-only journal for task changes.
+#   * BinaryFileStorage - the same, with the tasks kept in a binary snapshot
+#     (tasks.bin) that is memory mapped instead of parsed, see
+#     task_snapshot.py.
+#   * SQLiteStorage - a tasks.db database with indexes on username, due date
+#     and completion state.
+# The backend is chosen with the TASK_STORAGE environment variable and data
+# can be moved between them by running this file, e.g.:
+#   python task_storage.py flatfile sqlite
+#   python task_storage.py flatfile binary
+
+# =====importing libraries===========
+import argparse
+import bisect
+import os
+import sqlite3
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, msvcrt provides locking instead
+    fcntl = None
+    import msvcrt
+
+from task_perf import count, timed
+from task_reports import (
+    TaskStatistics,
+    aggregate_tasks,
+    overdue_cutoff,
+    summarise_user_counts,
+)
+from task_search import SearchIndex, parse_query
+from task_snapshot import read_snapshot, snapshot_bytes, snapshot_task_count
+
+DATETIME_STRING_FORMAT = "%Y-%m-%d"
+
+TASKS_FILE = "tasks.txt"
+USERS_FILE = "user.txt"
+JOURNAL_FILE = "tasks_journal.txt"
+BINARY_TASKS_FILE = "tasks.bin"
+BINARY_JOURNAL_FILE = "tasks_bin_journal.txt"
+DATABASE_FILE = "tasks.db"
+# Number of journal records after which tasks.txt is rewritten as a fresh
+# snapshot and the journal is emptied again.
+JOURNAL_COMPACT_THRESHOLD = 500
+# Smaller tasks.txt files are loaded rather than counted for the totals, as
+# loading them takes no longer and the tasks are needed soon anyway
+COUNT_WITHOUT_LOADING_SIZE = 64 * 1024
+
+DEFAULT_USERS = {"admin": "password"}
+
+# Parsed due / assigned dates keyed by their text. Many tasks share the same
+# dates so most lookups never have to parse anything.
+DATE_CACHE = {}
+DATE_CACHE_LIMIT = 100000
+
+
+# =====Task representation===========
+
+
+class Task:
+    """
+    The class `Task` holds one task. It uses `__slots__` so a task takes a
+    fraction of the memory of the dictionary that used to represent it, which
+    matters once there are hundreds of thousands of tasks in memory.
+    """
+
+    __slots__ = (
+        "username",
+        "title",
+        "description",
+        "due_date",
+        "assigned_date",
+        "completed",
+    )
+
+    def __init__(
+        self, username, title, description, due_date, assigned_date, completed=False
+    ):
+        self.username = username
+        self.title = title
+        self.description = description
+        self.due_date = due_date
+        self.assigned_date = assigned_date
+        self.completed = completed
+
+    def __repr__(self):
+        return f"Task({task_to_str(self)!r})"
+
+
+# =====Text format helpers===========
+
+
+def parse_date(date_string):
+    """
+    The function `parse_date` converts a "YYYY-MM-DD" string into a datetime.
+    `datetime.fromisoformat` is much quicker than `datetime.strptime`, and
+    results are cached because the same dates come up over and over again.
+
+    :param date_string: the date as stored in tasks.txt.
+    :return: a datetime at midnight on that date.
+    :raises ValueError: if the string is not a valid date.
+    """
+    date_value = DATE_CACHE.get(date_string)
+    if date_value is None:
+        try:
+            date_value = datetime.fromisoformat(date_string)
+        except ValueError:
+            # strptime also accepts e.g. single digit months and days
+            date_value = datetime.strptime(date_string, DATETIME_STRING_FORMAT)
+        if len(DATE_CACHE) >= DATE_CACHE_LIMIT:
+            DATE_CACHE.clear()
+        DATE_CACHE[date_string] = date_value
+    return date_value
+
+
+@timed("storage.load_task_file")
+def load_task_file(file_name):
+    """
+    The function `load_task_file` reads tasks.txt one line at a time and
+    builds the task list. Lines that can't be parsed are skipped and
+    reported instead of stopping the program.
+    Usernames are interned so every task assigned to a user shares a single
+    string, and dates come from the `parse_date` cache.
+
+    :param file_name: the path of the task file.
+    :return: a tuple of (task list, malformed lines) where malformed lines is
+    a list of (line number, reason) tuples.
+    """
+    task_list = []
+    malformed = []
+    append = task_list.append
+    intern = sys.intern
+    with open(file_name, "r") as task_file:
+        for line_number, task_str in enumerate(task_file, start=1):
+            task_str = task_str.rstrip("\r\n")
+            if not task_str:
+                continue
+            task_components = task_str.split(";")
+            if len(task_components) < 6:
+                malformed.append(
+                    (line_number, f"expected 6 fields, found {len(task_components)}")
+                )
+                continue
+            try:
+                due_date = parse_date(task_components[3])
+                assigned_date = parse_date(task_components[4])
+            except ValueError as error:
+                malformed.append((line_number, str(error)))
+                continue
+            append(
+                Task(
+                    intern(task_components[0]),
+                    task_components[1],
+                    task_components[2],
+                    due_date,
+                    assigned_date,
+                    task_components[5] == "Yes",
+                )
+            )
+
+    count("tasks.rows_parsed", len(task_list))
+    count("tasks.malformed_rows", len(malformed))
+    count("files.bytes_read", os.path.getsize(file_name))
+    return task_list, malformed
+
+
+def parse_task(task_str):
+    """
+    The function `parse_task` converts a single semicolon separated line from
+    tasks.txt into a `Task`.
+
+    :param task_str: a string in the format
+    "username;title;description;due_date;assigned_date;Yes/No"
+    :return: the `Task`.
+    """
+    # Split by semicolon and manually add each component
+    task_components = task_str.split(";")
+    return Task(
+        sys.intern(task_components[0]),
+        task_components[1],
+        task_components[2],
+        parse_date(task_components[3]),
+        parse_date(task_components[4]),
+        True if task_components[5] == "Yes" else False,
+    )
+
+
+def task_to_str(task):
+    """
+    The function `task_to_str` is the inverse of `parse_task` and converts a
+    `Task` back into a line for tasks.txt.
+
+    :param task: the `Task`.
+    :return: a semicolon separated string.
+    """
+    str_attrs = [
+        task.username,
+        task.title,
+        task.description,
+        task.due_date.strftime(DATETIME_STRING_FORMAT),
+        task.assigned_date.strftime(DATETIME_STRING_FORMAT),
+        "Yes" if task.completed else "No",
+    ]
+    return ";".join(str_attrs)
+
+
+def create_user_data_dict(user_data):
+    """
+    The function `create_user_data_dict` takes a list of user data in the
+    format "username;password" and returns a dictionary where the usernames
+    are the keys and the passwords are the values.
+
+    :param user_data: A list of strings where each string represents user data
+    in the format "username;password"
+    :return: a dictionary where the keys are usernames and the values are
+    passwords.
+    """
+    username_password = {}
+    for user in user_data:
+        username, password = user.split(";")
+        username_password[username] = password
+
+    return username_password
+
+
+def task_matches(
+    task, username=None, status=None, due_from=None, due_to=None, current_date=None
+):
+    """
+    The function `task_matches` checks a task against the filters used when
+    viewing tasks. Filters left as None match every task.
+
+    :param task: the `Task` to check.
+    :param username: only tasks assigned to this user.
+    :param status: "complete", "incomplete" or "overdue".
+    :param due_from: only tasks due on or after this datetime.
+    :param due_to: only tasks due on or before this datetime.
+    :param current_date: the datetime used to decide what is overdue.
+    :return: `True` if the task passes every filter.
+    """
+    if username is not None and task.username != username:
+        return False
+    if status == "complete" and not task.completed:
+        return False
+    if status == "incomplete" and task.completed:
+        return False
+    if status == "overdue" and (
+        task.completed or not task.due_date < overdue_cutoff(current_date)
+    ):
+        return False
+    if due_from is not None and task.due_date < due_from:
+        return False
+    if due_to is not None and task.due_date > due_to:
+        return False
+    return True
+
+
+def same_task(task, expected):
+    """
+    The function `same_task` checks that a task is still the one a session
+    read earlier. Flat file task ids are positions in the file, and archiving
+    moves the remaining tasks up, so the same id can later belong to another
+    task. Due dates may change in the meantime, the rest may not.
+
+    :param task: the `Task` stored under the id now, or None.
+    :param expected: the `Task` as it was read, or None.
+    :return: `True` if both are the same task, assigned to the same user.
+    """
+    return (
+        task is not None
+        and expected is not None
+        and task.username == expected.username
+        and task.title == expected.title
+        and task.description == expected.description
+        and task.assigned_date == expected.assigned_date
+    )
+
+
+# =====File helpers===========
+
+
+class TaskConflictError(Exception):
+    """Raised when a change clashes with one made by another session."""
+
+
+@contextmanager
+def file_lock(lock_file_name, exclusive=True):
+    """
+    The context manager `file_lock` holds a lock on `lock_file_name` so that
+    several task manager sessions can share the same data files. Any number
+    of shared locks can be held at once, an exclusive lock waits for every
+    other lock to be released. On Windows every lock is exclusive.
+
+    :param lock_file_name: the file to lock, it is created if missing.
+    :param exclusive: `False` for a shared lock when only reading.
+    """
+    with open(lock_file_name, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(file_name, text):
+    """
+    The function `atomic_write` replaces the contents of a file so that
+    readers only ever see the old or the new contents, never a half written
+    file. The text (or bytes) is written and flushed to disk in a temporary
+    file which is then renamed over the original.
+
+    Every write has a temporary file of its own, so sessions writing the same
+    file at once (e.g. a report) never rename each other's half written
+    data into place. The last one to finish wins.
+    """
+    temp_file_name = f"{file_name}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(
+            temp_file_name, "xb" if isinstance(text, bytes) else "x"
+        ) as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+            size = temp_file.tell()
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        # Don't leave the temporary file behind
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+    count("files.bytes_written", size)
+
+
+def file_stamp(file_name):
+    """
+    :return: a value that changes whenever the file is replaced or written
+    to, or None if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# =====Storage backends===========
+
+
+class TaskStorage:
+    """
+    The class `TaskStorage` describes the operations every storage backend
+    provides. Tasks are handed out as (task id, `Task`) tuples, where
+    the task id is what is passed back in to update a task.
+    """
+
+    # The file the tasks are kept in, the history of task changes and the
+    # archive are kept next to it, see `task_history` and `task_archive`
+    data_file = ""
+    history = None
+    archive = None
+    # The id of the first task added, task ids that are positions in a list
+    # count from 0
+    FIRST_TASK_ID = 0
+
+    def load_users(self):
+        """:return: a dictionary of username -> password."""
+        raise NotImplementedError
+
+    def add_user(self, username, password):
+        """
+        Stores a new user or a new password for an existing user.
+
+        :return: a dictionary of every user, including any registered by
+        other sessions.
+        """
+        raise NotImplementedError
+
+    def add_users(self, username_password):
+        """
+        Stores many users or new passwords at once.
+
+        :param username_password: a dictionary of username -> password.
+        """
+        for username, password in username_password.items():
+            self.add_user(username, password)
+
+    def refresh(self):
+        """Picks up changes made by other sessions sharing the same data."""
+
+    def all_tasks(self):
+        """:return: an iterable of (task id, `Task`) tuples for every task."""
+        raise NotImplementedError
+
+    def user_tasks(self, username):
+        """:return: a list of (task id, `Task`) tuples assigned to `username`."""
+        raise NotImplementedError
+
+    def get_task(self, task_id):
+        """:return: the `Task` with the given task id, or None."""
+        raise NotImplementedError
+
+    def find_tasks(
+        self, username=None, status=None, due_from=None, due_to=None, current_date=None
+    ):
+        """
+        :return: an iterator of (task id, `Task`) tuples that pass the
+        filters described in `task_matches`. Matches are produced lazily so
+        the first few can be shown before the rest have been looked at.
+        """
+        filters = (username, status, due_from, due_to, current_date)
+        return (
+            (task_id, task)
+            for task_id, task in self.all_tasks()
+            if task_matches(task, *filters)
+        )
+
+    def search_tasks(
+        self,
+        query,
+        username=None,
+        status=None,
+        due_from=None,
+        due_to=None,
+        current_date=None,
+    ):
+        """
+        :param query: words that must all appear in the title or description
+        of a task, see `task_search.parse_query`.
+        :return: a list of (task id, `Task`) tuples of the matching tasks that
+        also pass the filters of `find_tasks`, best match first.
+        """
+        # Without an index of its own a backend indexes the tasks that pass
+        # the filters for every search
+        tasks = dict(
+            self.find_tasks(username, status, due_from, due_to, current_date)
+        )
+        search_index = SearchIndex(tasks.items())
+        return [
+            (task_id, tasks[task_id]) for _, task_id in search_index.search(query)
+        ]
+
+    def overdue_tasks(self, current_date, username=None):
+        """
+        :return: an iterator of (task id, `Task`) tuples of the incomplete
+        tasks due before `current_date`.
+        """
+        return self.find_tasks(
+            username=username, status="overdue", current_date=current_date
+        )
+
+    def upcoming_tasks(self, current_date, days, username=None):
+        """
+        :return: an iterator of (task id, `Task`) tuples of the incomplete
+        tasks that are not overdue yet but are due within `days` days of
+        `current_date`.
+        """
+        return self.find_tasks(
+            username=username,
+            status="incomplete",
+            due_from=overdue_cutoff(current_date),
+            due_to=current_date + timedelta(days=days),
+            current_date=current_date,
+        )
+
+    def add_task(self, task):
+        """Stores a new task and returns its task id."""
+        raise NotImplementedError
+
+    def add_tasks(self, tasks):
+        """
+        Stores many new tasks at once, saving them in one go rather than once
+        per task.
+
+        :return: the list of the new task ids.
+        """
+        return [self.add_task(task) for task in tasks]
+
+    def reassign_tasks(self, task_ids, username, expected=None):
+        """
+        Assigns many tasks to `username` at once. Tasks that don't exist,
+        are complete or are already assigned to `username` are skipped.
+
+        :param expected: a dictionary of task id -> `Task` as the caller read
+        it. Tasks that are no longer the same, see `same_task`, are skipped.
+        :return: the list of the ids of the tasks that were reassigned.
+        """
+        changed = []
+        for task_id in task_ids:
+            task = self.get_task(task_id)
+            if task is None or task.completed or task.username == username:
+                continue
+            if expected is not None and not same_task(task, expected.get(task_id)):
+                continue
+            try:
+                self.reassign_task(task_id, username, task)
+            except TaskConflictError:
+                continue
+            changed.append(task_id)
+        return changed
+
+    def complete_tasks(self, task_ids, expected=None):
+        """
+        Marks many tasks as complete at once. Tasks that don't exist or are
+        already complete are skipped.
+
+        :param expected: as for `reassign_tasks`.
+        :return: the list of the ids of the tasks that were completed.
+        """
+        changed = []
+        for task_id in task_ids:
+            task = self.get_task(task_id)
+            if task is None or task.completed:
+                continue
+            if expected is not None and not same_task(task, expected.get(task_id)):
+                continue
+            try:
+                self.complete_task(task_id, task)
+            except TaskConflictError:
+                continue
+            changed.append(task_id)
+        return changed
+
+    def edit_task(
+        self, task_id, username=None, due_date=None, complete=False, expected=None
+    ):
+        """
+        Changes one incomplete task. Every change asked for is saved
+        together, or none of them is.
+
+        :param username: the user to reassign the task to.
+        :param due_date: the new due date.
+        :param complete: `True` to mark the task as complete.
+        :param expected: the `Task` as the caller read it, to make sure the
+        id still belongs to the same task, see `same_task`.
+        :raises TaskConflictError: if the task is already complete or is no
+        longer the expected task.
+        """
+        raise NotImplementedError
+
+    def reassign_task(self, task_id, username, expected=None):
+        self.edit_task(task_id, username=username, expected=expected)
+
+    def set_due_date(self, task_id, due_date, expected=None):
+        self.edit_task(task_id, due_date=due_date, expected=expected)
+
+    def complete_task(self, task_id, expected=None):
+        self.edit_task(task_id, complete=True, expected=expected)
+
+    def task_summary(self, current_date):
+        """
+        :param current_date: the datetime that due dates are compared against.
+        :return: the global and per-user report counters, see
+        `task_reports.aggregate_tasks`.
+        """
+        return aggregate_tasks((t for _, t in self.all_tasks()), current_date)
+
+    def task_totals(self, current_date):
+        """
+        :param current_date: the datetime that due dates are compared against.
+        :return: only the global counters of `task_summary`.
+        """
+        summary = self.task_summary(current_date)
+        del summary["users"]
+        return summary
+
+    def task_count(self):
+        """:return: the number of tasks, as cheaply as the backend allows."""
+        return sum(1 for _ in self.all_tasks())
+
+    def storage_stats(self, current_date):
+        """
+        :param current_date: the datetime that due dates are compared against.
+        :return: the counters of `task_totals`, plus "files", a dictionary of
+        file name -> size in bytes as last read or written, and
+        "tasks_loaded_at" / "users_loaded_at", the datetimes the tasks and
+        users were read from storage (None if unknown).
+        """
+        stats = self.task_totals(current_date)
+        stats["files"] = {}
+        stats["tasks_loaded_at"] = None
+        stats["users_loaded_at"] = None
+        return stats
+
+    def tasks_loaded(self):
+        """
+        :return: `True` if the tasks can be read without loading them all
+        first, as a flat file storage has to the first time.
+        """
+        return True
+
+    def data_version(self):
+        """
+        :return: a value that changes whenever any task changes, including
+        changes made by other sessions that have been picked up by `refresh`,
+        or None if the backend can't tell.
+        """
+        return None
+
+    def archive_tasks(self, completed_before):
+        """
+        Moves every task completed before `completed_before` out of the live
+        tasks and into the archive, in one batch. When the tasks were
+        completed is taken from the history, see `archivable_tasks`. A run
+        cut off by a crash is finished first, see
+        `task_archive.TaskArchive.unfinished_run`.
+
+        :return: the number of tasks archived.
+        """
+        raise NotImplementedError
+
+    def archivable_tasks(self, completed_before):
+        """
+        :param completed_before: a datetime.
+        :return: a list of (task id, `Task`) tuples of the tasks completed
+        before `completed_before`, in task id order. Tasks completed before
+        the history started count as completed when it started.
+        """
+        completed_at, started_at = self.task_history().completion_times()
+        cutoff = completed_before.timestamp()
+        return sorted(
+            (
+                (task_id, task)
+                for task_id, task in self.find_tasks(status="complete")
+                if completed_at.get(task_id, started_at) < cutoff
+            ),
+            key=lambda item: item[0],
+        )
+
+    def replace_all(self, username_password, tasks):
+        """Replaces all stored users and tasks, used for migrations."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # =====History of changes===========
+
+    def task_history(self):
+        """
+        :return: the `task_history.TaskHistory` of the tasks stored here.
+        Each backend has its own, as the same task id means a different task
+        in each of them.
+        """
+        if self.history is None:
+            # task_history builds on this module, so it is imported on first use
+            from task_history import TaskHistory, history_files
+
+            self.history = TaskHistory(*history_files(self.data_file))
+        return self.history
+
+    def task_archive(self):
+        """:return: the `task_archive.TaskArchive` of the tasks stored here."""
+        if self.archive is None:
+            # task_archive builds on this module, so it is imported on first use
+            from task_archive import TaskArchive, archive_files
+
+            self.archive = TaskArchive(*archive_files(self.data_file))
+        return self.archive
+
+    def start_history(self):
+        """
+        The method `start_history` records every incomplete task as created
+        if there is no history yet, so the trends include the tasks there
+        were before it started. It is called before each change, so the
+        change itself isn't part of what is recorded.
+        """
+        history = self.task_history()
+        if not history.started():
+            history.start(self.find_tasks(status="incomplete"))
+
+    def record_history(self, records):
+        """
+        The method `record_history` adds task changes to the history.
+
+        :param records: a list of records, see `TaskHistory.append`.
+        """
+        self.task_history().append(records)
+
+
+class FlatFileStorage(TaskStorage):
+    """
+    The class `FlatFileStorage` keeps every task in memory and stores them in
+    the semicolon separated tasks.txt and user.txt files.
+
+    Every change to a task is appended to the journal as one line instead of
+    rewriting the whole of tasks.txt. Records look like:
+      version;<number>
+      add;<task id>;<task line as in tasks.txt>
+      reassign;<task id>;<username>
+      due_date;<task id>;<YYYY-MM-DD>
+      complete;<task id>
+    where the task id is the position of the task in `task_list`. On start up
+    the journal is replayed on top of tasks.txt, and once it grows past
+    JOURNAL_COMPACT_THRESHOLD records tasks.txt is rewritten as a new
+    snapshot and the journal starts again with the next version number.
+    Replaying a record that is already part of the snapshot changes nothing,
+    so a crash half way through compacting loses no data.
+
+    Several sessions can share the same files. Changes are made while holding
+    an exclusive lock on tasks.txt.lock, and each session first catches up
+    with the records other sessions have appended since it last looked, so
+    concurrent changes are merged rather than overwritten. Reading only takes
+    a shared lock, and is skipped entirely while the files are unchanged.
+    """
+
+    # tasks.txt is semicolon separated text, see `task_parallel`
+    SNAPSHOT_FORMAT = "text"
+
+    def __init__(
+        self, tasks_file=TASKS_FILE, users_file=USERS_FILE, journal_file=JOURNAL_FILE
+    ):
+        self.tasks_file = tasks_file
+        self.users_file = users_file
+        self.journal_file = journal_file
+        self.lock_file = tasks_file + ".lock"
+        self.users_lock_file = users_file + ".lock"
+        # Marks an archiving run, see `archive_tasks`
+        self.archiving_file = tasks_file + ".archiving"
+        self.data_file = tasks_file
+
+        with file_lock(self.users_lock_file):
+            # If no user.txt file, write one with a default account
+            if not os.path.exists(self.users_file):
+                self.write_users(DEFAULT_USERS)
+
+        with file_lock(self.lock_file):
+            # Create tasks.txt if it doesn't exist
+            if not os.path.exists(self.tasks_file):
+                with open(self.tasks_file, "w"):
+                    pass
+
+        # The tasks are only read once something needs them, see
+        # `ensure_loaded`
+        self.loaded = False
+        self.loaded_at = None
+        # Counts every change applied to the tasks, see `data_version`
+        self.changes = 0
+        # Kept for `storage_stats`, so it doesn't have to look at the files
+        self.users_file_size = None
+        self.users_loaded_at = None
+
+    # =====Users===========
+
+    def load_users(self):
+        with open(self.users_file, "r") as user_file:
+            user_data = user_file.read().split("\n")
+            self.users_file_size = os.fstat(user_file.fileno()).st_size
+        self.users_loaded_at = datetime.now()
+
+        return create_user_data_dict(user_data)
+
+    def write_users(self, username_password):
+        user_data = []
+        for k in username_password:
+            user_data.append(f"{k};{username_password[k]}")
+        atomic_write(self.users_file, "\n".join(user_data))
+        self.users_file_size = os.path.getsize(self.users_file)
+
+    def add_user(self, username, password):
+        return self.add_users({username: password})
+
+    def add_users(self, new_users):
+        # Re-read user.txt under the lock so users registered by another
+        # session in the meantime are kept
+        with file_lock(self.users_lock_file):
+            username_password = self.load_users()
+            username_password.update(new_users)
+            self.write_users(username_password)
+        return username_password
+
+    # =====Loading and catching up===========
+
+    @timed("storage.load")
+    def load(self):
+        """
+        The method `load` reads tasks.txt, builds the indexes and replays the
+        journal. It must be called while holding the lock.
+        """
+        # calls function to create task list
+        self.task_list, malformed = self.read_tasks_file()
+        for line_number, reason in malformed[:10]:
+            print(f"Skipping line {line_number} of {self.tasks_file}: {reason}")
+        if len(malformed) > 10:
+            print(f"... and {len(malformed) - 10} more malformed lines")
+
+        # report counters and the indexes, kept up to date by every change
+        self.statistics = TaskStatistics(enumerate(self.task_list))
+        self.build_user_index()
+        self.build_due_index()
+        # the full-text index is only built once something is searched for
+        self.search_index = None
+
+        self.tasks_stamp = file_stamp(self.tasks_file)
+        self.version = 0
+        self.journal_offset = 0
+        self.journal_length = 0
+        # applies any changes made since tasks.txt was last written
+        self.replay_journal()
+        self.loaded = True
+        self.loaded_at = datetime.now()
+        self.changes += 1
+
+    def ensure_loaded(self):
+        """
+        The method `ensure_loaded` loads the tasks the first time they are
+        needed, compacting a long journal left behind by earlier sessions.
+        """
+        if self.loaded:
+            return
+        with file_lock(self.lock_file):
+            self.load()
+            if self.journal_length >= JOURNAL_COMPACT_THRESHOLD:
+                self.compact_journal()
+
+    @timed("storage.catch_up")
+    def catch_up(self):
+        """
+        The method `catch_up` applies the changes other sessions have made
+        since this session last read the files. It must be called while
+        holding the lock.
+        """
+        if not self.loaded:
+            self.load()
+        # A new tasks.txt or journal version means another session compacted
+        # the journal, so start again from the new snapshot
+        if file_stamp(self.tasks_file) != self.tasks_stamp:
+            self.load()
+        elif not self.replay_journal():
+            self.load()
+
+    def refresh(self):
+        """
+        The method `refresh` picks up changes made by other sessions. While
+        neither file has changed this costs two `os.stat` calls and no lock.
+        Nothing needs refreshing until the tasks have been loaded.
+        """
+        if not self.loaded:
+            return
+        if (
+            file_stamp(self.journal_file) == self.journal_stamp
+            and file_stamp(self.tasks_file) == self.tasks_stamp
+        ):
+            return
+        with file_lock(self.lock_file, exclusive=False):
+            self.catch_up()
+
+    # =====Indexes===========
+
+    def build_user_index(self):
+        """
+        The method `build_user_index` maps every username to the ids of the
+        tasks assigned to them, so a user's tasks can be found without
+        looking at everybody else's. The ids are kept as the keys of a
+        dictionary, which works as an ordered set with O(1) removal.
+        """
+        self.user_index = {}
+        for task_id, task in enumerate(self.task_list):
+            self.user_index.setdefault(task.username, {})[task_id] = None
+
+    def build_due_index(self):
+        """
+        The method `build_due_index` groups the task ids by due date, with
+        the due dates themselves kept in a sorted list so a range of dates
+        can be found with a binary search.
+        """
+        self.due_index = {}
+        for task_id, task in enumerate(self.task_list):
+            self.due_index.setdefault(task.due_date, {})[task_id] = None
+        self.due_dates = sorted(self.due_index)
+
+    def index_due_date(self, task_id, due_date):
+        task_ids = self.due_index.get(due_date)
+        if task_ids is None:
+            task_ids = self.due_index[due_date] = {}
+            bisect.insort(self.due_dates, due_date)
+        task_ids[task_id] = None
+
+    def unindex_due_date(self, task_id, due_date):
+        task_ids = self.due_index[due_date]
+        del task_ids[task_id]
+        if not task_ids:
+            del self.due_index[due_date]
+            del self.due_dates[bisect.bisect_left(self.due_dates, due_date)]
+
+    # =====Reading tasks===========
+
+    def all_tasks(self):
+        self.ensure_loaded()
+        return enumerate(self.task_list)
+
+    def find_tasks(
+        self, username=None, status=None, due_from=None, due_to=None, current_date=None
+    ):
+        self.ensure_loaded()
+        # Start from the narrowest index available and check the rest of the
+        # filters on each task as it comes up
+        if username is not None:
+            task_ids = sorted(self.user_index.get(username, ()))
+        elif due_from is not None or due_to is not None or status == "overdue":
+            task_ids = self.due_date_range(due_from, due_to, status, current_date)
+        else:
+            task_ids = range(len(self.task_list))
+
+        filters = (username, status, due_from, due_to, current_date)
+        task_list = self.task_list
+        scanned = 0
+        try:
+            for task_id in task_ids:
+                scanned += 1
+                task = task_list[task_id]
+                if task_matches(task, *filters):
+                    yield task_id, task
+        finally:
+            # Counted once the caller has finished with the results
+            count("find_tasks.tasks_scanned", scanned)
+
+    def due_date_range(self, due_from, due_to, status, current_date):
+        """
+        The method `due_date_range` yields the ids of the tasks due between
+        `due_from` and `due_to` (inclusive) in due date order. Overdue tasks
+        are all due before `overdue_cutoff`, so that limits the range too.
+        """
+        due_dates = self.due_dates
+        start = 0 if due_from is None else bisect.bisect_left(due_dates, due_from)
+        if due_to is None:
+            end = len(due_dates)
+        else:
+            end = bisect.bisect_right(due_dates, due_to)
+        if status == "overdue":
+            end = min(
+                end, bisect.bisect_left(due_dates, overdue_cutoff(current_date))
+            )
+        for due_date in due_dates[start:end]:
+            yield from list(self.due_index[due_date])
+
+    @timed("storage.search_tasks")
+    def search_tasks(
+        self,
+        query,
+        username=None,
+        status=None,
+        due_from=None,
+        due_to=None,
+        current_date=None,
+    ):
+        self.ensure_loaded()
+        if self.search_index is None:
+            self.search_index = SearchIndex(enumerate(self.task_list))
+
+        filters = (username, status, due_from, due_to, current_date)
+        results = []
+        for _, task_id in self.search_index.search(query):
+            task = self.task_list[task_id]
+            if task_matches(task, *filters):
+                results.append((task_id, task))
+        return results
+
+    def user_tasks(self, username):
+        self.ensure_loaded()
+        task_ids = sorted(self.user_index.get(username, ()))
+        return [(task_id, self.task_list[task_id]) for task_id in task_ids]
+
+    def get_task(self, task_id):
+        self.ensure_loaded()
+        if 0 <= task_id < len(self.task_list):
+            return self.task_list[task_id]
+        return None
+
+    def task_summary(self, current_date):
+        self.ensure_loaded()
+        return self.statistics.summary(current_date)
+
+    def task_totals(self, current_date):
+        if (
+            not self.loaded
+            and self.SNAPSHOT_FORMAT == "text"
+            and (file_stamp(self.tasks_file) or (0, 0))[1]
+            >= COUNT_WITHOUT_LOADING_SIZE
+        ):
+            # Counting the lines of tasks.txt is much cheaper than loading
+            # every task, which the caller may never need. task_parallel
+            # builds on this module, so it is imported on first use.
+            from task_parallel import parallel_task_summary
+
+            totals = parallel_task_summary(self, current_date, workers=1)
+            del totals["users"]
+            return totals
+        self.ensure_loaded()
+        return self.statistics.totals(current_date)
+
+    def tasks_loaded(self):
+        return self.loaded
+
+    def data_version(self):
+        self.ensure_loaded()
+        return self.changes
+
+    def storage_stats(self, current_date):
+        """
+        Everything comes from what is already held in memory: the counters
+        kept up to date by `TaskStatistics` and the file sizes seen when the
+        files were last read or written, so nothing is read from disk once
+        the tasks have been loaded.
+        """
+        stats = self.task_totals(current_date)
+        if self.loaded:
+            stats["files"] = {
+                self.tasks_file: self.tasks_stamp[1] if self.tasks_stamp else 0,
+                self.journal_file: self.journal_offset,
+            }
+        else:
+            stats["files"] = {
+                file_name: (file_stamp(file_name) or (0, 0))[1]
+                for file_name in (self.tasks_file, self.journal_file)
+            }
+        stats["files"][self.users_file] = self.users_file_size
+        stats["tasks_loaded_at"] = self.loaded_at
+        stats["users_loaded_at"] = self.users_loaded_at
+        return stats
+
+    def task_count(self):
+        """
+        Before the tasks have been loaded they are counted straight from the
+        files, see `count_tasks_file`, and every add record in the journal
+        counts once.
+        """
+        if self.loaded:
+            return len(self.task_list)
+        with file_lock(self.lock_file, exclusive=False):
+            task_count = self.count_tasks_file()
+            try:
+                journal_file = open(self.journal_file, "rb")
+            except FileNotFoundError:
+                return task_count
+            with journal_file:
+                for line in journal_file:
+                    if not line.startswith(b"add;") or not line.endswith(b"\n"):
+                        continue
+                    fields = line.split(b";")
+                    if len(fields) == 7:
+                        # Journals written before task ids were recorded
+                        task_count += 1
+                    elif fields[1].isdigit() and int(fields[1]) == task_count:
+                        # Records already in tasks.txt are skipped
+                        task_count += 1
+        return task_count
+
+    # =====Changing tasks===========
+    # Each change takes the lock, catches up with other sessions, applies the
+    # change in memory and then records it in the journal.
+
+    def add_task(self, task):
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.start_history()
+            task_id = len(self.task_list)
+            self.apply_add(task_id, task)
+            self.append_journal("add", task_id, task_to_str(task))
+            self.record_history([("created", task_id, task)])
+        return task_id
+
+    def add_tasks(self, tasks):
+        # The tasks are gone through twice, so a generator must be kept
+        tasks = list(tasks)
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.start_history()
+            records = []
+            for task in tasks:
+                task_id = len(self.task_list)
+                self.apply_add(task_id, task)
+                records.append(("add", task_id, task_to_str(task)))
+            self.append_journal_records(records)
+            self.record_history(
+                [
+                    ("created", record[1], task)
+                    for record, task in zip(records, tasks)
+                ]
+            )
+        return [record[1] for record in records]
+
+    def reassign_tasks(self, task_ids, username, expected=None):
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.start_history()
+            records = []
+            for task_id in task_ids:
+                task = self.get_task(task_id)
+                if task is None or task.completed or task.username == username:
+                    continue
+                if expected is not None and not same_task(task, expected.get(task_id)):
+                    continue
+                self.apply_reassign(task_id, username)
+                records.append(("reassign", task_id, username))
+            self.append_journal_records(records)
+            self.record_history(
+                [("reassigned", record[1], username) for record in records]
+            )
+        return [record[1] for record in records]
+
+    def complete_tasks(self, task_ids, expected=None):
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.start_history()
+            records = []
+            for task_id in task_ids:
+                task = self.get_task(task_id)
+                if task is None or task.completed:
+                    continue
+                if expected is not None and not same_task(task, expected.get(task_id)):
+                    continue
+                self.apply_complete(task_id)
+                records.append(("complete", task_id))
+            self.append_journal_records(records)
+            self.record_history(
+                [
+                    ("completed", record[1], self.task_list[record[1]])
+                    for record in records
+                ]
+            )
+        return [record[1] for record in records]
+
+    def editable_task(self, task_id, expected=None):
+        """
+        :return: the task with the given id.
+        :raises TaskConflictError: if another session completed the task, or
+        archived tasks so that the id now belongs to another task.
+        """
+        task = self.get_task(task_id)
+        if task is None or (expected is not None and not same_task(task, expected)):
+            raise TaskConflictError(
+                "This task has been changed by another session, "
+                + "please view your tasks again"
+            )
+        if task.completed:
+            raise TaskConflictError(
+                "This task has been marked as complete by another session"
+            )
+        return task
+
+    def edit_task(
+        self, task_id, username=None, due_date=None, complete=False, expected=None
+    ):
+        with file_lock(self.lock_file):
+            self.catch_up()
+            task = self.editable_task(task_id, expected)
+            self.start_history()
+            # Every change goes into the journal with a single write
+            records = []
+            history = []
+            if due_date is not None:
+                history.append(("due_date", task_id, (due_date, task.due_date)))
+                self.apply_due_date(task_id, due_date)
+                records.append(
+                    ("due_date", task_id, due_date.strftime(DATETIME_STRING_FORMAT))
+                )
+            if username is not None:
+                self.apply_reassign(task_id, username)
+                records.append(("reassign", task_id, username))
+                history.append(("reassigned", task_id, username))
+            if complete:
+                self.apply_complete(task_id)
+                records.append(("complete", task_id))
+                history.append(("completed", task_id, self.task_list[task_id]))
+            self.append_journal_records(records)
+            self.record_history(history)
+
+    def apply_add(self, task_id, task):
+        self.changes += 1
+        self.task_list.append(task)
+        self.statistics.add(task_id, task)
+        self.user_index.setdefault(task.username, {})[task_id] = None
+        self.index_due_date(task_id, task.due_date)
+        if self.search_index is not None:
+            self.search_index.add(task_id, task)
+
+    def apply_reassign(self, task_id, username):
+        self.changes += 1
+        old_username = self.task_list[task_id].username
+        del self.user_index[old_username][task_id]
+        self.user_index.setdefault(username, {})[task_id] = None
+        self.task_list[task_id].username = username
+        self.statistics.reassign(task_id, username)
+
+    def apply_due_date(self, task_id, due_date):
+        self.changes += 1
+        self.unindex_due_date(task_id, self.task_list[task_id].due_date)
+        self.index_due_date(task_id, due_date)
+        self.task_list[task_id].due_date = due_date
+        self.statistics.set_due_date(task_id, due_date)
+
+    def apply_complete(self, task_id):
+        self.changes += 1
+        self.task_list[task_id].completed = True
+        self.statistics.complete(task_id)
+
+    @timed("storage.archive_tasks")
+    def archive_tasks(self, completed_before):
+        """
+        The tasks after each archived one move down to fill the gap, as task
+        ids are positions in `task_list`. The new snapshot starts a new
+        journal version, so other sessions load the new numbering rather
+        than applying their records to the old one. The journal is written
+        into a snapshot before anything is archived, so a crash while the
+        renumbered snapshot is written can't leave records for the old
+        numbering behind.
+        """
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.start_history()
+            archive = self.task_archive()
+            with archive.lock():
+                unfinished = archive.unfinished_run(self.archiving_file, self.version)
+                if unfinished is not None:
+                    run, archived = unfinished
+                else:
+                    tasks = self.archivable_tasks(completed_before)
+                    if not tasks:
+                        return 0
+                    if self.journal_length:
+                        self.write_task_snapshot()
+                    archived = [task_id for task_id, _ in tasks]
+                    run = archive.start_run(self.archiving_file, self.version, archived)
+                    archive.append([task for _, task in tasks], run)
+            self.record_history([("removed", archived, run)])
+            archived_ids = set(archived)
+            self.set_task_list(
+                task
+                for task_id, task in enumerate(self.task_list)
+                if task_id not in archived_ids
+            )
+            self.write_task_snapshot()
+            archive.end_run(self.archiving_file)
+        return len(archived)
+
+    def replace_all(self, username_password, tasks):
+        with file_lock(self.users_lock_file):
+            self.write_users(username_password)
+        with file_lock(self.lock_file):
+            self.catch_up()
+            self.set_task_list(tasks)
+            self.write_task_snapshot()
+
+    def set_task_list(self, tasks):
+        """Replaces the tasks held in memory and builds the indexes again."""
+        self.changes += 1
+        self.task_list = list(tasks)
+        self.statistics = TaskStatistics(enumerate(self.task_list))
+        self.build_user_index()
+        self.build_due_index()
+        self.search_index = None
+
+    # =====Task journal===========
+
+    @timed("storage.write_task_snapshot")
+    def write_task_snapshot(self):
+        """
+        The method `write_task_snapshot` writes the whole task list to
+        tasks.txt and starts a new, empty journal with the next version
+        number. Both files are replaced atomically, and it must be called
+        while holding the lock.
+        """
+        atomic_write(self.tasks_file, self.tasks_file_contents())
+
+        # Only once the snapshot is safely in place can the journal be emptied
+        self.version += 1
+        header = f"version;{self.version}\n"
+        atomic_write(self.journal_file, header)
+        self.tasks_stamp = file_stamp(self.tasks_file)
+        self.journal_stamp = file_stamp(self.journal_file)
+        self.journal_offset = len(header.encode("utf-8"))
+        self.journal_length = 0
+
+    def compact_journal(self):
+        """
+        The method `compact_journal` writes the journal into a new snapshot,
+        unless an archiving run was cut off at the current version. That run
+        is only recognised while the version stays the same, so the journal
+        keeps growing until the next `archive_tasks` finishes it. It must be
+        called while holding the lock.
+        """
+        if self.task_archive().pending_run(self.archiving_file, self.version):
+            return
+        self.write_task_snapshot()
+
+    def append_journal(self, *fields):
+        """
+        The method `append_journal` appends one record to the task journal,
+        see `append_journal_records`.
+
+        :param fields: the components of the record, e.g. ("complete", 3).
+        """
+        self.append_journal_records([fields])
+
+    def append_journal_records(self, records):
+        """
+        The method `append_journal_records` appends records to the task
+        journal with a single write and forces them to disk. Once enough
+        records have been collected the journal is compacted into a new
+        tasks.txt snapshot. It must be called while holding the lock.
+
+        :param records: a list of record components, e.g. [("complete", 3)].
+        """
+        if not records:
+            return
+        data = "".join(
+            ";".join(str(f) for f in fields) + "\n" for fields in records
+        ).encode("utf-8")
+        with open(self.journal_file, "ab") as journal_file:
+            journal_file.write(data)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        count("journal.records_written", len(records))
+        count("files.bytes_written", len(data))
+        self.journal_offset += len(data)
+        self.journal_stamp = file_stamp(self.journal_file)
+        self.journal_length += len(records)
+
+        if self.journal_length >= JOURNAL_COMPACT_THRESHOLD:
+            self.compact_journal()
+
+    def replay_journal(self):
+        """
+        The method `replay_journal` applies the journal records that this
+        session has not seen yet.
+
+        :return: `False` if the journal has been started again with a
+        different version since it was last read, in which case nothing is
+        applied and the caller has to load everything again.
+        """
+        self.journal_stamp = file_stamp(self.journal_file)
+        if self.journal_stamp is None:
+            return True
+
+        # The journal can only shrink when it is started again
+        if self.journal_stamp[1] < self.journal_offset:
+            return False
+
+        with open(self.journal_file, "rb") as journal_file:
+            first_line = journal_file.readline()
+            version = 0
+            header_length = 0
+            if first_line.startswith(b"version;") and first_line.endswith(b"\n"):
+                version = int(first_line[len(b"version;"):])
+                header_length = len(first_line)
+
+            if self.journal_offset == 0:
+                self.version = version
+                self.journal_offset = header_length
+            elif version != self.version:
+                return False
+            journal_file.seek(self.journal_offset)
+
+            for raw_line in journal_file:
+                # A record without a line ending was cut off mid write, it
+                # will be read again once it is complete
+                if not raw_line.endswith(b"\n"):
+                    break
+                self.journal_offset += len(raw_line)
+                self.journal_length += 1
+                count("journal.records_replayed")
+                line = raw_line.decode("utf-8").rstrip("\n")
+                try:
+                    self.apply_record(line)
+                except (ValueError, IndexError, KeyError):
+                    # Counted rather than printed, as the server and the
+                    # reports share this output
+                    count("journal.invalid_records")
+
+        return True
+
+    def apply_record(self, line):
+        """
+        The method `apply_record` applies one journal record. Records always
+        set a value rather than change it, so applying one that tasks.txt
+        already includes changes nothing.
+        """
+        action, _, data = line.partition(";")
+        task_id, _, value = data.partition(";")
+        if action == "add":
+            if value.count(";") != 5:
+                # Journals written before task ids were recorded
+                task_id, value = len(self.task_list), data
+            task_id = int(task_id)
+            if task_id < len(self.task_list):
+                return  # already in the snapshot
+            if task_id > len(self.task_list):
+                raise IndexError(task_id)
+            self.apply_add(task_id, parse_task(value))
+            return
+
+        task_id = int(task_id)
+        task = self.task_list[task_id]
+        if action == "reassign":
+            self.apply_reassign(task_id, value)
+        elif action == "due_date":
+            due_date = parse_date(value)
+            if due_date != task.due_date:
+                self.apply_due_date(task_id, due_date)
+        elif action == "complete":
+            if not task.completed:
+                self.apply_complete(task_id)
+
+    # =====Snapshot format===========
+    # Subclasses can store the snapshot in another format by overriding
+    # these three methods.
+
+    def read_tasks_file(self):
+        """
+        :return: a tuple of (task list, malformed lines), see
+        `load_task_file`.
+        """
+        return load_task_file(self.tasks_file)
+
+    def count_tasks_file(self):
+        """
+        :return: the number of tasks in the snapshot. A line of tasks.txt
+        counts if it has all six fields, without parsing its dates.
+        """
+        task_count = 0
+        with open(self.tasks_file, "rb") as task_file:
+            for line in task_file:
+                if line.count(b";") >= 5:
+                    task_count += 1
+        return task_count
+
+    def tasks_file_contents(self):
+        """:return: the text of a snapshot of every task."""
+        return "\n".join(task_to_str(t) for t in self.task_list)
+
+
+class BinaryFileStorage(FlatFileStorage):
+    """
+    The class `BinaryFileStorage` is a `FlatFileStorage` that keeps its
+    snapshot of the tasks in the binary format of task_snapshot.py instead of
+    tasks.txt. The snapshot is memory mapped rather than parsed, so loading
+    is much quicker, and task titles and descriptions are only decoded when
+    they are shown. Users are still kept in user.txt and changes still go to
+    a (separate) text journal.
+    """
+
+    SNAPSHOT_FORMAT = "binary"
+
+    def __init__(
+        self,
+        tasks_file=BINARY_TASKS_FILE,
+        users_file=USERS_FILE,
+        journal_file=BINARY_JOURNAL_FILE,
+    ):
+        super().__init__(tasks_file, users_file, journal_file)
+
+    def read_tasks_file(self):
+        # A snapshot is written in one go, so it has no malformed lines
+        return read_snapshot(self.tasks_file), []
+
+    def count_tasks_file(self):
+        return snapshot_task_count(self.tasks_file)
+
+    def tasks_file_contents(self):
+        return snapshot_bytes(self.task_list)
+
+
+class SQLiteStorage(TaskStorage):
+    """
+    The class `SQLiteStorage` keeps users and tasks in a SQLite database.
+    Tasks are indexed on username, due date and completion state so that a
+    user's tasks and the overdue counts are index lookups rather than scans
+    over every task.
+    """
+
+    # Task ids are row ids, which count from 1
+    FIRST_TASK_ID = 1
+
+    def __init__(self, database_file=DATABASE_FILE):
+        self.database_file = database_file
+        # Marks an archiving run, see `archive_tasks`
+        self.archiving_file = database_file + ".archiving"
+        self.data_file = database_file
+        self.connection = sqlite3.connect(database_file)
+        self.opened_at = datetime.now()
+        self.users_loaded_at = None
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                password TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                due_date TEXT NOT NULL,
+                assigned_date TEXT NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_username
+                ON tasks (username);
+            CREATE INDEX IF NOT EXISTS idx_tasks_due_date
+                ON tasks (due_date);
+            CREATE INDEX IF NOT EXISTS idx_tasks_completed
+                ON tasks (completed, due_date);
+            """
+        )
+        self.create_search_table()
+        # Same default account as a fresh user.txt
+        if self.connection.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO users (username, password) VALUES (?, ?)",
+                    DEFAULT_USERS.items(),
+                )
+
+    def create_search_table(self):
+        """
+        The method `create_search_table` creates an FTS5 full-text index of
+        the task titles and descriptions, kept up to date by triggers. SQLite
+        can be built without FTS5, in which case searches fall back to
+        `TaskStorage.search_tasks`.
+        """
+        existing = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'tasks_search'"
+        ).fetchone()
+        try:
+            self.connection.executescript(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS tasks_search USING fts5 (
+                    title, description, content='tasks', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS tasks_search_insert
+                AFTER INSERT ON tasks BEGIN
+                    INSERT INTO tasks_search (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS tasks_search_delete
+                AFTER DELETE ON tasks BEGIN
+                    INSERT INTO tasks_search (tasks_search, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS tasks_search_update
+                AFTER UPDATE OF title, description ON tasks BEGIN
+                    INSERT INTO tasks_search (tasks_search, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO tasks_search (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                """
+            )
+        except sqlite3.OperationalError:
+            self.full_text_search = False
+            return
+        self.full_text_search = True
+        if existing is None:
+            # Index the tasks of a database created before the search table
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO tasks_search (tasks_search) VALUES ('rebuild')"
+                )
+
+    @staticmethod
+    def row_to_task(row):
+        """Converts a row of the tasks table into a (task id, task) tuple."""
+        task = Task(
+            row[1],
+            row[2],
+            row[3],
+            parse_date(row[4]),
+            parse_date(row[5]),
+            bool(row[6]),
+        )
+        return row[0], task
+
+    @staticmethod
+    def task_to_row(task):
+        return (
+            task.username,
+            task.title,
+            task.description,
+            task.due_date.strftime(DATETIME_STRING_FORMAT),
+            task.assigned_date.strftime(DATETIME_STRING_FORMAT),
+            1 if task.completed else 0,
+        )
+
+    def load_users(self):
+        self.users_loaded_at = datetime.now()
+        rows = self.connection.execute(
+            "SELECT username, password FROM users ORDER BY rowid"
+        )
+        return dict(rows)
+
+    def add_user(self, username, password):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO users (username, password) VALUES (?, ?) "
+                + "ON CONFLICT (username) DO UPDATE SET password = excluded.password",
+                (username, password),
+            )
+        return self.load_users()
+
+    def add_users(self, username_password):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO users (username, password) VALUES (?, ?) "
+                + "ON CONFLICT (username) DO UPDATE SET password = excluded.password",
+                username_password.items(),
+            )
+
+    def all_tasks(self):
+        rows = self.connection.execute("SELECT * FROM tasks ORDER BY id")
+        return (self.row_to_task(row) for row in rows)
+
+    def user_tasks(self, username):
+        rows = self.connection.execute(
+            "SELECT * FROM tasks WHERE username = ? ORDER BY id", (username,)
+        )
+        return [self.row_to_task(row) for row in rows]
+
+    def get_task(self, task_id):
+        row = self.connection.execute(
+            "SELECT * FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.row_to_task(row)[1]
+
+    @timed("storage.find_tasks")
+    def find_tasks(
+        self, username=None, status=None, due_from=None, due_to=None, current_date=None
+    ):
+        conditions, parameters = self.filter_conditions(
+            username, status, due_from, due_to, current_date
+        )
+        query = "SELECT * FROM tasks"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self.connection.execute(query + " ORDER BY id", parameters)
+        return (self.row_to_task(row) for row in rows)
+
+    @timed("storage.search_tasks")
+    def search_tasks(
+        self,
+        query,
+        username=None,
+        status=None,
+        due_from=None,
+        due_to=None,
+        current_date=None,
+    ):
+        filters = (username, status, due_from, due_to, current_date)
+        if not self.full_text_search:
+            return super().search_tasks(query, *filters)
+
+        terms = parse_query(query)
+        if not terms:
+            return []
+        conditions, parameters = self.filter_conditions(*filters)
+        # Every term has to match, words ending in * are prefixes. Words only
+        # contain letters, digits and underscores so quoting them is safe.
+        match = " ".join(
+            f'"{word}"' + ("*" if is_prefix else "") for word, is_prefix in terms
+        )
+        rows = self.connection.execute(
+            "SELECT tasks.* FROM tasks_search "
+            + "JOIN tasks ON tasks.id = tasks_search.rowid "
+            + "WHERE tasks_search MATCH ?"
+            + "".join(" AND " + condition for condition in conditions)
+            # bm25 ranks better matches lower, words in the title count double
+            + " ORDER BY bm25(tasks_search, 2.0, 1.0), tasks.id",
+            [match] + parameters,
+        )
+        return [self.row_to_task(row) for row in rows]
+
+    def filter_conditions(self, username, status, due_from, due_to, current_date):
+        """
+        :return: a tuple of (SQL conditions, parameters) for the filters of
+        `find_tasks`.
+        """
+        # Every filter becomes a condition that one of the indexes can answer
+        conditions = []
+        parameters = []
+        if username is not None:
+            conditions.append("username = ?")
+            parameters.append(username)
+        if status == "complete":
+            conditions.append("completed = 1")
+        elif status == "incomplete":
+            conditions.append("completed = 0")
+        elif status == "overdue":
+            conditions.append("completed = 0 AND due_date < ?")
+            cutoff = overdue_cutoff(current_date)
+            parameters.append(cutoff.strftime(DATETIME_STRING_FORMAT))
+        if due_from is not None:
+            conditions.append("due_date >= ?")
+            parameters.append(due_from.strftime(DATETIME_STRING_FORMAT))
+        if due_to is not None:
+            conditions.append("due_date <= ?")
+            parameters.append(due_to.strftime(DATETIME_STRING_FORMAT))
+        return conditions, parameters
+
+    def add_task(self, task):
+        self.start_history()
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO tasks (username, title, description, due_date, "
+                + "assigned_date, completed) VALUES (?, ?, ?, ?, ?, ?)",
+                self.task_to_row(task),
+            )
+        self.record_history([("created", cursor.lastrowid, task)])
+        return cursor.lastrowid
+
+    def add_tasks(self, tasks):
+        tasks = list(tasks)
+        self.start_history()
+        task_ids = []
+        with self.connection:
+            for task in tasks:
+                cursor = self.connection.execute(
+                    "INSERT INTO tasks (username, title, description, due_date, "
+                    + "assigned_date, completed) VALUES (?, ?, ?, ?, ?, ?)",
+                    self.task_to_row(task),
+                )
+                task_ids.append(cursor.lastrowid)
+        self.record_history(
+            [("created", task_id, task) for task_id, task in zip(task_ids, tasks)]
+        )
+        return task_ids
+
+    # Matches only the task the caller read, see `same_task`
+    SAME_TASK_CONDITION = (
+        " AND username = :expected_username AND title = :expected_title"
+        + " AND description = :expected_description"
+        + " AND assigned_date = :expected_assigned_date"
+    )
+
+    @staticmethod
+    def same_task_parameters(expected):
+        return {
+            "expected_username": expected.username,
+            "expected_title": expected.title,
+            "expected_description": expected.description,
+            "expected_assigned_date": expected.assigned_date.strftime(
+                DATETIME_STRING_FORMAT
+            ),
+        }
+
+    def update_tasks(self, task_ids, query, expected=None, **parameters):
+        """
+        The method `update_tasks` runs an UPDATE statement once per task in a
+        single transaction.
+
+        :param query: the statement, selecting the task with ":id".
+        :param expected: a dictionary of task id -> `Task` as the caller read
+        it, tasks that are no longer the same are left alone.
+        :param parameters: values for the other named parameters.
+        :return: the list of the ids of the tasks that were changed.
+        """
+        if expected is not None:
+            query += self.SAME_TASK_CONDITION
+        self.start_history()
+        changed = []
+        with self.connection:
+            for task_id in task_ids:
+                parameters["id"] = task_id
+                if expected is not None:
+                    if task_id not in expected:
+                        continue
+                    parameters.update(self.same_task_parameters(expected[task_id]))
+                if self.connection.execute(query, parameters).rowcount:
+                    changed.append(task_id)
+        return changed
+
+    def reassign_tasks(self, task_ids, username, expected=None):
+        changed = self.update_tasks(
+            task_ids,
+            "UPDATE tasks SET username = :username "
+            + "WHERE id = :id AND completed = 0 AND username != :username",
+            expected,
+            username=username,
+        )
+        self.record_history([("reassigned", task_id, username) for task_id in changed])
+        return changed
+
+    def complete_tasks(self, task_ids, expected=None):
+        changed = self.update_tasks(
+            task_ids,
+            "UPDATE tasks SET completed = 1 WHERE id = :id AND completed = 0",
+            expected,
+        )
+        self.record_history(
+            [("completed", task_id, self.get_task(task_id)) for task_id in changed]
+        )
+        return changed
+
+    def edit_task(
+        self, task_id, username=None, due_date=None, complete=False, expected=None
+    ):
+        # One UPDATE makes every change. Completed tasks are left alone, as
+        # another session may have completed the task since it was shown.
+        assignments = []
+        parameters = {"id": task_id}
+        history = []
+        if due_date is not None:
+            assignments.append("due_date = :due_date")
+            parameters["due_date"] = due_date.strftime(DATETIME_STRING_FORMAT)
+        if username is not None:
+            assignments.append("username = :username")
+            parameters["username"] = username
+            history.append(("reassigned", task_id, username))
+        if complete:
+            assignments.append("completed = 1")
+        if not assignments:
+            return
+        query = (
+            f"UPDATE tasks SET {', '.join(assignments)} "
+            + "WHERE id = :id AND completed = 0"
+        )
+        if expected is not None:
+            query += self.SAME_TASK_CONDITION
+            parameters.update(self.same_task_parameters(expected))
+        self.start_history()
+        with self.connection:
+            # The write lock is taken first, so the due date read for the
+            # history is still the task's when the UPDATE changes it
+            self.connection.execute("BEGIN IMMEDIATE")
+            old_due_date = self.connection.execute(
+                "SELECT due_date FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone()
+            cursor = self.connection.execute(query, parameters)
+        if cursor.rowcount == 0:
+            task = self.get_task(task_id)
+            if task is None or (expected is not None and not same_task(task, expected)):
+                raise TaskConflictError(
+                    "This task has been changed by another session, "
+                    + "please view your tasks again"
+                )
+            raise TaskConflictError(
+                "This task has been marked as complete by another session"
+            )
+        if due_date is not None:
+            history.insert(
+                0, ("due_date", task_id, (due_date, parse_date(old_due_date[0])))
+            )
+        if complete:
+            history.append(("completed", task_id, self.get_task(task_id)))
+        self.record_history(history)
+
+    @timed("storage.archive_tasks")
+    def archive_tasks(self, completed_before):
+        # Task ids are row ids here, so the other tasks keep theirs. The
+        # database's user_version counts the archiving runs, it changes in
+        # the same transaction that deletes a run's tasks.
+        self.start_history()
+        archive = self.task_archive()
+        with archive.lock():
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            unfinished = archive.unfinished_run(self.archiving_file, version)
+            if unfinished is not None:
+                _, archived = unfinished
+            else:
+                tasks = self.archivable_tasks(completed_before)
+                if not tasks:
+                    return 0
+                archived = [task_id for task_id, _ in tasks]
+                run = archive.start_run(self.archiving_file, version, archived)
+                archive.append([task for _, task in tasks], run)
+            with self.connection:
+                self.connection.executemany(
+                    "DELETE FROM tasks WHERE id = ? AND completed = 1",
+                    [(task_id,) for task_id in archived],
+                )
+                self.connection.execute(f"PRAGMA user_version = {version + 1}")
+            archive.end_run(self.archiving_file)
+        return len(archived)
+
+    def task_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def storage_stats(self, current_date):
+        stats = self.task_totals(current_date)
+        page_count = self.connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        stats["files"] = {self.database_file: page_count * page_size}
+        # Tasks are read from the database as they are needed
+        stats["tasks_loaded_at"] = self.opened_at
+        stats["users_loaded_at"] = self.users_loaded_at
+        return stats
+
+    def data_version(self):
+        # data_version only changes for commits made by other connections,
+        # total_changes counts the rows changed through this one
+        other_changes = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        return other_changes, self.connection.total_changes
+
+    @timed("storage.task_summary")
+    def task_summary(self, current_date):
+        cutoff = overdue_cutoff(current_date).strftime(DATETIME_STRING_FORMAT)
+        rows = self.connection.execute(
+            """
+            SELECT username, COUNT(*), SUM(completed),
+                   SUM(completed = 0 AND due_date < ?)
+            FROM tasks
+            GROUP BY username
+            ORDER BY MIN(id)
+            """,
+            (cutoff,),
+        )
+        return summarise_user_counts(rows)
+
+    def replace_all(self, username_password, tasks):
+        with self.connection:
+            self.connection.execute("DELETE FROM users")
+            self.connection.execute("DELETE FROM tasks")
+            self.connection.executemany(
+                "INSERT INTO users (username, password) VALUES (?, ?)",
+                username_password.items(),
+            )
+            self.connection.executemany(
+                "INSERT INTO tasks (id, username, title, description, due_date, "
+                + "assigned_date, completed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (task_id,) + self.task_to_row(task)
+                    for task_id, task in enumerate(tasks, start=self.FIRST_TASK_ID)
+                ),
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+STORAGE_BACKENDS = {
+    "flatfile": FlatFileStorage,
+    "binary": BinaryFileStorage,
+    "sqlite": SQLiteStorage,
+}
+
+
+def open_storage(backend=None):
+    """
+    The function `open_storage` creates the storage backend the task manager
+    should use.
+
+    :param backend: "flatfile", "binary" or "sqlite". Defaults to the TASK_STORAGE
+    environment variable, or "flatfile" if it is not set.
+    :return: a `TaskStorage` instance.
+    """
+    if backend is None:
+        backend = os.environ.get("TASK_STORAGE", "flatfile")
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(
+            f"Unknown storage backend '{backend}', "
+            + f"choose from: {', '.join(STORAGE_BACKENDS)}"
+        )
+    return STORAGE_BACKENDS[backend]()
+
+
+def migrate_storage(source_backend, target_backend):
+    """
+    The function `migrate_storage` copies every user and task from one storage
+    backend into another, replacing whatever the target held before.
+
+    :param source_backend: name of the backend to read from.
+    :param target_backend: name of the backend to write to.
+    :return: a tuple of (number of users, number of tasks) copied.
+    """
+    source = open_storage(source_backend)
+    target = open_storage(target_backend)
+    try:
+        username_password = source.load_users()
+        tasks = [task for _, task in source.all_tasks()]
+        target.replace_all(username_password, tasks)
+        # The target's history is about tasks that have just been replaced,
+        # while the archived tasks move along with the live ones
+        target.task_history().reset()
+        target.task_archive().replace(source.task_archive())
+    finally:
+        source.close()
+        target.close()
+
+    return len(username_password), len(tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy all users and tasks from one storage backend to another."
+    )
+    parser.add_argument("source", choices=STORAGE_BACKENDS)
+    parser.add_argument("target", choices=STORAGE_BACKENDS)
+    args = parser.parse_args()
+
+    user_count, task_count = migrate_storage(args.source, args.target)
+    print(
+        f"Migrated {user_count} users and {task_count} tasks "
+        + f"from {args.source} to {args.target}"
+    )
@@ -0,0 +1,364 @@
+# User registry and credentials for the task manager.
+#
+# All registered users are held in memory, keyed by a normalised form of the
+# username, so checking whether a user exists or logging in never has to read
+# user.txt and never depends on how the username was capitalised.
+#
+# Passwords are stored as salted scrypt hashes (PBKDF2 where hashlib has no
+# scrypt), which are deliberately slow to compute. To keep that cost to one
+# hash per login, recent successful checks are remembered and the server
+# hands out session tokens. Passwords stored in plain text by older versions
+# are hashed when their user next logs in, or all at once by running:
+#   python task_users.py
+
+# =====importing libraries===========
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+# Cost parameters for new hashes, can be raised over time as existing hashes
+# are upgraded when their user logs in. They can be set with environment
+# variables, e.g. TASK_SCRYPT_N=32768.
+PASSWORD_HASH = os.environ.get(
+    "TASK_PASSWORD_HASH", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2"
+)
+SCRYPT_N = int(os.environ.get("TASK_SCRYPT_N", 2**14))
+SCRYPT_R = int(os.environ.get("TASK_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("TASK_SCRYPT_P", 1))
+PBKDF2_ITERATIONS = int(os.environ.get("TASK_PBKDF2_ITERATIONS", 600000))
+SALT_SIZE = 16
+
+# Number of recent successful password checks `UserRegistry` remembers
+VERIFIED_CACHE_SIZE = 1024
+# Number of sessions `SessionCache` keeps and how long they last, in seconds
+SESSION_CACHE_SIZE = 10000
+SESSION_LIFETIME = 8 * 60 * 60
+
+# Key for remembering checked passwords without keeping them, new for every
+# run of the program
+VERIFIED_CACHE_KEY = secrets.token_bytes(32)
+
+
+# =====Password hashing===========
+
+
+def encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password):
+    """
+    The function `hash_password` hashes a password with a new random salt
+    and the current cost parameters.
+
+    :return: the text stored in place of the password, e.g.
+    "scrypt$16384$8$1$<salt>$<hash>". It never contains ";".
+    """
+    salt = secrets.token_bytes(SALT_SIZE)
+    if PASSWORD_HASH == "scrypt":
+        digest = hashlib.scrypt(
+            password.encode("utf-8"),
+            salt=salt,
+            n=SCRYPT_N,
+            r=SCRYPT_R,
+            p=SCRYPT_P,
+            maxmem=256 * SCRYPT_N * SCRYPT_R,
+        )
+        parameters = f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}"
+    else:
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS
+        )
+        parameters = f"pbkdf2_sha256${PBKDF2_ITERATIONS}"
+    return f"{parameters}${encode(salt)}${encode(digest)}"
+
+
+def is_hashed(stored_password):
+    return stored_password.startswith(("scrypt$", "pbkdf2_sha256$"))
+
+
+def verify_password(stored_password, password):
+    """
+    The function `verify_password` checks a password against what is
+    stored for the user, which may still be the plain password.
+
+    :return: `True` if the password matches.
+    """
+    if not is_hashed(stored_password):
+        return hmac.compare_digest(
+            stored_password.encode("utf-8"), password.encode("utf-8")
+        )
+    fields = stored_password.split("$")
+    try:
+        salt = base64.b64decode(fields[-2])
+        expected = base64.b64decode(fields[-1])
+        if fields[0] == "scrypt":
+            n, r, p = int(fields[1]), int(fields[2]), int(fields[3])
+            digest = hashlib.scrypt(
+                password.encode("utf-8"),
+                salt=salt,
+                n=n,
+                r=r,
+                p=p,
+                maxmem=256 * n * r,
+            )
+        else:
+            digest = hashlib.pbkdf2_hmac(
+                "sha256", password.encode("utf-8"), salt, int(fields[1])
+            )
+    except (ValueError, IndexError):
+        return False  # a damaged hash matches nothing
+    return hmac.compare_digest(digest, expected)
+
+
+def needs_rehash(stored_password):
+    """
+    :return: `True` if the stored password is in plain text or was hashed
+    with other settings than new passwords would be.
+    """
+    if not is_hashed(stored_password):
+        return True
+    if PASSWORD_HASH == "scrypt":
+        current = f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$"
+    else:
+        current = f"pbkdf2_sha256${PBKDF2_ITERATIONS}$"
+    return not stored_password.startswith(current)
+
+
+# =====Users===========
+
+
+def normalise_username(username):
+    """
+    The function `normalise_username` returns the form of a username used to
+    compare usernames, ignoring surrounding spaces and letter case.
+    """
+    return username.strip().casefold()
+
+
+class UserRegistry:
+    """
+    The class `UserRegistry` holds every registered user. Usernames keep the
+    spelling they were registered with, but are looked up case-insensitively
+    in O(1).
+    """
+
+    def __init__(self, username_password=None):
+        """
+        :param username_password: a dictionary of username -> password, as
+        returned by `TaskStorage.load_users`.
+        """
+        # normalised username -> (registered username, stored password)
+        self.users = {}
+        # normalised username -> (stored password, keyed digest of the
+        # password) for recent successful checks, oldest first
+        self.verified = OrderedDict()
+        for username, password in (username_password or {}).items():
+            self.add(username, password)
+
+    def __len__(self):
+        return len(self.users)
+
+    def exists(self, username):
+        """:return: `True` if `username` is registered in any letter case."""
+        return normalise_username(username) in self.users
+
+    def get_username(self, username):
+        """
+        :return: the username as it was registered, e.g. "Luke" for "luke",
+        or None if there is no such user.
+        """
+        user = self.users.get(normalise_username(username))
+        if user is None:
+            return None
+        return user[0]
+
+    def check_password(self, username, password):
+        """
+        The method `check_password` checks a user's password. Checking a
+        hashed password is slow on purpose, so a successful check is
+        remembered and the same password for the same stored hash is then
+        accepted straight away. Only a keyed digest of the password is kept.
+
+        :return: `True` if the user exists and the password matches.
+        """
+        if self.recently_verified(username, password):
+            return True
+        stored_password = self.get_password(username)
+        if stored_password is None or not verify_password(stored_password, password):
+            return False
+        self.remember_verified(username, stored_password, password)
+        return True
+
+    def recently_verified(self, username, password):
+        """
+        :return: `True` if the password was checked successfully against the
+        user's current stored password not long ago, so it needn't be hashed.
+        """
+        key = normalise_username(username)
+        user = self.users.get(key)
+        verified = self.verified.get(key)
+        if (
+            user is None
+            or verified is None
+            or verified[0] != user[1]
+            or not hmac.compare_digest(
+                verified[1],
+                hmac.digest(VERIFIED_CACHE_KEY, password.encode("utf-8"), "sha256"),
+            )
+        ):
+            return False
+        self.verified.move_to_end(key)
+        return True
+
+    def remember_verified(self, username, stored_password, password):
+        """
+        Remembers that `password` matched `stored_password`, the part of
+        `check_password` that comes after the slow check.
+        """
+        key = normalise_username(username)
+        self.verified[key] = (
+            stored_password,
+            hmac.digest(VERIFIED_CACHE_KEY, password.encode("utf-8"), "sha256"),
+        )
+        self.verified.move_to_end(key)
+        if len(self.verified) > VERIFIED_CACHE_SIZE:
+            self.verified.popitem(last=False)
+
+    def get_password(self, username):
+        """:return: the stored (normally hashed) password, or None."""
+        user = self.users.get(normalise_username(username))
+        if user is None:
+            return None
+        return user[1]
+
+    def add(self, username, password):
+        """Registers a user, or changes the password of an existing one."""
+        key = normalise_username(username)
+        existing = self.users.get(key)
+        if existing is not None:
+            username = existing[0]
+        self.users[key] = (username, password)
+
+    def usernames(self):
+        """:return: the registered usernames in the order they were added."""
+        return [username for username, _ in self.users.values()]
+
+
+def register_user(storage, users, username, password):
+    """
+    The function `register_user` stores a new user, or a new password for an
+    existing user, with the password hashed.
+
+    :param storage: the `TaskStorage` holding the users.
+    :param users: the `UserRegistry` to update.
+    """
+    store_password(storage, users, username, hash_password(password))
+
+
+def store_password(storage, users, username, stored_password):
+    """
+    The function `store_password` saves a password that has already been
+    hashed, for callers that hash it elsewhere, see `register_user`.
+    """
+    # storage hands back every user, including any registered by other
+    # sessions since this one started
+    for registered, password in storage.add_user(username, stored_password).items():
+        users.add(registered, password)
+
+
+def upgrade_password(storage, users, username, password):
+    """
+    The function `upgrade_password` hashes the password of a user who has
+    just logged in if it is stored in plain text or with old cost
+    parameters. It must only be called after the password was checked.
+    """
+    if needs_rehash(users.get_password(username)):
+        register_user(storage, users, users.get_username(username), password)
+
+
+class SessionCache:
+    """
+    The class `SessionCache` maps session tokens to usernames, so a user
+    who has logged in once can make further requests without their password
+    being checked again. It holds at most `max_sessions` sessions, dropping
+    the least recently used, and a session expires `lifetime` seconds after
+    it was last used.
+    """
+
+    def __init__(self, max_sessions=SESSION_CACHE_SIZE, lifetime=SESSION_LIFETIME):
+        self.max_sessions = max_sessions
+        self.lifetime = lifetime
+        # token -> (username, time it expires), least recently used first
+        self.sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def create(self, username):
+        """:return: a new session token for `username`."""
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = (username, time.monotonic() + self.lifetime)
+        if len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return token
+
+    def get(self, token):
+        """:return: the username of a live session, or None."""
+        session = self.sessions.get(token)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if session[1] < now:
+            del self.sessions[token]
+            return None
+        self.sessions[token] = (session[0], now + self.lifetime)
+        self.sessions.move_to_end(token)
+        return session[0]
+
+    def end(self, token):
+        self.sessions.pop(token, None)
+
+
+def migrate_passwords(storage):
+    """
+    The function `migrate_passwords` hashes every password still stored in
+    plain text, saving them all at once.
+
+    :return: the number of passwords hashed.
+    """
+    username_password = storage.load_users()
+    hashed = {
+        username: hash_password(password)
+        for username, password in username_password.items()
+        if not is_hashed(password)
+    }
+    if hashed:
+        storage.add_users(hashed)
+    return len(hashed)
+
+
+if __name__ == "__main__":
+    # task_storage is only needed when this file is run as a script
+    from task_storage import STORAGE_BACKENDS, open_storage
+
+    parser = argparse.ArgumentParser(
+        description="Hash every password still stored in plain text."
+    )
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_BACKENDS,
+        help="flatfile or sqlite, defaults to TASK_STORAGE",
+    )
+    args = parser.parse_args()
+
+    storage = open_storage(args.storage)
+    try:
+        print(f"Hashed {migrate_passwords(storage)} plain text passwords")
+    finally:
+        storage.close()
@@ -0,0 +1,69 @@
+# The task manager modules live in the repository root rather than in a
+# package, so the tests import them from there.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_storage import BinaryFileStorage, FlatFileStorage, SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture
+def open_flatfile(tmp_path):
+    """
+    :return: a function opening a new `FlatFileStorage` session on the same
+    files in `tmp_path`, the way separate task manager processes share them.
+    """
+
+    def open_session():
+        return FlatFileStorage(
+            tasks_file=str(tmp_path / "tasks.txt"),
+            users_file=str(tmp_path / "user.txt"),
+            journal_file=str(tmp_path / "tasks_journal.txt"),
+        )
+
+    return open_session
+
+
+@pytest.fixture
+def open_backend(tmp_path):
+    """
+    :return: a function opening a new session of the named storage backend,
+    "flatfile", "binary" or "sqlite", on files in `tmp_path`.
+    """
+
+    def open_session(backend):
+        if backend == "sqlite":
+            return SQLiteStorage(str(tmp_path / "tasks.db"))
+        if backend == "binary":
+            return BinaryFileStorage(
+                tasks_file=str(tmp_path / "tasks.bin"),
+                users_file=str(tmp_path / "user.txt"),
+                journal_file=str(tmp_path / "tasks_bin_journal.txt"),
+            )
+        return FlatFileStorage(
+            tasks_file=str(tmp_path / "tasks.txt"),
+            users_file=str(tmp_path / "user.txt"),
+            journal_file=str(tmp_path / "tasks_journal.txt"),
+        )
+
+    return open_session
+
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    """
+    Runs the task manager in an empty `tmp_path`, with the default flat file
+    storage opened afresh on first use.
+    """
+    import task_manager
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("TASK_STORAGE", raising=False)
+    monkeypatch.setattr(task_manager, "storage", None)
+    monkeypatch.setattr(task_manager, "users", None)
+    yield tmp_path
+    if task_manager.storage is not None:
+        task_manager.storage.close()
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import task_storage
+from task_storage import Task
+
+BACKENDS = ["flatfile", "binary", "sqlite"]
+
+
+def make_tasks():
+    """:return: tasks due on every day around 2024-01-28, some complete."""
+    tasks = []
+    for day in range(20, 32):
+        for username in "admin", "jason":
+            tasks.append(
+                Task(
+                    username,
+                    f"{username} task due {day}",
+                    "Description",
+                    datetime(2024, 1, day),
+                    datetime(2024, 1, 1),
+                    completed=day % 3 == 0,
+                )
+            )
+    return tasks
+
+
+def titles(tasks):
+    return sorted(task.title for _, task in tasks)
+
+
+@pytest.fixture
+def backends(open_backend):
+    """:return: a dictionary of backend name -> storage holding `make_tasks`."""
+    storages = {}
+    for backend in BACKENDS:
+        storage = open_backend(backend)
+        storage.add_tasks(make_tasks())
+        storages[backend] = storage
+    yield storages
+    for storage in storages.values():
+        storage.close()
+
+
+@pytest.mark.parametrize(
+    "current_date",
+    [datetime(2024, 1, 28), datetime(2024, 1, 28, 9, 30), datetime(2023, 1, 1)],
+)
+def test_backends_agree_on_counts_and_overdue_tasks(backends, current_date):
+    flatfile = backends["flatfile"]
+    for backend in "binary", "sqlite":
+        storage = backends[backend]
+        assert storage.task_count() == flatfile.task_count()
+        assert storage.task_summary(current_date) == flatfile.task_summary(
+            current_date
+        )
+        assert storage.task_totals(current_date) == flatfile.task_totals(
+            current_date
+        )
+        assert titles(storage.overdue_tasks(current_date)) == titles(
+            flatfile.overdue_tasks(current_date)
+        )
+        assert titles(storage.upcoming_tasks(current_date, 2, "jason")) == titles(
+            flatfile.upcoming_tasks(current_date, 2, "jason")
+        )
+
+
+def test_task_due_today_is_overdue_once_the_day_has_started(backends):
+    for storage in backends.values():
+        at_midnight = titles(storage.overdue_tasks(datetime(2024, 1, 28), "jason"))
+        assert "jason task due 28" not in at_midnight
+        assert "jason task due 26" in at_midnight
+        later = titles(storage.overdue_tasks(datetime(2024, 1, 28, 0, 1), "jason"))
+        assert "jason task due 28" in later
+
+
+def test_each_backend_archives_into_its_own_archive(backends):
+    cutoff = datetime.now() + timedelta(days=1)
+    archived = {
+        backend: storage.archive_tasks(cutoff) for backend, storage in backends.items()
+    }
+    flatfile = backends["flatfile"]
+    for backend, storage in backends.items():
+        assert archived[backend] == 8
+        archive = storage.task_archive()
+        assert archive.user_counts() == {"admin": 4, "jason": 4}
+        assert titles(archive.find_tasks()) == titles(
+            flatfile.task_archive().find_tasks()
+        )
+        assert titles(storage.find_tasks()) == titles(flatfile.find_tasks())
+    archive_files = {
+        storage.task_archive().archive_file for storage in backends.values()
+    }
+    assert len(archive_files) == 3
+
+
+def test_migrating_moves_the_archive_along(backends, open_backend, monkeypatch):
+    monkeypatch.setattr(task_storage, "open_storage", open_backend)
+    backends["flatfile"].archive_tasks(datetime.now() + timedelta(days=1))
+
+    task_storage.migrate_storage("flatfile", "sqlite")
+    sqlite = open_backend("sqlite")
+    assert sqlite.task_count() == 16
+    # Migrated tasks are numbered the way tasks added to sqlite would be
+    assert min(task_id for task_id, _ in sqlite.find_tasks()) == 1
+    assert sqlite.task_archive().user_counts() == {"admin": 4, "jason": 4}
+    sqlite.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tasks_can_be_added_from_a_generator(open_backend, backend):
+    storage = open_backend(backend)
+    task_ids = storage.add_tasks(task for task in make_tasks())
+    assert len(task_ids) == 24
+    assert [storage.get_task(task_id).title for task_id in task_ids] == [
+        task.title for task in make_tasks()
+    ]
+    with open(storage.task_history().history_file) as history_file:
+        created = [line for line in history_file if ";created;" in line]
+    assert len(created) == 24
+    storage.close()
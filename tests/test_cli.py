@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import task_cli
+import task_manager
+
+
+def add_tasks(count):
+    for number in range(count):
+        assert (
+            task_cli.main(
+                [
+                    "add",
+                    "--user",
+                    "admin",
+                    "--title",
+                    f"Task {number}",
+                    "--description",
+                    "Description",
+                    "--due",
+                    "2024-03-01",
+                ]
+            )
+            == 0
+        )
+
+
+def test_complete_prints_the_titles_of_the_completed_tasks(data_folder, capsys):
+    add_tasks(3)
+    capsys.readouterr()
+    assert task_cli.main(["complete", "--ids", "1,3"]) == 0
+    output = capsys.readouterr().out
+    assert "Completed task 1: Task 0" in output
+    assert "Completed task 3: Task 2" in output
+    assert not task_manager.get_storage().get_task(1).completed
+
+
+def test_complete_skips_ids_that_archiving_gave_to_another_task(
+    data_folder, capsys
+):
+    add_tasks(3)
+    task_cli.main(["complete", "--ids", "1"])
+    # The script looked up "Task 2" as number 3, then archiving renumbered it
+    task_manager.get_storage().archive_tasks(datetime.now() + timedelta(days=1))
+    capsys.readouterr()
+
+    assert task_cli.main(["complete", "--ids", "3", "--expect-title", "Task 2"]) == 0
+    assert task_cli.main(["complete", "--ids", "2", "--expect-title", "Task 1"]) == 0
+    output = capsys.readouterr().out
+    assert output.count("Skipped 1 tasks") == 2
+    tasks = [task for _, task in task_manager.get_storage().find_tasks()]
+    assert [(task.title, task.completed) for task in tasks] == [
+        ("Task 1", False),
+        ("Task 2", False),
+    ]
+
+
+def test_complete_needs_a_title_for_every_id(data_folder, capsys):
+    add_tasks(2)
+    assert task_cli.main(["complete", "--ids", "1", "2", "--expect-title", "x"]) == 1
+    assert not task_manager.get_storage().get_task(0).completed
+
+
+def test_commands_that_fail_early_leave_no_files_behind(data_folder):
+    assert task_cli.main(["archive", "--completed-before", "not a date"]) == 1
+    assert task_manager.storage is None
+    assert list(data_folder.iterdir()) == []
@@ -0,0 +1,136 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import task_history
+import task_manager
+import task_storage
+from task_history import TaskHistory, TrendRollup
+from task_storage import Task
+
+MONDAY = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def history(tmp_path):
+    return TaskHistory(
+        str(tmp_path / "tasks_history.txt"), str(tmp_path / "tasks_trends.json")
+    )
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """:return: a list holding the datetime the history records changes at."""
+    now = [MONDAY]
+    monkeypatch.setattr(task_history.time, "time", lambda: now[0].timestamp())
+    return now
+
+
+def make_task(username, due_date, assigned_date=MONDAY):
+    return Task(username, "Task", "Description", due_date, assigned_date)
+
+
+def test_completion_times_follow_archived_tasks(history, clock):
+    history.start((task_id, make_task("jason", MONDAY)) for task_id in range(4))
+    clock[0] += timedelta(days=1)
+    history.append([("completed", 1, make_task("jason", MONDAY))])
+    clock[0] += timedelta(days=1)
+    history.append([("completed", 3, make_task("luke", MONDAY))])
+    history.append([("removed", [0, 1], "run1")])
+    # A run finished after a crash records the tasks again, which is ignored
+    history.append([("removed", [0, 1], "run1")])
+
+    completed_at, started_at = history.completion_times()
+    assert started_at == MONDAY.timestamp()
+    assert completed_at == {1: (MONDAY + timedelta(days=2)).timestamp()}
+
+
+def test_trends_roll_up_weeks_users_and_the_backlog(history, clock):
+    history.start(
+        [
+            (0, make_task("jason", MONDAY + timedelta(days=2))),
+            (1, make_task("luke", MONDAY + timedelta(days=9))),
+        ]
+    )
+    clock[0] += timedelta(days=3)
+    history.append(
+        [
+            ("created", 2, make_task("jason", MONDAY + timedelta(days=20), clock[0])),
+            (
+                "due_date",
+                1,
+                (MONDAY + timedelta(days=30), MONDAY + timedelta(days=9)),
+            ),
+        ]
+    )
+    clock[0] += timedelta(days=1)
+    history.append(
+        [("completed", 0, make_task("jason", MONDAY + timedelta(days=2)))]
+    )
+
+    rollup = history.trends(MONDAY + timedelta(days=16))
+    assert rollup.weeks == {"2024-01-01": [3, 1]}
+    # Counted from the start of the day the task was assigned
+    assert rollup.users == {"jason": [1, pytest.approx(4.375)]}
+    # Task 0 was completed before its first week ended, and task 1 was moved
+    # to a later due date before it became overdue
+    assert rollup.backlog == [["2024-01-01", 0], ["2024-01-08", 0]]
+    assert rollup.overdue_now(MONDAY + timedelta(days=21)) == 1
+    report = task_manager.trend_report_text(MONDAY, rollup)
+    assert "Week of 2024-01-01: 3 assigned, 1 of them completed (33.33%)" in report
+    assert "Jason: 4.4 days (1 completed)" in report
+
+
+def test_backlog_counts_tasks_overdue_at_each_week_end(history, clock):
+    history.start([(0, make_task("jason", MONDAY + timedelta(days=2)))])
+    rollup = history.trends(MONDAY + timedelta(days=15))
+    assert rollup.backlog == [["2024-01-01", 1], ["2024-01-08", 1]]
+
+
+def test_trends_only_read_the_records_added_since(history, clock, monkeypatch):
+    history.start([(0, make_task("jason", MONDAY))])
+    first = history.trends(MONDAY)
+    applied = []
+    apply = TrendRollup.apply
+    monkeypatch.setattr(
+        TrendRollup,
+        "apply",
+        lambda rollup, line: applied.append(line) or apply(rollup, line),
+    )
+    history.append([("completed", 0, make_task("jason", MONDAY))])
+    second = history.trends(MONDAY)
+    assert len(applied) == 1
+    assert second.offset > first.offset
+    assert second.weeks == {"2024-01-01": [1, 1]}
+
+    # A history that has been replaced is read from the start again, even
+    # though the saved trends are ahead of it
+    os.remove(history.history_file)
+    history.start([(0, make_task("luke", MONDAY))])
+    assert history.trends(MONDAY).weeks == {"2024-01-01": [1, 0]}
+
+
+def test_weeks_with_nothing_assigned_have_no_rate():
+    rollup = TrendRollup()
+    rollup.weeks = {"2024-01-01": [0, 0]}
+    report = task_manager.trend_report_text(MONDAY, rollup)
+    assert "Week of 2024-01-01: 0 assigned, 0 of them completed (n/a)" in report
+
+
+def test_migrating_starts_a_new_history(open_backend, monkeypatch):
+    monkeypatch.setattr(task_storage, "open_storage", open_backend)
+    sqlite = open_backend("sqlite")
+    sqlite.add_task(make_task("jason", MONDAY))
+    history = sqlite.task_history()
+    history.trends(MONDAY)
+    assert os.path.exists(history.history_file)
+    assert os.path.exists(history.trends_file)
+    sqlite.close()
+    flatfile = open_backend("flatfile")
+    flatfile.add_task(make_task("luke", MONDAY))
+    flatfile.close()
+
+    task_storage.migrate_storage("flatfile", "sqlite")
+    assert not os.path.exists(history.history_file)
+    assert not os.path.exists(history.trends_file)
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import pytest
+
+import task_manager
+from task_storage import Task
+
+
+@pytest.mark.parametrize("backend", ["flatfile", "sqlite"])
+def test_tasks_are_numbered_from_one(data_folder, monkeypatch, capsys, backend):
+    monkeypatch.setenv("TASK_STORAGE", backend)
+    task_manager.get_storage().add_tasks(
+        Task("admin", title, "Description", datetime(2024, 3, 1), datetime.today())
+        for title in ("First", "Second")
+    )
+    answers = iter(["2", "c"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+
+    task_manager.view_mine("admin")
+    output = capsys.readouterr().out
+    assert "1.Task: \t First" in output
+    assert "2.Task: \t Second" in output
+    tasks = [task for _, task in task_manager.get_storage().find_tasks()]
+    assert [(task.title, task.completed) for task in tasks] == [
+        ("First", False),
+        ("Second", True),
+    ]
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import task_manager
+from task_reports import TaskStatistics, aggregate_tasks
+from task_storage import Task
+
+CURRENT_DATE = datetime(2024, 3, 1, 12)
+
+
+def make_tasks():
+    return [
+        Task("admin", "Overdue", "", datetime(2024, 2, 1), datetime(2024, 1, 1)),
+        Task("admin", "Due later", "", datetime(2024, 4, 1), datetime(2024, 1, 1)),
+        Task("jason", "Done", "", datetime(2024, 2, 1), datetime(2024, 1, 1), True),
+        Task("jason", "Due today", "", datetime(2024, 3, 1), datetime(2024, 1, 1)),
+    ]
+
+
+def test_aggregate_counts_every_user_in_one_pass():
+    summary = aggregate_tasks(make_tasks(), CURRENT_DATE)
+    assert (summary["total"], summary["completed"], summary["overdue"]) == (4, 1, 2)
+    assert summary["incomplete_percent"] == 75
+    assert list(summary["users"]) == ["admin", "jason"]
+    jason = summary["users"]["jason"]
+    assert (jason["total"], jason["completed"], jason["overdue"]) == (2, 1, 1)
+    assert jason["share_percent"] == 50
+    assert aggregate_tasks([], CURRENT_DATE)["overdue_percent"] == 0
+
+
+def test_statistics_follow_changes_like_a_new_pass():
+    tasks = make_tasks()
+    statistics = TaskStatistics(enumerate(tasks))
+    statistics.summary(CURRENT_DATE)
+
+    tasks[0].completed = True
+    statistics.complete(0)
+    tasks[1].username = "jason"
+    statistics.reassign(1, "jason")
+    tasks[3].due_date = datetime(2024, 5, 1)
+    statistics.set_due_date(3, tasks[3].due_date)
+    later = datetime(2024, 4, 15)
+    assert statistics.summary(later) == aggregate_tasks(tasks, later)
+    # The clock going backwards gives the counts of that day again
+    assert statistics.summary(CURRENT_DATE) == aggregate_tasks(tasks, CURRENT_DATE)
+
+
+def test_user_report_lists_each_user(data_folder):
+    summary = aggregate_tasks(make_tasks(), CURRENT_DATE)
+    report = task_manager.user_report_text(CURRENT_DATE, summary)
+    assert "Total number of tasks: 4" in report
+    assert "Total tasks assigned to Jason: 2" in report
+    assert "Jason incomplete and overdue: 50.00%" in report
@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timedelta
+
+from task_scheduler import DeadlineScheduler
+from task_storage import Task
+
+START = datetime(2024, 3, 1, 9, 0)
+
+
+def make_task(title, due_date, username="jason", completed=False):
+    return Task(username, title, "Description", due_date, START, completed)
+
+
+def collect(scheduler):
+    """:return: a list the reminders `scheduler` fires are appended to."""
+    fired = []
+    scheduler.add_hook(lambda *reminder: fired.append(reminder))
+    return fired
+
+
+def test_reminders_fire_once_as_deadlines_pass():
+    scheduler = DeadlineScheduler(
+        enumerate(
+            [
+                make_task("Overdue already", START - timedelta(days=1)),
+                make_task("Tomorrow", START + timedelta(days=1)),
+                make_task("Done", START + timedelta(hours=1), completed=True),
+                make_task("Soon", START + timedelta(hours=2), "luke"),
+            ]
+        ),
+        START,
+    )
+    fired = collect(scheduler)
+    assert scheduler.next_deadline() == START + timedelta(hours=2)
+
+    assert scheduler.run_pending(START + timedelta(hours=2)) == 0
+    assert scheduler.run_pending(START + timedelta(hours=3)) == 1
+    assert fired == [(3, "luke", "Soon", START + timedelta(hours=2))]
+    assert scheduler.run_pending(START + timedelta(days=2)) == 1
+    assert fired[-1][2] == "Tomorrow"
+    assert scheduler.run_pending(START + timedelta(days=3)) == 0
+    assert scheduler.next_deadline() is None
+
+
+def test_changes_to_tasks_are_followed():
+    scheduler = DeadlineScheduler([], START)
+    fired = collect(scheduler)
+    for task_id, hours in enumerate([1, 2, 3, 4]):
+        due_date = START + timedelta(hours=hours)
+        scheduler.task_added(task_id, make_task(f"Task {task_id}", due_date))
+    scheduler.task_added(4, make_task("Done", START, completed=True))
+    scheduler.task_completed(0)
+    scheduler.due_date_changed(1, START + timedelta(hours=10))
+    scheduler.task_reassigned(2, "luke")
+    # A deadline moved into the past has nothing left to remind about
+    scheduler.due_date_changed(3, START - timedelta(hours=1))
+
+    assert scheduler.run_pending(START + timedelta(hours=5)) == 1
+    assert fired == [(2, "luke", "Task 2", START + timedelta(hours=3))]
+    assert scheduler.run_pending(START + timedelta(hours=11)) == 1
+    assert fired[-1][:3] == (1, "jason", "Task 1")
+
+
+def test_rebuild_starts_again_from_the_given_tasks():
+    scheduler = DeadlineScheduler(
+        [(0, make_task("Old", START + timedelta(hours=1)))], START
+    )
+    fired = collect(scheduler)
+    later = START + timedelta(hours=2)
+    scheduler.rebuild(
+        [
+            (0, make_task("Passed", START + timedelta(hours=1))),
+            (1, make_task("New", START + timedelta(hours=3))),
+        ],
+        later,
+    )
+    assert scheduler.run_pending(START + timedelta(hours=4)) == 1
+    assert [reminder[2] for reminder in fired] == ["New"]
+
+
+def test_background_thread_fires_reminders():
+    scheduler = DeadlineScheduler([], datetime.today() - timedelta(hours=1))
+    fired = threading.Event()
+    scheduler.add_hook(lambda *reminder: fired.set())
+    scheduler.start(poll_interval=5)
+    try:
+        # An earlier deadline wakes the thread up rather than waiting
+        scheduler.task_added(0, make_task("Passed", datetime.today()))
+        assert fired.wait(2)
+    finally:
+        scheduler.stop()
+    assert scheduler.thread is None
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from task_search import SearchIndex, parse_query
+from task_storage import Task
+
+
+def make_task(title, description="Description", username="admin"):
+    return Task(
+        username, title, description, datetime(2024, 3, 1), datetime(2024, 1, 1)
+    )
+
+
+def test_parse_query_only_makes_the_last_word_of_an_entry_a_prefix():
+    assert parse_query("Fix log-in*") == [
+        ("fix", False),
+        ("log", False),
+        ("in", True),
+    ]
+    assert parse_query("  report  ") == [("report", False)]
+    assert parse_query("* --") == []
+
+
+def test_words_in_the_title_rank_first():
+    index = SearchIndex(
+        enumerate(
+            [
+                make_task("Write docs", "The login page needs a report"),
+                make_task("Login report", "Users can't log in"),
+                make_task("Report", "Broken login"),
+                make_task("Login", "Nothing else"),
+            ]
+        )
+    )
+    # Every term is needed, both in the title beats one in the title
+    assert [task_id for _, task_id in index.search("login report")] == [1, 2, 0]
+    # Equal scores come in task id order
+    assert [task_id for _, task_id in index.search("LOGIN")] == [1, 3, 0, 2]
+    assert index.search("login missing") == []
+    assert index.search("") == []
+
+
+def test_prefixes_match_every_word_starting_with_them():
+    index = SearchIndex(
+        enumerate(
+            [
+                make_task("Report sales"),
+                make_task("Reporting tool"),
+                make_task("Repaint the office"),
+                make_task("Sales"),
+            ]
+        )
+    )
+    assert sorted(task_id for _, task_id in index.search("report*")) == [0, 1]
+    assert sorted(task_id for _, task_id in index.search("rep*")) == [0, 1, 2]
+    assert [task_id for _, task_id in index.search("rep* sal*")] == [0]
+    # Words added after a prefix search are found by the next one
+    index.add(4, make_task("Repair the printer"))
+    assert sorted(task_id for _, task_id in index.search("rep*")) == [0, 1, 2, 4]
+
+
+def test_rare_terms_narrow_down_common_ones():
+    # Once "rare" leaves two candidates, "common" is looked up rather than
+    # turned into a set, which has to give the same answer
+    tasks = [make_task(f"Common task {number}") for number in range(100)]
+    tasks[70] = make_task("Common rare task")
+    tasks[80] = make_task("Rare", "Something common")
+    index = SearchIndex(enumerate(tasks))
+    assert [task_id for _, task_id in index.search("common rare")] == [70, 80]
+    assert [task_id for _, task_id in index.search("rare common")] == [70, 80]
+
+
+@pytest.mark.parametrize("backend", ["flatfile", "binary", "sqlite"])
+def test_backends_rank_search_results_alike(open_backend, backend):
+    storage = open_backend(backend)
+    storage.add_tasks(
+        [
+            make_task("Update the invoice", "Report for accounts", "jason"),
+            make_task("Invoice report", "Monthly", "jason"),
+            make_task("Inventory", "Count the stock"),
+            make_task("Report", "Invoices overdue", "jason"),
+        ]
+    )
+    # "report" is in fewer tasks than "inv*", so it counts for more in a title
+    titles = [task.title for _, task in storage.search_tasks("inv* report")]
+    assert titles == ["Invoice report", "Report", "Update the invoice"]
+    jason = storage.search_tasks("inv*", username="jason", status="incomplete")
+    assert [task.username for _, task in jason] == ["jason"] * 3
+    assert storage.search_tasks("missing") == []
+    storage.close()
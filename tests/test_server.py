@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+from task_server import ApiError, TaskServer
+
+
+@pytest.fixture
+def server(open_flatfile):
+    return TaskServer(open_flatfile())
+
+
+def request(server, method, path, body=None, token=None, authorization=None):
+    """:return: the (status, response) `dispatch` gives, errors included."""
+    headers = {}
+    if token is not None:
+        authorization = f"Bearer {token}"
+    if authorization is not None:
+        headers["authorization"] = authorization
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    try:
+        return asyncio.run(server.dispatch(method, path, headers, data))
+    except ApiError as error:
+        return error.status, {"error": error.message}
+
+
+def log_in(server, username="admin", password="password"):
+    status, response = request(
+        server, "POST", "/login", {"username": username, "password": password}
+    )
+    assert status == 200
+    return response["token"]
+
+
+def add_task(server, token, title, username="admin"):
+    status, response = request(
+        server,
+        "POST",
+        "/tasks",
+        {
+            "username": username,
+            "title": title,
+            "description": "Description",
+            "due_date": "2024-03-01",
+        },
+        token,
+    )
+    assert status == 201
+    return response
+
+
+def test_requests_need_a_bearer_token(server):
+    token = log_in(server)
+    assert request(server, "GET", "/tasks/mine")[0] == 401
+    # Cutting 7 characters off these used to leave the token to look up
+    for authorization in (f"Basic {token}", f"Token {token}", f"xxxxxxx{token}"):
+        status, _ = request(server, "GET", "/tasks/mine", authorization=authorization)
+        assert status == 401
+    assert request(server, "GET", "/tasks/mine", token=token)[0] == 200
+
+
+def test_login_checks_the_password_and_hashes_it(server):
+    status, _ = request(
+        server, "POST", "/login", {"username": "admin", "password": "wrong"}
+    )
+    assert status == 401
+    log_in(server)
+    # The plain text password of the default account is hashed on login
+    assert server.users.get_password("admin").startswith(("scrypt$", "pbkdf2"))
+    log_in(server, username="ADMIN")
+
+
+def test_login_finds_users_registered_by_another_session(server, open_flatfile):
+    other = TaskServer(open_flatfile())
+    admin_token = log_in(other)
+    status, _ = request(
+        other, "POST", "/users", {"username": "jason", "password": "pw"}, admin_token
+    )
+    assert status == 201
+    log_in(server, "jason", "pw")
+
+
+def test_tasks_are_added_listed_and_edited(server):
+    token = log_in(server)
+    task = add_task(server, token, "Fix login")
+    status, response = request(server, "GET", "/tasks/mine", token=token)
+    assert status == 200
+    assert [t["title"] for t in response["tasks"]] == ["Fix login"]
+
+    status, response = request(
+        server,
+        "PATCH",
+        f"/tasks/{task['id']}",
+        {"due_date": "2024-04-01", "completed": True, "title": "Fix login"},
+        token,
+    )
+    assert status == 200
+    assert response["due_date"] == "2024-04-01" and response["completed"]
+    status, _ = request(
+        server, "PATCH", f"/tasks/{task['id']}", {"completed": True}, token
+    )
+    assert status == 409
+
+
+def test_edit_is_refused_when_the_id_belongs_to_another_task(server):
+    token = log_in(server)
+    add_task(server, token, "First")
+    second = add_task(server, token, "Second")
+    status, _ = request(
+        server,
+        "PATCH",
+        f"/tasks/{second['id']}",
+        {"completed": True, "title": "First"},
+        token,
+    )
+    assert status == 409
+    assert request(server, "PATCH", "/tasks/99", {}, token)[0] == 404
+
+
+def test_reports_are_for_the_admin_only(server):
+    admin_token = log_in(server)
+    request(
+        server, "POST", "/users", {"username": "jason", "password": "pw"}, admin_token
+    )
+    add_task(server, admin_token, "Fix login", username="jason")
+    jason_token = log_in(server, "jason", "pw")
+    assert request(server, "GET", "/reports/tasks", token=jason_token)[0] == 403
+    status, response = request(server, "GET", "/reports/users", token=admin_token)
+    assert status == 200
+    assert response["total_users"] == 2
+    assert response["users"]["jason"]["total"] == 1
@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import pytest
+
+import task_snapshot
+import task_storage
+from task_snapshot import read_snapshot, snapshot_bytes, snapshot_task_count
+from task_storage import Task
+
+
+def make_tasks():
+    return [
+        Task(
+            "jason",
+            "Fix log-in; again",
+            "Users can't log in\nafter the update",
+            datetime(2024, 3, 1),
+            datetime(2024, 1, 1),
+        ),
+        Task("Zoë", "Übersetzung", "", datetime(2024, 2, 29), datetime(2024, 1, 2)),
+        Task(
+            "jason",
+            "Done",
+            "Description",
+            datetime(2024, 1, 15),
+            datetime(2024, 1, 3),
+            completed=True,
+        ),
+    ]
+
+
+def fields(task):
+    return (
+        task.username,
+        task.title,
+        task.description,
+        task.due_date,
+        task.assigned_date,
+        task.completed,
+    )
+
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    path = tmp_path / "tasks.bin"
+    path.write_bytes(snapshot_bytes(make_tasks()))
+    return str(path)
+
+
+def test_snapshot_round_trip(snapshot_file):
+    tasks = read_snapshot(snapshot_file)
+    assert [fields(task) for task in tasks] == [fields(task) for task in make_tasks()]
+    assert snapshot_task_count(snapshot_file) == 3
+    # Tasks of the same user share the username
+    assert tasks[0].username is tasks[2].username
+    # Everything but the text can be changed after loading
+    tasks[0].completed = True
+    tasks[0].due_date = datetime(2024, 4, 1)
+    assert fields(tasks[0])[:3] == fields(make_tasks()[0])[:3]
+
+
+def test_usernames_are_stored_once():
+    data = snapshot_bytes(make_tasks())
+    assert data.count(b"jason") == 1
+    assert data.startswith(task_snapshot.MAGIC)
+
+
+def test_empty_file_holds_no_tasks(tmp_path):
+    path = tmp_path / "tasks.bin"
+    path.write_bytes(b"")
+    assert read_snapshot(str(path)) == []
+    assert snapshot_task_count(str(path)) == 0
+    path.write_bytes(snapshot_bytes([]))
+    assert read_snapshot(str(path)) == []
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"TASKSNAP",
+        b"not a snapshot at all, not at all",
+        task_snapshot.HEADER.pack(task_snapshot.MAGIC, 2, 0),
+        snapshot_bytes(make_tasks())[:40],
+    ],
+)
+def test_damaged_snapshots_are_refused(tmp_path, data):
+    path = tmp_path / "tasks.bin"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
+
+
+def test_binary_storage_keeps_changes_across_sessions(open_backend, monkeypatch):
+    monkeypatch.setattr(task_storage, "JOURNAL_COMPACT_THRESHOLD", 3)
+    first = open_backend("binary")
+    first.add_tasks(make_tasks())
+    first.complete_task(0)
+    first.reassign_task(1, "jason")
+    first.set_due_date(1, datetime(2024, 5, 1))
+    # The journal got long enough to be written into a new snapshot
+    assert first.version > 0
+    assert snapshot_task_count(first.tasks_file) == 3
+
+    second = open_backend("binary")
+    assert [fields(task) for _, task in second.find_tasks()] == [
+        fields(task) for _, task in first.find_tasks()
+    ]
+    assert second.get_task(0).completed
+    assert second.get_task(1).username == "jason"
+    assert second.get_task(1).due_date == datetime(2024, 5, 1)
+    first.close()
+    second.close()
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import task_perf
+import task_storage
+from task_parallel import parallel_task_summary
+from task_storage import Task, TaskConflictError
+
+CURRENT_DATE = datetime(2024, 3, 1)
+
+
+def make_task(number, username="admin", due_date=datetime(2024, 2, 1)):
+    return Task(
+        username,
+        f"Task {number}",
+        f"Description of task {number}",
+        due_date,
+        datetime(2024, 1, 1),
+    )
+
+
+def task_lines(storage):
+    return [
+        task_storage.task_to_str(task) for _, task in storage.find_tasks()
+    ]
+
+
+# =====Journal===========
+
+
+def test_journal_is_replayed_on_top_of_the_snapshot(open_flatfile):
+    first = open_flatfile()
+    first.add_tasks([make_task(number) for number in range(3)])
+    first.set_due_date(1, datetime(2024, 5, 1))
+    first.reassign_task(2, "bob")
+    first.complete_task(0)
+
+    second = open_flatfile()
+    assert task_lines(second) == task_lines(first)
+    assert second.get_task(0).completed
+    assert second.get_task(1).due_date == datetime(2024, 5, 1)
+    assert second.get_task(2).username == "bob"
+    # Nothing has been compacted yet
+    assert second.journal_length == 6
+
+
+def test_long_journal_is_compacted_into_a_new_snapshot(open_flatfile, monkeypatch):
+    monkeypatch.setattr(task_storage, "JOURNAL_COMPACT_THRESHOLD", 5)
+    first = open_flatfile()
+    for number in range(7):
+        first.add_task(make_task(number))
+    assert first.version > 0
+    assert first.journal_length < 5
+
+    second = open_flatfile()
+    assert task_lines(second) == task_lines(first)
+    assert second.task_count() == 7
+
+
+def test_compacting_again_after_a_crash_changes_nothing(open_flatfile):
+    first = open_flatfile()
+    first.add_tasks([make_task(number) for number in range(3)])
+    first.complete_task(1)
+    with open(first.journal_file) as journal_file:
+        journal = journal_file.read()
+    with task_storage.file_lock(first.lock_file):
+        first.write_task_snapshot()
+    # A crash after tasks.txt was written but before the journal was emptied
+    with open(first.journal_file, "w") as journal_file:
+        journal_file.write(journal)
+
+    assert task_lines(open_flatfile()) == task_lines(first)
+
+
+# =====Sessions===========
+
+
+def test_changes_from_two_sessions_are_merged(open_flatfile):
+    first = open_flatfile()
+    second = open_flatfile()
+    first.add_task(make_task(0))
+    second.add_task(make_task(1))
+    first.complete_task(1)
+    second.set_due_date(0, datetime(2024, 6, 1))
+
+    first.refresh()
+    assert task_lines(first) == task_lines(second)
+    assert [task.title for _, task in first.find_tasks()] == ["Task 0", "Task 1"]
+    assert second.get_task(1).completed
+    assert first.get_task(0).due_date == datetime(2024, 6, 1)
+
+
+def test_completing_a_task_twice_is_a_conflict(open_flatfile):
+    first = open_flatfile()
+    first.add_task(make_task(0))
+    second = open_flatfile()
+    second.ensure_loaded()
+
+    first.complete_task(0)
+    with pytest.raises(TaskConflictError):
+        second.set_due_date(0, datetime(2024, 6, 1))
+    assert open_flatfile().get_task(0).due_date == datetime(2024, 2, 1)
+
+
+def test_edit_refused_once_archiving_renumbered_the_task(open_flatfile):
+    first = open_flatfile()
+    first.add_tasks([make_task(number) for number in range(3)])
+    first.complete_task(0)
+    second = open_flatfile()
+    selected_task = second.get_task(1)
+
+    archived = first.archive_tasks(datetime.now() + timedelta(days=1))
+    assert archived == 1
+    # Task 1 is now task 0, and id 1 belongs to what was task 2
+    with pytest.raises(TaskConflictError):
+        second.edit_task(1, username="bob", expected=selected_task)
+    assert second.complete_tasks([1], expected={1: selected_task}) == []
+
+    third = open_flatfile()
+    assert [task.title for _, task in third.find_tasks()] == ["Task 1", "Task 2"]
+    assert not any(task.completed for _, task in third.find_tasks())
+    assert third.get_task(1).username == "admin"
+
+
+# =====Parallel reports===========
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_summary_matches_the_loaded_summary(open_flatfile, workers):
+    first = open_flatfile()
+    first.add_tasks(
+        [
+            make_task(
+                number,
+                username=["admin", "bob", "carol"][number % 3],
+                due_date=datetime(2024, 1, 1) + timedelta(days=number * 7),
+            )
+            for number in range(30)
+        ]
+    )
+    with task_storage.file_lock(first.lock_file):
+        first.write_task_snapshot()
+    # Journal records on top of the snapshot
+    first.complete_tasks(range(0, 30, 4))
+    first.reassign_task(1, "carol")
+    first.set_due_date(2, datetime(2023, 12, 1))
+    first.add_task(make_task(30, username="dave"))
+
+    summary = parallel_task_summary(open_flatfile(), CURRENT_DATE, workers=workers)
+    assert summary == open_flatfile().task_summary(CURRENT_DATE)
+
+
+def test_invalid_journal_records_are_counted_not_printed(open_flatfile, capsys):
+    first = open_flatfile()
+    first.add_tasks([make_task(number) for number in range(3)])
+    with open(first.journal_file, "a") as journal_file:
+        journal_file.write("complete;not a number\n")
+    before = task_perf.COUNTERS.get("journal.invalid_records", 0)
+
+    summary = parallel_task_summary(open_flatfile(), CURRENT_DATE, workers=1)
+    assert summary == open_flatfile().task_summary(CURRENT_DATE)
+    assert task_perf.COUNTERS["journal.invalid_records"] == before + 2
+    assert capsys.readouterr().out == ""
+
+
+# =====Statistics===========
+
+
+def test_totals_of_a_large_file_are_counted_without_loading(
+    open_flatfile, monkeypatch
+):
+    monkeypatch.setattr(task_storage, "COUNT_WITHOUT_LOADING_SIZE", 0)
+    first = open_flatfile()
+    first.add_tasks([make_task(number) for number in range(10)])
+    with task_storage.file_lock(first.lock_file):
+        first.write_task_snapshot()
+    first.complete_task(3)
+    first.set_due_date(4, datetime(2030, 1, 1))
+
+    second = open_flatfile()
+    totals = second.task_totals(CURRENT_DATE)
+    assert not second.tasks_loaded()
+    assert totals == first.task_totals(CURRENT_DATE)
+    assert (totals["total"], totals["completed"], totals["overdue"]) == (10, 1, 8)
+
+
+def test_totals_of_a_small_file_load_the_tasks(open_flatfile):
+    open_flatfile().add_task(make_task(0))
+    storage = open_flatfile()
+    assert storage.task_totals(CURRENT_DATE)["overdue"] == 1
+    assert storage.tasks_loaded()
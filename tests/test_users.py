@@ -0,0 +1,135 @@
+import pytest
+
+import task_users
+from task_users import SessionCache, UserRegistry
+
+
+@pytest.fixture(autouse=True)
+def cheap_hashes(monkeypatch):
+    """Hashes with low cost parameters, which check the same way but fast."""
+    monkeypatch.setattr(task_users, "SCRYPT_N", 16)
+    monkeypatch.setattr(task_users, "PBKDF2_ITERATIONS", 1000)
+
+
+@pytest.mark.parametrize("algorithm", ["scrypt", "pbkdf2"])
+def test_hashed_passwords_verify(monkeypatch, algorithm):
+    monkeypatch.setattr(task_users, "PASSWORD_HASH", algorithm)
+    stored = task_users.hash_password("secret;pw")
+    assert task_users.is_hashed(stored) and ";" not in stored
+    assert task_users.verify_password(stored, "secret;pw")
+    assert not task_users.verify_password(stored, "secret")
+    # Every hash has its own salt
+    assert task_users.hash_password("secret;pw") != stored
+    assert not task_users.verify_password(stored[:-8], "secret;pw")
+    assert not task_users.verify_password("scrypt$x$8$1$$", "secret;pw")
+
+
+def test_plain_passwords_verify_and_need_hashing():
+    assert task_users.verify_password("password", "password")
+    assert not task_users.verify_password("password", "Password")
+    assert task_users.needs_rehash("password")
+
+
+def test_hashes_need_redoing_when_the_cost_changes(monkeypatch):
+    stored = task_users.hash_password("pw")
+    assert not task_users.needs_rehash(stored)
+    monkeypatch.setattr(task_users, "SCRYPT_N", 32)
+    assert task_users.needs_rehash(stored)
+    # Hashes made with the old cost still verify
+    assert task_users.verify_password(stored, "pw")
+
+
+def test_registry_looks_users_up_in_any_letter_case():
+    users = UserRegistry({"Luke": "pw"})
+    users.add(" LUKE ", "new")
+    assert users.usernames() == ["Luke"]
+    assert users.get_username("luke") == "Luke"
+    assert users.get_password("lUKE") == "new"
+    assert users.get_username("jason") is None
+
+
+def test_registry_only_hashes_a_password_once(monkeypatch):
+    users = UserRegistry({"jason": task_users.hash_password("pw")})
+    checks = []
+    verify_password = task_users.verify_password
+    monkeypatch.setattr(
+        task_users,
+        "verify_password",
+        lambda stored, password: checks.append(password)
+        or verify_password(stored, password),
+    )
+
+    assert users.check_password("jason", "pw")
+    assert users.check_password("JASON", "pw")
+    assert checks == ["pw"]
+    # Wrong passwords are always checked, and never remembered
+    assert not users.check_password("jason", "wrong")
+    assert not users.check_password("jason", "wrong")
+    assert checks == ["pw", "wrong", "wrong"]
+    # The password itself isn't kept
+    assert "pw" not in repr(users.verified)
+    # A new password makes the remembered check useless
+    users.add("jason", task_users.hash_password("other"))
+    assert not users.check_password("jason", "pw")
+    assert users.check_password("jason", "other")
+
+
+def test_registry_remembers_the_most_recent_checks(monkeypatch):
+    monkeypatch.setattr(task_users, "VERIFIED_CACHE_SIZE", 2)
+    users = UserRegistry({name: "pw" for name in ("a", "b", "c")})
+    for name in "a", "b", "a", "c":
+        assert users.check_password(name, "pw")
+    assert list(users.verified) == ["a", "c"]
+
+
+def test_passwords_are_upgraded_and_saved_on_login(open_flatfile):
+    storage = open_flatfile()
+    users = UserRegistry(storage.load_users())
+    assert users.get_password("admin") == "password"
+    task_users.upgrade_password(storage, users, "ADMIN", "password")
+    stored = users.get_password("admin")
+    assert task_users.is_hashed(stored)
+    assert open_flatfile().load_users() == {"admin": stored}
+    # Already up to date, so nothing changes
+    task_users.upgrade_password(storage, users, "admin", "password")
+    assert users.get_password("admin") == stored
+
+
+def test_migrate_passwords_hashes_plain_passwords_only(open_flatfile):
+    storage = open_flatfile()
+    task_users.register_user(storage, UserRegistry(), "jason", "pw")
+    hashed = storage.load_users()["jason"]
+    storage.add_user("luke", "plain")
+
+    assert task_users.migrate_passwords(storage) == 2
+    username_password = open_flatfile().load_users()
+    assert username_password["jason"] == hashed
+    assert task_users.verify_password(username_password["luke"], "plain")
+    assert task_users.migrate_passwords(storage) == 0
+
+
+def test_sessions_expire_unless_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(task_users.time, "monotonic", lambda: now[0])
+    sessions = SessionCache(lifetime=60)
+    token = sessions.create("jason")
+    now[0] += 50
+    assert sessions.get(token) == "jason"
+    # Using a session starts its lifetime again
+    now[0] += 50
+    assert sessions.get(token) == "jason"
+    now[0] += 61
+    assert sessions.get(token) is None
+    assert len(sessions) == 0
+
+
+def test_sessions_drop_the_least_recently_used(monkeypatch):
+    sessions = SessionCache(max_sessions=2)
+    first = sessions.create("a")
+    second = sessions.create("b")
+    sessions.get(first)
+    third = sessions.create("c")
+    assert sessions.get(second) is None
+    assert [sessions.get(first), sessions.get(third)] == ["a", "c"]
+    sessions.end(first)
+    assert sessions.get(first) is None